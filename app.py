@@ -1,25 +1,29 @@
+import logging
 import sys
 import os
-try:
-    import google
-    print(f"DEBUG: python path: {sys.executable}")
-    print(f"DEBUG: sys.path: {sys.path}")
-    print(f"DEBUG: google path: {google.__path__}")
-except Exception as e:
-    print(f"DEBUG: Error importing google: {e}")
-
 from flask import Flask
 from config import Config
 from extensions import db, bcrypt, csrf, talisman, login_manager
-from models import User
+from database import init_database, create_missing_indexes
+from services.user_service import init_user_cache, load_user_cached
+from services.rewrite_service import init_rewrite_cache
+from services.image_service import init_image_sweeper
+from services.image_preprocess import init_image_preprocessor
+from services.usage_service import init_usage_writer
+from services.search_service import ensure_card_search_index
+from logging_config import init_logging
+from monitoring import init_monitoring
+from profiling import init_profiling
+from tracing import init_tracing
 from datetime import datetime, timezone
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    init_logging(app)
 
     # Initialize Extensions
-    db.init_app(app)
+    init_database(app)
     bcrypt.init_app(app)
     csrf.init_app(app)
     # Configure Talisman
@@ -27,10 +31,18 @@ def create_app(config_class=Config):
 #    force_https = not app.config.get("TESTING", False)
 #    talisman.init_app(app, content_security_policy=None, force_https=force_https)
     login_manager.init_app(app)
+    init_user_cache(app)
+    init_rewrite_cache(app)
+    init_image_sweeper(app)
+    init_image_preprocessor(app)
+    init_usage_writer(app)
+    init_monitoring(app)
+    init_profiling(app)
+    init_tracing(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_user_cached(int(user_id))
 
     # Context Processor
     @app.context_processor
@@ -54,13 +66,26 @@ def create_app(config_class=Config):
 
     return app
 
-app = create_app()
+# 画像の前処理のワーカー（spawn）は python app.py で起動した場合に app.py を __mp_main__ として
+# 読み込むため、ワーカーではアプリの作成・DB の初期化・ログの設定を行わない
+if __name__ != "__mp_main__":
+    app = create_app()
 
-import os
+    logger = logging.getLogger(__name__)
+    try:
+        import google
+        logger.debug("python path: %s, sys.path: %s, google path: %s", sys.executable, sys.path, list(google.__path__))
+    except Exception as e:
+        logger.warning("Error importing google: %s", e)
+
+    import os
 
-# 【重要】IISで動かす際、データベース作成を確実に行うため if の外に出します
-with app.app_context():
-    db.create_all()
+    # 【重要】IISで動かす際、データベース作成を確実に行うため __main__ の判定の外で行います
+    with app.app_context():
+        db.create_all()
+        create_missing_indexes()
+        with db.engine.begin() as conn:
+            ensure_card_search_index(conn)
 
 if __name__ == "__main__":
     # 手元のPCでのデバッグ用設定
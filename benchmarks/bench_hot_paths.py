@@ -0,0 +1,102 @@
+"""
+主要な処理の所要時間のベンチマーク（pytest-benchmark）
+
+    BENCH_SCALE=100k python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import csv
+import io
+import itertools
+import random
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from PIL import Image
+from extensions import db
+from models import Card, User
+from services.ai_service import analyze_card_image
+from services.csv_service import process_csv_import
+from services.mail_service import get_monthly_sent_counts
+
+CSV_ROWS = 500
+BULK_SEND_CARDS = 20
+EIGHT_HEADER = ["姓", "名", "e-mail", "会社名", "部署名", "役職", "TEL会社", "携帯電話", "URL"]
+
+_csv_batches = itertools.count()
+
+
+def _eight_csv(rows):
+    """Eight 形式の CSV（毎回新しいメールアドレスにして新規登録の経路を測る）"""
+    batch = next(_csv_batches)
+    rnd = random.Random(batch)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EIGHT_HEADER)
+    for i in range(rows):
+        writer.writerow([
+            "山田", f"太郎{i}", f"import{batch}-{i}@csv{i % 50}.example.com", f"株式会社インポート{i % 50}",
+            "営業部", "課長", f"03-{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}", "",
+            f"https://csv{i % 50}.example.com",
+        ])
+    return output.getvalue().encode("utf-8-sig")
+
+
+@pytest.fixture(scope="module")
+def card_photo():
+    """スマートフォンで撮影した名刺に相当する 12 メガピクセルの JPEG"""
+    image = Image.merge("RGB", [Image.effect_noise((4032, 3024), 40 + 10 * i) for i in range(3)])
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def bench_card_list(benchmark, bench_client):
+    response = benchmark(bench_client.get, "/cards")
+    assert response.status_code == 200
+
+
+def bench_history_list(benchmark, bench_client):
+    response = benchmark(bench_client.get, "/history")
+    assert response.status_code == 200
+
+
+def bench_quota_count(benchmark, bench_app, tenant_ids):
+    """全ユーザーの今月の送信数（カウンタ未作成のため History から集計）"""
+    with bench_app.app_context():
+        counts = benchmark(get_monthly_sent_counts, tenant_ids)
+    assert len(counts) == len(tenant_ids)
+
+
+def bench_csv_import(benchmark, bench_app, tenant_ids):
+    def run(content):
+        with bench_app.app_context():
+            return process_csv_import(content, tenant_ids[-1])
+
+    created, updated = benchmark.pedantic(
+        run, setup=lambda: ((_eight_csv(CSV_ROWS),), {}), rounds=5, iterations=1
+    )
+    assert created == CSV_ROWS
+
+
+def bench_card_image(benchmark, bench_app, card_photo):
+    """名刺画像の縮小と解析（解析は遅延なしの代替プロバイダ）"""
+    with bench_app.app_context():
+        result = benchmark.pedantic(analyze_card_image, args=(card_photo, "card.jpg"), rounds=5, iterations=1)
+    assert result["email"]
+
+
+def bench_bulk_send(benchmark, bench_app, bench_client, bench_user):
+    """一括送信（下書き生成・送信・履歴保存）を代替プロバイダで BULK_SEND_CARDS 件"""
+    with bench_app.app_context():
+        user = User.query.filter_by(username=bench_user).one()
+        ids = [
+            card_id for (card_id,) in db.session.query(Card.id)
+            .filter(Card.user_id == user.id, Card.email != "")
+            .order_by(Card.id).limit(BULK_SEND_CARDS)
+        ]
+
+    response = benchmark.pedantic(
+        bench_client.post, args=("/api/bulk_send_emails",), kwargs={"json": {"ids": ids}}, rounds=5, iterations=1
+    )
+    assert response.get_json()["success_count"] == len(ids)
@@ -0,0 +1,86 @@
+"""
+ベンチマーク共通のデータとアプリ
+
+BENCH_SCALE（1k / 100k / 1m、既定 1k）の件数の合成データを一時ファイルの SQLite に投入し、
+外部サービスは遅延なしの代替プロバイダ（FAKE_PROVIDERS）で置き換える。
+BENCH_DB にパスを指定すると、そのデータベースを作成・再利用する（大きな規模を何度も測る場合）。
+"""
+import os
+import sys
+from unittest.mock import patch
+import pytest
+
+# ベンチマーク中はログファイル・標準エラーに書き出さない（Config は import 時に環境変数を読む）
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_CONSOLE", "false")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+from flask_bcrypt import generate_password_hash
+from app import create_app
+from config import Config
+from extensions import db
+from models import User
+from services.ai_service import reset_ai_router
+from services.fake_providers import reset_behaviors
+from synthetic_data import SCALES, populate
+
+BENCH_PASSWORD = "bench-password"
+
+
+def _scale():
+    name = os.environ.get("BENCH_SCALE", "1k").lower()
+    if name not in SCALES:
+        raise pytest.UsageError(f"BENCH_SCALE must be one of {', '.join(SCALES)}")
+    return name
+
+
+@pytest.fixture(scope="session")
+def bench_app(tmp_path_factory):
+    tmp_dir = tmp_path_factory.mktemp("bench")
+    db_path = os.environ.get("BENCH_DB") or str(tmp_dir / "bench.db")
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.abspath(db_path)
+        WTF_CSRF_ENABLED = False
+        UPLOAD_FOLDER = str(tmp_dir / "uploads")
+
+    fake_settings = {
+        "FAKE_PROVIDERS": True, "FAKE_LATENCY_MS": 0, "FAKE_VISION_LATENCY_MS": 0, "FAKE_MAIL_LATENCY_MS": 0,
+        "FAKE_ERROR_RATE": 0, "FAKE_RATE_LIMIT_RATE": 0, "FAKE_MAX_RPS": 0, "BULK_SEND_INTERVAL": 0,
+    }
+    with patch.multiple(Config, **fake_settings):
+        reset_behaviors()
+        reset_ai_router()
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            if User.query.first() is None:
+                counts = SCALES[_scale()]
+                password = generate_password_hash(BENCH_PASSWORD).decode("utf-8")
+                populate(counts["users"], counts["cards"], counts["history"], password)
+        yield app
+        app.extensions["ai_usage_writer"].flush()
+    reset_behaviors()
+    reset_ai_router()
+
+
+@pytest.fixture(scope="session")
+def tenant_ids(bench_app):
+    with bench_app.app_context():
+        return [user_id for (user_id,) in db.session.query(User.id).filter(User.is_admin.is_(False)).order_by(User.id)]
+
+
+@pytest.fixture(scope="session")
+def bench_user(bench_app, tenant_ids):
+    with bench_app.app_context():
+        return db.session.get(User, tenant_ids[0]).username
+
+
+@pytest.fixture
+def bench_client(bench_app, bench_user):
+    """先頭の合成ユーザーでログイン済みのクライアント"""
+    client = bench_app.test_client()
+    response = client.post("/login", data={"username": bench_user, "password": BENCH_PASSWORD})
+    assert response.status_code == 302
+    return client
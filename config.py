@@ -10,9 +10,41 @@ class Config:
     
     # Path settings
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(BASE_DIR, "users.db")
+    # DATABASE_URL を指定すると PostgreSQL 等に切り替わる（未指定時は users.db）
+    SQLALCHEMY_DATABASE_URI = (
+        os.environ.get("DATABASE_URL", "").replace("postgres://", "postgresql://", 1)
+        or "sqlite:///" + os.path.join(BASE_DIR, "users.db")
+    )
     UPLOAD_FOLDER = os.path.join("static", "uploads", "cards")
 
+    # 名刺画像の前処理（EXIF の向き補正・切り抜き・グレースケール化・縮小）を行うプロセス数（0 でリクエストのスレッドで実行）
+    IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+    # 前処理の待ち数の上限と、空きを待つ秒数（超えると 503）
+    IMAGE_QUEUE_SIZE = int(os.environ.get("IMAGE_QUEUE_SIZE", 8))
+    IMAGE_QUEUE_TIMEOUT = float(os.environ.get("IMAGE_QUEUE_TIMEOUT", 10))
+    # 1枚の前処理を待つ秒数（超えると 503。ワーカーが応答しなくてもリクエストを解放する）
+    IMAGE_TASK_TIMEOUT = float(os.environ.get("IMAGE_TASK_TIMEOUT", 30))
+    IMAGE_MAX_SIZE = int(os.environ.get("IMAGE_MAX_SIZE", 1200))
+    IMAGE_GRAYSCALE = os.environ.get("IMAGE_GRAYSCALE", "true").lower() == "true"
+    IMAGE_CROP = os.environ.get("IMAGE_CROP", "true").lower() == "true"
+    # OCR テキストからメール・電話・会社名などを正規表現で抽出し、判定できない項目だけを AI に問い合わせる
+    CARD_LOCAL_EXTRACTION = os.environ.get("CARD_LOCAL_EXTRACTION", "true").lower() == "true"
+
+    # SQLite tuning (接続ごとに PRAGMA を適用する。database.py を参照)
+    SQLITE_TUNING_ENABLED = os.environ.get("SQLITE_TUNING_ENABLED", "1") == "1"
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 15000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+    SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 10))
+
+    # 接続プール設定（PostgreSQL 等のサーバー型DB）
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+
     # AI settings
     VISION_KEY = os.environ.get("VISION_KEY", "")
     VISION_ENDPOINT = os.environ.get("VISION_ENDPOINT", "")
@@ -21,10 +53,103 @@ class Config:
     OPENAI_DEPLOYMENT = os.environ.get("OPENAI_DEPLOYMENT", "")
     GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
     AI_ENGINE_TYPE = os.environ.get("AI_ENGINE_TYPE", "azure").lower()
+    # 下書きの書き換え（/rewrite）に使う軽量モデル。空なら通常のモデルを使う
+    OPENAI_REWRITE_DEPLOYMENT = os.environ.get("OPENAI_REWRITE_DEPLOYMENT", "")
+    GEMINI_REWRITE_MODEL = os.environ.get("GEMINI_REWRITE_MODEL", "gemini-2.0-flash-lite")
+    # 同じ下書き・指示の書き換え結果を再利用する期間（秒、0 で無効）と件数
+    REWRITE_CACHE_TTL = int(os.environ.get("REWRITE_CACHE_TTL", 600))
+    REWRITE_CACHE_SIZE = int(os.environ.get("REWRITE_CACHE_SIZE", 256))
+    # AI_ENGINE_TYPE のエンジンが障害時にもう一方（設定済みの場合）へ切り替える
+    AI_FAILOVER_ENABLED = os.environ.get("AI_FAILOVER_ENABLED", "true").lower() == "true"
+    # 429 の再試行回数と1回あたりの最大待ち時間（秒）
+    AI_MAX_RETRIES = int(os.environ.get("AI_MAX_RETRIES", 3))
+    AI_RETRY_MAX_WAIT = float(os.environ.get("AI_RETRY_MAX_WAIT", 10))
+    # サーキットブレーカー: 連続失敗数またはエラー率で遮断し、COOLDOWN 秒後に試行を再開する
+    AI_CIRCUIT_FAILURES = int(os.environ.get("AI_CIRCUIT_FAILURES", 3))
+    AI_CIRCUIT_ERROR_RATE = float(os.environ.get("AI_CIRCUIT_ERROR_RATE", 0.5))
+    AI_CIRCUIT_COOLDOWN = float(os.environ.get("AI_CIRCUIT_COOLDOWN", 30))
+    # ヘッジリクエスト: 優先エンジンが p95 レイテンシを超えたらもう一方にも同じリクエストを送る
+    AI_HEDGE_ENABLED = os.environ.get("AI_HEDGE_ENABLED", "false").lower() == "true"
+    AI_HEDGE_PERCENTILE = float(os.environ.get("AI_HEDGE_PERCENTILE", 95))
+    AI_HEDGE_MIN_SAMPLES = int(os.environ.get("AI_HEDGE_MIN_SAMPLES", 20))
+    # 一括送信時に1回のAIリクエストへまとめる相手の件数（1 以下で1件ずつ生成）
+    BULK_PROMPT_BATCH_SIZE = int(os.environ.get("BULK_PROMPT_BATCH_SIZE", 5))
+
+    # Web scraping settings (一括処理時のドメイン並列取得数)
+    WEB_FETCH_WORKERS = int(os.environ.get("WEB_FETCH_WORKERS", 8))
+    # 1ページあたりの読み込み上限（バイト）。超えた分は受信せずに打ち切る
+    WEB_FETCH_MAX_BYTES = int(os.environ.get("WEB_FETCH_MAX_BYTES", 300000))
+    WEB_FETCH_TIMEOUT = float(os.environ.get("WEB_FETCH_TIMEOUT", 10))
+    # プロンプトに渡す会社情報テキストの最大文字数
+    WEB_TEXT_MAX_CHARS = int(os.environ.get("WEB_TEXT_MAX_CHARS", 1200))
+    # 会社プロフィール（ドメイン単位で保存する要約）の最大文字数と再取得までの日数
+    COMPANY_SUMMARY_MAX_CHARS = int(os.environ.get("COMPANY_SUMMARY_MAX_CHARS", 400))
+    COMPANY_PROFILE_TTL_DAYS = int(os.environ.get("COMPANY_PROFILE_TTL_DAYS", 30))
+    # 取得に失敗したドメインを再試行するまでの時間
+    COMPANY_PROFILE_RETRY_HOURS = int(os.environ.get("COMPANY_PROFILE_RETRY_HOURS", 24))
+
+    # 負荷試験用の代替プロバイダ（AI・画像解析・メール送信を外部に送らずに模擬する）
+    FAKE_PROVIDERS = os.environ.get("FAKE_PROVIDERS", "false").lower() == "true"
+    # レイテンシの中央値（ミリ秒）と対数正規分布のばらつき。VISION / MAIL は個別に指定できる
+    FAKE_LATENCY_MS = float(os.environ.get("FAKE_LATENCY_MS", 800))
+    FAKE_VISION_LATENCY_MS = float(os.environ.get("FAKE_VISION_LATENCY_MS", 1500))
+    FAKE_MAIL_LATENCY_MS = float(os.environ.get("FAKE_MAIL_LATENCY_MS", 200))
+    FAKE_LATENCY_SIGMA = float(os.environ.get("FAKE_LATENCY_SIGMA", 0.3))
+    # エラー（503）・429 の発生率と、プロバイダごとの秒間リクエスト上限（0 で無制限）
+    FAKE_ERROR_RATE = float(os.environ.get("FAKE_ERROR_RATE", 0))
+    FAKE_RATE_LIMIT_RATE = float(os.environ.get("FAKE_RATE_LIMIT_RATE", 0))
+    FAKE_MAX_RPS = float(os.environ.get("FAKE_MAX_RPS", 0))
+    FAKE_SEED = int(os.environ["FAKE_SEED"]) if os.environ.get("FAKE_SEED") else None
+
+    # ユーザーごとの月間のAI利用トークン数の上限（0 で無制限、管理者は対象外）
+    AI_MONTHLY_TOKEN_LIMIT = int(os.environ.get("AI_MONTHLY_TOKEN_LIMIT", 0))
+    # AI利用記録をまとめて書き込む件数と待ち時間（秒）
+    AI_USAGE_BATCH_SIZE = int(os.environ.get("AI_USAGE_BATCH_SIZE", 100))
+    AI_USAGE_FLUSH_INTERVAL = float(os.environ.get("AI_USAGE_FLUSH_INTERVAL", 2))
+
+    # 一括送信で1件送るごとに空ける間隔（秒）
+    BULK_SEND_INTERVAL = float(os.environ.get("BULK_SEND_INTERVAL", 1))
 
     # Email settings
     RESEND_API_KEY = os.environ.get("RESEND_API_KEY", "")
 
+    # ログインユーザーのキャッシュ有効期間（秒、0 で無効）
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 30))
+    # 管理画面のユーザー絞り込み一覧のキャッシュ有効期間（秒）
+    USER_DIRECTORY_TTL = int(os.environ.get("USER_DIRECTORY_TTL", 300))
+
+    # ログ（JSON 形式、書き込みは別スレッド）。LOG_LEVELS はモジュールごとのレベル
+    # 例: LOG_LEVELS="services.csv_service=DEBUG,sqlalchemy.engine=WARNING"
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+    LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+    LOG_FILE = os.environ.get("LOG_FILE", os.path.join("logs", "app.log"))
+    # サイズでローテーションする（バイト / 世代数）
+    LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+    # 標準エラーにも出力する（IIS では stdoutLogFile に保存される）
+    LOG_CONSOLE = os.environ.get("LOG_CONSOLE", "true").lower() == "true"
+
+    # トレース（処理段階ごとの span）。TRACING_EXPORTER は file（JSON Lines）または otlp（opentelemetry-sdk が必要）
+    TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_EXPORTER = os.environ.get("TRACING_EXPORTER", "file")
+    TRACING_FILE = os.environ.get("TRACING_FILE", os.path.join("logs", "traces.jsonl"))
+    TRACING_SERVICE_NAME = os.environ.get("TRACING_SERVICE_NAME", "wesales")
+
+    # リクエストの計測（所要時間・SQL 件数）としきい値（ミリ秒 / 件）
+    MONITORING_ENABLED = os.environ.get("MONITORING_ENABLED", "true").lower() == "true"
+    SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+    # 1リクエストの SQL 件数がこれ以上なら警告する（N+1 の検出用）
+    REQUEST_QUERY_WARN = int(os.environ.get("REQUEST_QUERY_WARN", 30))
+    # /metrics を Prometheus から収集するためのトークン（Authorization: Bearer、空なら管理者ログインのみ）
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+    # プロファイル（管理者が ?_profile=1 / X-Profile: 1 を付けたリクエスト、または一定割合のリクエスト）
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+    # 保存しておくプロファイルの件数（古いものから削除）
+    PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 50))
+
     # Security settings (Session)
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_HTTPONLY = True
@@ -0,0 +1,186 @@
+from sqlalchemy import delete, event, func, inspect, literal, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from extensions import db
+
+# TestConfig など Config を継承しない設定クラスでも動くよう、既定値はここで持つ
+SQLITE_DEFAULTS = {
+    "SQLITE_TUNING_ENABLED": True,
+    "SQLITE_JOURNAL_MODE": "WAL",
+    "SQLITE_SYNCHRONOUS": "NORMAL",
+    "SQLITE_BUSY_TIMEOUT_MS": 15000,
+    "SQLITE_MMAP_SIZE": 256 * 1024 * 1024,
+    "SQLITE_CACHE_SIZE_KB": 64 * 1024,
+    "SQLITE_POOL_SIZE": 10,
+    "DB_POOL_SIZE": 10,
+    "DB_MAX_OVERFLOW": 20,
+    "DB_POOL_RECYCLE": 1800,
+    "DB_POOL_TIMEOUT": 30,
+}
+
+# SQLite の変数上限（古い版では 999）を超えないよう IN 句を分割する
+DELETE_CHUNK_SIZE = 500
+
+
+def _setting(app, key):
+    return app.config.get(key, SQLITE_DEFAULTS[key])
+
+
+def is_sqlite_memory(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def build_engine_options(app):
+    """DB URI に応じたエンジンオプション（プール設定・接続引数）を組み立てる"""
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+
+    if make_url(uri).get_backend_name() == "sqlite" and not is_sqlite_memory(uri):
+        connect_args = dict(options.get("connect_args") or {})
+        # sqlite3 側のロック待ち（秒）。PRAGMA busy_timeout と揃える
+        connect_args.setdefault("timeout", _setting(app, "SQLITE_BUSY_TIMEOUT_MS") / 1000.0)
+        connect_args.setdefault("check_same_thread", False)
+        options["connect_args"] = connect_args
+        options.setdefault("pool_size", _setting(app, "SQLITE_POOL_SIZE"))
+        options.setdefault("max_overflow", _setting(app, "SQLITE_POOL_SIZE"))
+        options.setdefault("pool_pre_ping", False)
+    elif make_url(uri).get_backend_name() != "sqlite":
+        options.setdefault("pool_size", _setting(app, "DB_POOL_SIZE"))
+        options.setdefault("max_overflow", _setting(app, "DB_MAX_OVERFLOW"))
+        options.setdefault("pool_recycle", _setting(app, "DB_POOL_RECYCLE"))
+        options.setdefault("pool_timeout", _setting(app, "DB_POOL_TIMEOUT"))
+        # サーバー側で切断された接続を使い回さない
+        options.setdefault("pool_pre_ping", True)
+
+    return options
+
+
+def _sqlite_pragmas(app, memory):
+    pragmas = [
+        ("busy_timeout", int(_setting(app, "SQLITE_BUSY_TIMEOUT_MS"))),
+        ("cache_size", -int(_setting(app, "SQLITE_CACHE_SIZE_KB"))),  # 負数は KiB 指定
+    ]
+    if not memory:
+        # WAL / mmap はファイルDBでのみ意味を持つ
+        pragmas = [
+            ("journal_mode", _setting(app, "SQLITE_JOURNAL_MODE")),
+            ("synchronous", _setting(app, "SQLITE_SYNCHRONOUS")),
+            ("mmap_size", int(_setting(app, "SQLITE_MMAP_SIZE"))),
+        ] + pragmas
+    return pragmas
+
+
+def init_database(app):
+    """SQLAlchemy を初期化し、SQLite の場合は接続ごとに PRAGMA を適用する"""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = build_engine_options(app)
+    db.init_app(app)
+
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if make_url(uri).get_backend_name() != "sqlite" or not _setting(app, "SQLITE_TUNING_ENABLED"):
+        return
+
+    pragmas = _sqlite_pragmas(app, is_sqlite_memory(uri))
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+UPSERT_DIALECTS = ("postgresql", "sqlite")
+
+
+def dialect_insert(table, dialect):
+    """ON CONFLICT 句を使える INSERT 文を方言に合わせて返す（SQLite / PostgreSQL）"""
+    if dialect.name == "postgresql":
+        return postgresql.insert(table)
+    if dialect.name == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upsert is not supported for dialect: {dialect.name}")
+
+
+def upsert(connection, table, values, index_elements, set_, where=None):
+    """INSERT ... ON CONFLICT DO UPDATE を実行する
+
+    ON CONFLICT 非対応の方言では UPDATE し、該当行がなければ INSERT する
+    （同時に同じキーを作成した場合は一意制約違反になりうる）。
+    where を指定すると、条件に合う既存行だけを更新する。
+    """
+    if connection.dialect.name in UPSERT_DIALECTS:
+        stmt = dialect_insert(table, connection.dialect).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_, where=where)
+        connection.execute(stmt)
+        return
+
+    key = [column == values[column.name] for column in index_elements]
+    update = table.update().where(*key).values(**set_)
+    if where is not None:
+        update = update.where(where)
+    if connection.execute(update).rowcount:
+        return
+    exists = connection.execute(select(literal(1)).select_from(table).where(*key)).first()
+    if exists is None:
+        connection.execute(table.insert().values(**values))
+
+
+def reset_sequences(table, connection):
+    """ID を指定して INSERT したテーブルの ID シーケンスを最大値に合わせる（PostgreSQL）"""
+    pk_columns = list(table.primary_key.columns)
+    if len(pk_columns) != 1 or not pk_columns[0].autoincrement or pk_columns[0].type.python_type is not int:
+        return
+    pk = pk_columns[0]
+    max_id = connection.execute(select(func.max(pk))).scalar()
+    if max_id is None:
+        return
+    connection.execute(
+        text("SELECT setval(pg_get_serial_sequence(:table, :column), :value)"),
+        {"table": f'"{table.name}"', "column": pk.name, "value": max_id},
+    )
+
+
+def create_missing_indexes():
+    """既存テーブルに後から追加したインデックスを作成する（create_all はテーブル単位のため）"""
+    engine = db.engine
+    existing_tables = set(inspect(engine).get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def delete_by_ids(model, ids, *criteria, returning=(), chunk_size=DELETE_CHUNK_SIZE):
+    """DELETE ... WHERE id IN (...) をチャンク単位で実行する
+
+    ORM オブジェクトを読み込まずに削除する。returning に列を渡すと削除した行の値を
+    返す（RETURNING 非対応の方言では削除前に同じ条件で SELECT する）。
+    戻り値は (削除件数, returning の行リスト)。
+    """
+    unique_ids = list(dict.fromkeys(int(i) for i in ids))
+    supports_returning = db.session.get_bind().dialect.delete_returning
+    options = {"synchronize_session": False}
+
+    deleted = 0
+    rows = []
+    for start in range(0, len(unique_ids), chunk_size):
+        conditions = [model.id.in_(unique_ids[start:start + chunk_size]), *criteria]
+        stmt = delete(model).where(*conditions)
+        if not returning:
+            deleted += db.session.execute(stmt, execution_options=options).rowcount
+        elif supports_returning:
+            chunk_rows = db.session.execute(stmt.returning(*returning), execution_options=options).all()
+            rows.extend(chunk_rows)
+            deleted += len(chunk_rows)
+        else:
+            chunk_rows = db.session.execute(select(*returning).where(*conditions)).all()
+            db.session.execute(stmt, execution_options=options)
+            rows.extend(chunk_rows)
+            deleted += len(chunk_rows)
+    return deleted, rows
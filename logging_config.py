@@ -0,0 +1,139 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+
+# LogRecord の標準属性（これ以外の属性は extra として JSON に含める）
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_CHARS = re.compile(r"[^\w.-]")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """ログを1行の JSON にする"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """リクエスト中のログにリクエスト ID・メソッド・パスを付ける
+
+    QueueHandler の書き込みは別スレッドで行われるため、ログを出したスレッドで付与する。
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # 書き込みスレッドで整形できるよう、メッセージと例外を文字列に確定させる
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(value):
+    """"services.csv_service=DEBUG,sqlalchemy.engine=WARNING" をモジュールごとのレベルにする"""
+    levels = {}
+    for item in (value or "").split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _build_handlers(log_file, max_bytes, backup_count, console):
+    formatter = JsonFormatter()
+    handlers = []
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handlers.append(file_handler)
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(level="INFO", levels=None, log_file="", max_bytes=10 * 1024 * 1024, backup_count=5, console=True):
+    """ルートロガーを QueueHandler 経由の JSON 出力にする（ディスクへの書き込みは別スレッド）
+
+    複数回呼ばれた場合はレベルのみ更新する。
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    _listener = QueueListener(
+        log_queue, *_build_handlers(log_file, max_bytes, backup_count, console), respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def init_logging(app):
+    """ログの設定とリクエスト ID の付与（X-Request-ID ヘッダがあれば引き継ぐ）"""
+    configure_logging(
+        level=app.config.get("LOG_LEVEL", "INFO"),
+        levels=parse_levels(app.config.get("LOG_LEVELS", "")),
+        log_file=app.config.get("LOG_FILE", ""),
+        max_bytes=app.config.get("LOG_MAX_BYTES", 10 * 1024 * 1024),
+        backup_count=app.config.get("LOG_BACKUP_COUNT", 5),
+        console=app.config.get("LOG_CONSOLE", True),
+    )
+
+    @app.before_request
+    def _assign_request_id():
+        incoming = _REQUEST_ID_CHARS.sub("", request.headers.get(REQUEST_ID_HEADER, ""))[:64]
+        g.request_id = incoming or uuid.uuid4().hex
+
+    @app.after_request
+    def _return_request_id(response):
+        if "request_id" in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
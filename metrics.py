@@ -0,0 +1,230 @@
+"""
+プロセス内のメトリクス（カウンター・ヒストグラム）と Prometheus テキスト形式での出力
+
+値はラベルの組ごとに保持し、更新はロックで保護するためマルチスレッドのワーカーでも安全。
+値はプロセスごとに保持される（複数プロセスで動かす場合は各プロセスを個別に収集する）。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# レイテンシのヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class HistogramBuckets:
+    """スレッドセーフな累積ヒストグラム（区切りごとの件数・合計・件数）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def percentile(self, pct):
+        """区切りの上端で近似したパーセンタイル（最上位の区切りを超える場合は inf）"""
+        counts, total, _ = self.snapshot()
+        if not total:
+            return None
+        target = pct / 100 * total
+        running = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            if running >= target:
+                return bound
+        return float("inf")
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _child(self, labels):
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._items():
+            lines += self._render_child(key, child)
+        return lines
+
+
+class Counter(_Metric):
+    """増加のみのカウンター"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1, **labels):
+        self._child(labels).inc(amount)
+
+    def value(self, **labels):
+        return self._child(labels).value
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{self._format_labels(key)} {_format_value(child.value)}"]
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram(_Metric):
+    """ラベルの組ごとの HistogramBuckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return HistogramBuckets(self.buckets)
+
+    def observe(self, value, **labels):
+        self._child(labels).observe(value)
+
+    def labels(self, **labels):
+        return self._child(labels)
+
+    def _render_child(self, key, child):
+        counts, total, value_sum = child.snapshot()
+        lines = []
+        running = 0
+        for bound, n in zip(child.buckets + (float("inf"),), counts):
+            running += n
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {running}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(value_sum)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {total}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    """メトリクスの登録と Prometheus テキスト形式への出力"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} is already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- アプリ全体で使うメトリクス ---
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "wesales_http_request_duration_seconds", "HTTP request latency by endpoint.", ("endpoint", "method"))
+AI_REQUESTS = REGISTRY.counter(
+    "wesales_ai_requests_total", "AI provider calls by operation, provider and outcome.", ("operation", "provider", "outcome"))
+AI_REQUEST_SECONDS = REGISTRY.histogram(
+    "wesales_ai_request_duration_seconds", "AI provider call latency including retries.", ("operation", "provider"))
+AI_RETRIES = REGISTRY.counter(
+    "wesales_ai_retries_total", "AI provider calls retried after a 429 response.", ("operation", "provider"))
+CARD_EXTRACTIONS = REGISTRY.counter(
+    "wesales_card_extractions_total", "Card OCR text structured locally or with the LLM.", ("method",))
+COMPANY_FETCHES = REGISTRY.counter(
+    "wesales_company_fetch_total", "Company website fetches by result status.", ("outcome",))
+COMPANY_FETCH_SECONDS = REGISTRY.histogram(
+    "wesales_company_fetch_duration_seconds", "Company website fetch latency.")
+COMPANY_PROFILE_LOOKUPS = REGISTRY.counter(
+    "wesales_company_profile_lookups_total", "Company profile lookups served from the database or fetched.", ("source",))
+MAIL_SENDS = REGISTRY.counter(
+    "wesales_mail_send_total", "Emails sent by provider and outcome.", ("provider", "outcome"))
+MAIL_SEND_SECONDS = REGISTRY.histogram(
+    "wesales_mail_send_duration_seconds", "Email send latency by provider.", ("provider",))
+
+
+@contextmanager
+def track(counter, histogram, classify=None, **labels):
+    """ブロックの所要時間を histogram に、結果（success / 例外の分類）を counter の outcome ラベルに記録する
+
+    histogram は outcome 以外の labels で記録する。classify は例外から outcome を返す関数（既定は "error"）。
+    """
+    started = time.perf_counter()
+    outcome = "success"
+    try:
+        yield
+    except BaseException as e:
+        outcome = classify(e) if classify else "error"
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+        counter.inc(outcome=outcome, **labels)
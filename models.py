@@ -44,6 +44,16 @@ class History(db.Model):
     sent_at = db.Column(db.DateTime, default=datetime.now)
     user = db.relationship("User", backref=db.backref("histories", lazy=True))
 
+    __table_args__ = (
+        db.Index("ix_history_user_sent_at", "user_id", "sent_at"),
+    )
+
+class SendCounter(db.Model):
+    """月間送信数のカウンタ（History 件数を月単位で集計したもの）"""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    period = db.Column(db.String(7), primary_key=True) # "YYYY-MM"
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+
 class Card(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -59,6 +69,11 @@ class Card(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     user = db.relationship("User", backref=db.backref("cards", lazy=True))
 
+    __table_args__ = (
+        db.Index("ix_card_user_email", "user_id", "email"),
+        db.Index("ix_card_user_created_at", "user_id", "created_at"),
+    )
+
     @property
     def person_name(self):
         return f"{self.last_name or ''} {self.first_name or ''}".strip()
@@ -72,3 +87,59 @@ class Card(db.Model):
         else:
             self.last_name = ""
             self.first_name = ""
+
+class ContactKey(db.Model):
+    """名刺の重複候補検出用の正規化キー（ブロッキングキー）"""
+    id = db.Column(db.Integer, primary_key=True)
+    card_id = db.Column(db.Integer, db.ForeignKey("card.id"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False) # email / phone / name_company
+    value = db.Column(db.String(255), nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_contact_key_lookup", "user_id", "kind", "value"),
+    )
+
+class CompanyProfile(db.Model):
+    """会社Webサイトの抽出結果（ドメイン単位で共有し、名刺からは URL のドメインで参照する）"""
+    id = db.Column(db.Integer, primary_key=True)
+    domain = db.Column(db.String(255), unique=True, nullable=False)
+    url = db.Column(db.String(200))
+    status = db.Column(db.String(10), nullable=False) # ok / empty / error
+    title = db.Column(db.String(255))
+    description = db.Column(db.Text)
+    og_title = db.Column(db.String(255))
+    og_description = db.Column(db.Text)
+    og_site_name = db.Column(db.String(255))
+    summary = db.Column(db.Text)
+    fetched_at = db.Column(db.DateTime, default=datetime.now)
+
+class AIUsage(db.Model):
+    """AI呼び出し1回ごとの利用記録（トークン数・所要時間・キャッシュ利用）"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, index=True) # バッチ処理など利用者が無い場合は NULL
+    operation = db.Column(db.String(20), nullable=False) # completion / stream / vision / rewrite
+    provider = db.Column(db.String(20)) # azure / gemini（キャッシュ利用時は NULL）
+    model = db.Column(db.String(100))
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Integer, nullable=False, default=0)
+    cache_hit = db.Column(db.Boolean, nullable=False, default=False)
+    success = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index("ix_ai_usage_user_created_at", "user_id", "created_at"),
+    )
+
+class AIUsageMonthly(db.Model):
+    """AI利用の月次集計（ユーザー・処理ごと）。user_id 0 は利用者なし"""
+    user_id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(7), primary_key=True) # "YYYY-MM"
+    operation = db.Column(db.String(20), primary_key=True)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    cache_hits = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completion_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    latency_ms = db.Column(db.BigInteger, nullable=False, default=0) # 合計
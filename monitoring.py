@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import HTTP_REQUEST_SECONDS, HistogramBuckets
+
+logger = logging.getLogger(__name__)
+
+# ログに出す SQL の最大文字数
+SQL_LOG_MAX_CHARS = 2000
+
+
+class RequestStats:
+    """エンドポイントごとのレイテンシ・SQL 件数と時間の集計"""
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, query_count, query_time):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "latency": HistogramBuckets(), "requests": 0, "queries": 0, "query_time": 0.0,
+                }
+            entry["requests"] += 1
+            entry["queries"] += query_count
+            entry["query_time"] += query_time
+        entry["latency"].observe(elapsed)
+
+    def summary(self):
+        with self._lock:
+            items = list(self._endpoints.items())
+        rows = []
+        for endpoint, entry in items:
+            histogram = entry["latency"]
+            requests = entry["requests"] or 1
+            rows.append({
+                "endpoint": endpoint,
+                "requests": entry["requests"],
+                "avg_ms": round(histogram.sum / requests * 1000, 1),
+                "p50_ms": _ms(histogram.percentile(50)),
+                "p95_ms": _ms(histogram.percentile(95)),
+                "avg_queries": round(entry["queries"] / requests, 1),
+                "avg_query_ms": round(entry["query_time"] / requests * 1000, 1),
+            })
+        rows.sort(key=lambda r: r["avg_ms"] * r["requests"], reverse=True)
+        return rows
+
+
+def _ms(seconds):
+    if seconds is None:
+        return None
+    return None if seconds == float("inf") else round(seconds * 1000, 1)
+
+
+def _shorten(statement):
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= SQL_LOG_MAX_CHARS else statement[:SQL_LOG_MAX_CHARS] + "..."
+
+
+def _tracking():
+    return has_request_context() and "monitor_started" in g
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _tracking():
+        conn.info.setdefault("monitor_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("monitor_query_start")
+    if not starts or not _tracking():
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    g.monitor_query_count += 1
+    g.monitor_query_time += elapsed
+    # 同じ SQL の繰り返し（N+1）を検出するため文ごとに数える
+    g.monitor_statements[statement] += 1
+    if elapsed * 1000 >= current_app.config.get("SLOW_QUERY_MS", 200):
+        logger.warning("Slow query %.1fms on %s %s: %s", elapsed * 1000, request.method, request.path, _shorten(statement))
+
+
+def init_monitoring(app):
+    """リクエストごとの所要時間と SQL の件数・時間を計測する
+
+    しきい値を超えたリクエスト（SLOW_REQUEST_MS）・SQL（SLOW_QUERY_MS）・
+    SQL 件数（REQUEST_QUERY_WARN、N+1 の検出用）を警告ログに出す。
+    """
+    stats = RequestStats()
+    app.extensions["request_stats"] = stats
+    if not app.config.get("MONITORING_ENABLED", True):
+        return
+
+    @app.before_request
+    def _start_monitoring():
+        g.monitor_started = time.perf_counter()
+        g.monitor_query_count = 0
+        g.monitor_query_time = 0.0
+        g.monitor_statements = Counter()
+
+    @app.after_request
+    def _finish_monitoring(response):
+        started = g.pop("monitor_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        stats.record(endpoint, elapsed, g.monitor_query_count, g.monitor_query_time)
+        HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method)
+        response.headers["Server-Timing"] = (
+            f'app;dur={elapsed * 1000:.1f}, db;dur={g.monitor_query_time * 1000:.1f};desc="{g.monitor_query_count} queries"'
+        )
+
+        slow = elapsed * 1000 >= app.config.get("SLOW_REQUEST_MS", 1000)
+        chatty = g.monitor_query_count >= app.config.get("REQUEST_QUERY_WARN", 30)
+        if slow or chatty:
+            repeated = [
+                f"{count}x {_shorten(statement)}"
+                for statement, count in g.monitor_statements.most_common(3) if count > 1
+            ]
+            logger.warning(
+                "%s request %s %s -> %s in %.1fms (%d queries, %.1fms in DB)%s",
+                "Slow" if slow else "Query-heavy",
+                request.method, request.path, response.status_code, elapsed * 1000,
+                g.monitor_query_count, g.monitor_query_time * 1000,
+                "; repeated SQL: " + " | ".join(repeated) if repeated else "",
+            )
+        return response
+
+    @app.teardown_request
+    def _abort_monitoring(exc):
+        # 例外で after_request が呼ばれなかった場合に計測状態を残さない
+        g.pop("monitor_started", None)
@@ -0,0 +1,132 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from flask import g, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+# 管理者がこのクエリ文字列またはヘッダを付けたリクエストをプロファイルする
+PROFILE_QUERY_FLAG = "_profile"
+PROFILE_HEADER = "X-Profile"
+
+_PROFILE_NAME = re.compile(r"^[\w.-]+\.pstats$")
+
+# プロファイラは同時に1つしか動かせないため、実行中は他のリクエストを対象にしない
+_profile_lock = threading.Lock()
+
+
+def _requested_by_admin():
+    if request.args.get(PROFILE_QUERY_FLAG) != "1" and request.headers.get(PROFILE_HEADER) != "1":
+        return False
+    return current_user.is_authenticated and current_user.is_admin
+
+
+def init_profiling(app):
+    """管理者の指定したリクエスト、または PROFILE_SAMPLE_RATE の割合のリクエストを cProfile で計測する
+
+    結果は PROFILE_DIR に pstats 形式で保存し、管理ダッシュボードからダウンロードできる。
+    """
+    app.extensions["profile_dir"] = app.config.get("PROFILE_DIR", "profiles")
+
+    @app.before_request
+    def _start_profile():
+        sampled = random.random() < app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+        if not (sampled or _requested_by_admin()):
+            return
+        if not _profile_lock.acquire(blocking=False):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception as e:
+            # 別のプロファイラが動いている場合など。リクエストは失敗させずに計測を省く
+            _profile_lock.release()
+            logger.warning("Profiler could not be enabled, skipping profile: %s", e)
+            return
+        g.profiler = profiler
+        g.profile_started = time.perf_counter()
+        g.profile_reason = "sampled" if sampled else "admin"
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        _profile_lock.release()
+        elapsed = time.perf_counter() - g.pop("profile_started")
+        try:
+            name = save_profile(
+                profiler, app.extensions["profile_dir"], request.endpoint, elapsed, g.pop("profile_reason"),
+                keep=app.config.get("PROFILE_KEEP", 50),
+            )
+            response.headers["X-Profile-Id"] = name
+        except OSError as e:
+            logger.warning("Failed to save profile: %s", e)
+        # ストリーミングの応答は本文の生成前までを計測する
+        return response
+
+    @app.teardown_request
+    def _abort_profile(exc):
+        # 例外で after_request が呼ばれなかった場合にプロファイラを止める
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+
+
+def save_profile(profiler, profile_dir, endpoint, elapsed, reason, keep=50):
+    """プロファイル結果を保存し、ファイル名を返す。keep 件を超えた古いものは削除する"""
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    endpoint = re.sub(r"[^\w.-]", "_", endpoint or "unmatched")
+    name = f"{stamp}_{reason}_{endpoint}_{elapsed * 1000:.0f}ms.pstats"
+    profiler.dump_stats(os.path.join(profile_dir, name))
+
+    for old in list_profiles(profile_dir)[keep:]:
+        try:
+            os.remove(os.path.join(profile_dir, old["name"]))
+        except OSError:
+            pass
+    return name
+
+
+def list_profiles(profile_dir):
+    """保存済みのプロファイルを新しい順に返す"""
+    if not os.path.isdir(profile_dir):
+        return []
+    profiles = []
+    for name in os.listdir(profile_dir):
+        if not _PROFILE_NAME.match(name):
+            continue
+        try:
+            size = os.path.getsize(os.path.join(profile_dir, name))
+        except OSError:
+            continue
+        profiles.append({"name": name, "size": size})
+    profiles.sort(key=lambda p: p["name"], reverse=True)
+    return profiles
+
+
+def profile_path(profile_dir, name):
+    """ファイル名を検証してパスを返す（不正な名前や存在しない場合は None）"""
+    if not _PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(profile_dir, name)
+    return path if os.path.isfile(path) else None
+
+
+def profile_report(path, limit=40):
+    """pstats を累積時間順のテキストにする"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
@@ -1,10 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, request, abort
+from flask import Blueprint, render_template, redirect, url_for, request, abort, jsonify, current_app, Response, send_file
 from flask_login import login_required, current_user
 from extensions import db, bcrypt
 from models import User
-from services.mail_service import get_monthly_sent_count, get_resend_metrics
+from services.mail_service import get_monthly_sent_counts, get_resend_metrics
+from services.user_service import get_user_directory
+from services.usage_service import get_usage_summary
 from config import Config
 from functools import wraps
+from metrics import REGISTRY
+from profiling import list_profiles, profile_path, profile_report
+import hmac
+import os
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -21,16 +27,57 @@ def admin_required(f):
 @admin_required
 def admin_users():
     users = User.query.all()
+    sent_counts = get_monthly_sent_counts([user.id for user in users])
     for user in users:
-        user.current_sent = get_monthly_sent_count(user.id)
+        user.current_sent = sent_counts[user.id]
     return render_template("admin_list.html", users=users)
 
+@admin_bp.route("/admin/api/users")
+@login_required
+@admin_required
+def admin_user_directory():
+    """ユーザー絞り込み用の一覧 (id, username, display_name) を返す"""
+    return jsonify([entry._asdict() for entry in get_user_directory()])
+
+@admin_bp.route("/admin/api/request_stats")
+@login_required
+@admin_required
+def admin_request_stats():
+    """エンドポイントごとのレイテンシと SQL 件数の集計を返す"""
+    return jsonify(current_app.extensions["request_stats"].summary())
+
+@admin_bp.route("/metrics")
+def metrics():
+    """メトリクスを Prometheus テキスト形式で返す（管理者、または METRICS_TOKEN の Bearer 認証）"""
+    token = current_app.config.get("METRICS_TOKEN", "")
+    authorization = request.headers.get("Authorization", "")
+    if not (token and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())):
+        if not current_user.is_authenticated or not current_user.is_admin:
+            abort(403)
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @admin_bp.route("/admin/dashboard")
 @login_required
 @admin_required
 def admin_dashboard():
     metrics = get_resend_metrics()
-    return render_template("admin_dashboard.html", metrics=metrics, ai_engine=Config.AI_ENGINE_TYPE)
+    profiles = list_profiles(current_app.extensions["profile_dir"])[:20]
+    return render_template(
+        "admin_dashboard.html", metrics=metrics, ai_engine=Config.AI_ENGINE_TYPE, profiles=profiles,
+        usage=get_usage_summary(), token_limit=Config.AI_MONTHLY_TOKEN_LIMIT,
+    )
+
+@admin_bp.route("/admin/profiles/<name>")
+@login_required
+@admin_required
+def admin_download_profile(name):
+    """保存済みのプロファイルを返す（?format=text で累積時間順のテキスト）"""
+    path = profile_path(current_app.extensions["profile_dir"], name)
+    if path is None:
+        abort(404)
+    if request.args.get("format") == "text":
+        return Response(profile_report(path), mimetype="text/plain")
+    return send_file(os.path.abspath(path), mimetype="application/octet-stream", as_attachment=True, download_name=name)
 
 @admin_bp.route("/admin/users/add", methods=["GET", "POST"])
 @login_required
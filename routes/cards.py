@@ -1,18 +1,32 @@
+import logging
 import os
 import uuid
-import json
 import time
 
-from flask import Blueprint, render_template, redirect, url_for, request, jsonify, abort, current_app
+from flask import Blueprint, Response, render_template, redirect, url_for, request, jsonify, abort, current_app, stream_with_context
 from flask_login import current_user, login_required
 from extensions import db
-from models import Card, User, History
-from services.ai_service import analyze_card_image, get_ai_completion
-from services.web_service import get_company_info
+from database import delete_by_ids
+from models import Card, History
+from services.ai_service import analyze_card_image, get_ai_completion, stream_ai_completion
+from services.draft_service import (
+    DraftStreamParser, TEXT_OUTPUT_RULES, build_email_prompt, format_sse, generate_email_drafts
+)
+from services.company_service import find_company_profile, get_company_info, get_company_info_batch
 from services.mail_service import send_email
+from services.user_service import get_user_directory
+from services.image_service import schedule_image_cleanup
+from services.search_service import search_cards
+from services.usage_service import AIQuotaExceeded, check_ai_quota
+from services.image_preprocess import ImageQueueFull
+from services.dedup_service import (
+    delete_contact_keys, find_duplicate_candidates, find_duplicate_groups, merge_cards
+)
 from config import Config
+from tracing import span
 
 cards_bp = Blueprint("cards", __name__)
+logger = logging.getLogger(__name__)
 
 @cards_bp.route("/cards")
 @login_required
@@ -24,8 +38,9 @@ def show_cards():
         if user_id:
             query = query.filter_by(user_id=user_id)
         cards = query.order_by(Card.created_at.desc()).all()
-        users = User.query.all()
-        return render_template("card_list.html", cards=cards, users=users, selected_user_id=user_id)
+        users = get_user_directory()
+        return render_template("card_list.html", cards=cards, users=users,
+                               user_map={u.id: u for u in users}, selected_user_id=user_id)
     else:
         cards = (
             Card.query.filter_by(user_id=current_user.id)
@@ -34,6 +49,39 @@ def show_cards():
         )
         return render_template("card_list.html", cards=cards)
 
+@cards_bp.route("/api/cards/search")
+@login_required
+def search_cards_api():
+    """名刺の全文検索API（関連度順・ページング対応）"""
+    query_text = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    per_page = min(request.args.get("per_page", 20, type=int), 100)
+
+    if current_user.is_admin:
+        user_id = request.args.get("user_id", type=int)
+    else:
+        user_id = current_user.id
+
+    cards, total = search_cards(query_text, user_id=user_id, page=page, per_page=per_page)
+    return jsonify({
+        "items": [
+            {
+                "id": card.id,
+                "company_name": card.company_name,
+                "department_name": card.department_name,
+                "job_title": card.job_title,
+                "person_name": card.person_name,
+                "email": card.email,
+                "url": card.url,
+                "detail_url": url_for("cards.card_detail", card_id=card.id),
+            }
+            for card in cards
+        ],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+    })
+
 @cards_bp.route("/upload", methods=["POST"])
 @login_required
 def upload():
@@ -64,7 +112,13 @@ def upload():
         db.session.add(new_card)
         db.session.commit()
 
-        return jsonify({"message": "登録完了", "card_id": new_card.id})
+        # 新しく登録した名刺についてのみ重複候補を調べる（全件の再走査はしない）
+        duplicates = [c.id for c in find_duplicate_candidates(new_card)]
+        return jsonify({"message": "登録完了", "card_id": new_card.id, "duplicate_ids": duplicates})
+    except AIQuotaExceeded as e:
+        return jsonify({"message": str(e)}), 429
+    except ImageQueueFull as e:
+        return jsonify({"message": str(e)}), 503
     except Exception as e:
         return jsonify({"message": f"エラー: {str(e)}"}), 500
 
@@ -76,7 +130,7 @@ def card_detail(card_id):
         abort(404)
     if not current_user.is_admin and card.user_id != current_user.id:
         abort(403)
-    return render_template("card_detail.html", card=card)
+    return render_template("card_detail.html", card=card, company_profile=find_company_profile(card.url))
 
 @cards_bp.route("/cards/<int:card_id>/edit", methods=["GET", "POST"])
 @login_required
@@ -125,8 +179,10 @@ def card_delete(card_id):
     if not current_user.is_admin and card.user_id != current_user.id:
         abort(403)
         
+    image_path = card.image_path
     db.session.delete(card)
     db.session.commit()
+    schedule_image_cleanup([image_path])
     return redirect(url_for("cards.show_cards"))
 
 @cards_bp.route("/cards/delete", methods=["POST"])
@@ -138,19 +194,53 @@ def bulk_delete_cards():
         return jsonify({"message": "削除対象が選択されていません"}), 400
         
     try:
-        if current_user.is_admin:
-            cards_to_delete = Card.query.filter(Card.id.in_(card_ids)).all()
-        else:
-            cards_to_delete = Card.query.filter(Card.id.in_(card_ids), Card.user_id == current_user.id).all()
-            
-        count = len(cards_to_delete)
-        for card in cards_to_delete:
-            db.session.delete(card)
+        criteria = [] if current_user.is_admin else [Card.user_id == current_user.id]
+        delete_contact_keys(card_ids, user_id=None if current_user.is_admin else current_user.id)
+        count, rows = delete_by_ids(Card, card_ids, *criteria, returning=(Card.image_path,))
         db.session.commit()
+        # 画像ファイルの削除はレスポンスを待たせないようバックグラウンドで行う
+        schedule_image_cleanup(row.image_path for row in rows)
         return jsonify({"message": f"{count}件の名刺を削除しました"})
     except Exception as e:
         return jsonify({"message": f"削除失敗: {str(e)}"}), 500
 
+@cards_bp.route("/api/cards/duplicates")
+@login_required
+def duplicate_cards():
+    """重複候補の名刺グループを返す"""
+    user_id = current_user.id
+    if current_user.is_admin:
+        user_id = request.args.get("user_id", current_user.id, type=int)
+    return jsonify({"groups": find_duplicate_groups(user_id)})
+
+@cards_bp.route("/api/cards/merge", methods=["POST"])
+@login_required
+def merge_duplicate_cards():
+    """重複名刺の一括統合API
+
+    {"merges": [{"primary_id": 1, "duplicate_ids": [2, 3]}, ...]}
+    """
+    data = request.get_json() or {}
+    merges = data.get("merges", [])
+    if not merges:
+        return jsonify({"message": "統合対象が選択されていません"}), 400
+
+    owner_id = None if current_user.is_admin else current_user.id
+    try:
+        merged = 0
+        removed_images = []
+        for item in merges:
+            primary, images = merge_cards(item.get("primary_id"), item.get("duplicate_ids", []), user_id=owner_id)
+            if primary is not None:
+                merged += 1
+                removed_images.extend(images)
+        db.session.commit()
+        schedule_image_cleanup(removed_images)
+        return jsonify({"message": f"{merged}件の名刺を統合しました", "merged_count": merged})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"統合失敗: {str(e)}"}), 500
+
 @cards_bp.route("/create_email/<int:card_id>")
 @login_required
 def create_email_page(card_id):
@@ -170,37 +260,58 @@ def generate_initial_email(card_id):
     if card.user_id != current_user.id:
         return jsonify({"error": "Unauthorized"}), 403
 
-    web_info = get_company_info(card.url)
-    u = current_user
-    
-    prompt = f"""
-    あなたはプロの営業担当です。以下の情報を元に、名刺交換のお礼メールの件名と本文を作成してください。
-
-    【差出人情報（あなた）】
-    会社名: {u.company_name or '（会社名未設定）'}
-    氏名: {u.real_name or '（氏名未設定）'}
-    事業概要: {u.business_summary or '営業支援'}
-
-    【相手の情報】
-    会社名: {card.company_name or '貴社'}
-    氏名: {card.person_name or '担当者'}
-    相手企業の事業概要: {web_info}
-
-    【出力ルール】
-    - 以下のJSON形式のみを出力してください。
-    {{
-        "subject": "件名",
-        "body": "メール本文"
-    }}
-    """
-    
+    with span("email.company_info", card_id=card.id):
+        web_info = get_company_info(card.url)
+    # 取得した会社プロフィールを保存する（AI の生成中に書き込みのロックを持たない）
+    db.session.commit()
+    prompt = build_email_prompt(current_user, card, web_info)
+
     try:
         result_text = get_ai_completion(prompt, response_format="json_object")
         return jsonify(result_text)  # ⭕️ そのまま渡す
+    except AIQuotaExceeded as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@cards_bp.route("/api/generate_initial_email/<int:card_id>/stream")
+@login_required
+def generate_initial_email_stream(card_id):
+    """メールの下書きを Server-Sent Events で生成途中から返す
+
+    subject / body イベントで差分テキストを送り、最後に done イベントで件名・本文全体を送る。
+    """
+    card = db.session.get(Card, card_id)
+    if not card:
+        abort(404)
+    if card.user_id != current_user.id:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    def generate():
+        # 最初にコメント行を送り、Webサイト取得中もレスポンスを開始しておく
+        yield ": connected\n\n"
+        parser = DraftStreamParser()
+        try:
+            web_info = get_company_info(card.url)
+            db.session.commit()
+            prompt = build_email_prompt(current_user, card, web_info, output_rules=TEXT_OUTPUT_RULES)
+            for delta in stream_ai_completion(prompt):
+                for field, text in parser.feed(delta):
+                    yield format_sse(field, {"text": text})
+        except Exception as e:
+            yield format_sse("error", {"error": str(e)})
+            return
+        yield format_sse("done", parser.result())
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        # プロキシ（nginx 等）でバッファリングされないようにする
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @cards_bp.route("/api/bulk_send_emails", methods=["POST"])
 @login_required
 def bulk_send_emails():
@@ -215,70 +326,53 @@ def bulk_send_emails():
         return jsonify({"message": "送信対象が選択されていません"}), 400
 
     # 所有権の確認
-    if current_user.is_admin:
-        cards_to_send = Card.query.filter(Card.id.in_(card_ids)).all()
-    else:
-        cards_to_send = Card.query.filter(Card.id.in_(card_ids), Card.user_id == current_user.id).all()
+    with span("bulk_send.load_cards", requested=len(card_ids)):
+        if current_user.is_admin:
+            cards_to_send = Card.query.filter(Card.id.in_(card_ids)).all()
+        else:
+            cards_to_send = Card.query.filter(Card.id.in_(card_ids), Card.user_id == current_user.id).all()
     
+    # 上限に達している場合は名刺ごとに生成を試みず、他のAI機能と同じく 429 を返す
+    try:
+        check_ai_quota()
+    except AIQuotaExceeded as e:
+        return jsonify({"message": str(e)}), 429
+
     count_success = 0
     count_failed = 0
+    quota_message = None
+
+    # 同じ会社の名刺が複数あってもWebサイトはドメインごとに1回だけ取得する（保存済みの要約は再利用）
+    with span("bulk_send.company_info"):
+        web_infos = get_company_info_batch(card.url for card in cards_to_send if card.email and card.url)
+    db.session.commit()
     
     u = current_user
-    sender_info = f"""
-    【差出人情報（あなた）】
-    会社名: {u.company_name or '（会社名未設定）'}
-    氏名: {u.real_name or '（氏名未設定）'}
-    事業概要: {u.business_summary or '営業支援'}
-    """
+    batch_size = max(Config.BULK_PROMPT_BATCH_SIZE, 1)
+    drafts = {}
 
-    for card in cards_to_send:
+    for index, card in enumerate(cards_to_send):
         # メールアドレスがない場合はスキップ
         if not card.email:
             count_failed += 1
-            print(f"DEBUG: Skipping card {card.id} (No email)")
+            logger.info("Bulk send: skipping card %s (no email)", card.id)
             continue
 
         try:
-            # 1. AIによるメール内容生成
-            prompt = f"""
-            あなたはプロの営業担当です。以下の情報を元に、名刺交換のお礼メールの件名と本文を作成してください。
-            
-            {sender_info}
-
-            【相手の情報】
-            会社名: {card.company_name or '貴社'}
-            氏名: {card.person_name or '担当者'}
-            役職: {card.job_title or ''}
-            部署: {card.department_name or ''}
-            URL: {card.url or ''}
-
-            【出力ルール】
-            - 以下のJSON形式のみを出力してください。
-            {{
-                "subject": "件名",
-                "body": "メール本文"
-            }}
-            """
-            
-            ai_result = get_ai_completion(prompt, response_format="json_object")
-            # 文字列で返ってきた場合のパース処理
-            if isinstance(ai_result, str):
-                 try:
-                    ai_result = json.loads(ai_result)
-                 except json.JSONDecodeError:
-                    # JSONデコード失敗時のフォールバック（稀なケース）
-                    print(f"DEBUG: AI response not valid JSON: {ai_result}")
-                    count_failed += 1
-                    continue
-
-            subject = ai_result.get("subject")
-            body = ai_result.get("body")
-            
+            # 1. AIによるメール内容生成（未生成なら以降の batch_size 件をまとめて生成する）
+            if card.id not in drafts:
+                upcoming = [c for c in cards_to_send[index:] if c.email][:batch_size]
+                with span("bulk_send.generate_drafts", cards=len(upcoming)):
+                    drafts.update(generate_email_drafts(u, upcoming, web_infos, batch_size))
+
+            draft = drafts.pop(card.id, None)
             # 件名や本文が空の場合はエラー扱い
-            if not subject or not body:
-                print(f"DEBUG: AI generated empty subject or body for card {card.id}")
+            if not draft:
+                logger.warning("Bulk send: AI generated an empty subject or body for card %s", card.id)
                 count_failed += 1
                 continue
+            subject = draft["subject"]
+            body = draft["body"]
 
             # 2. メール送信
             data = {
@@ -291,29 +385,38 @@ def bulk_send_emails():
             send_id, message = send_email(u, data)
             
             # 4. 履歴保存
-            history = History(
-                user_id=u.id,
-                customer_name=card.person_name,
-                company_name=card.company_name,
-                email=card.email,
-                mail_subject=subject,
-                mail_body=body
-            )
-            db.session.add(history)
-            
-            # 1件ごとにコミットすることで、途中失敗しても成功分は残す
-            db.session.commit()
+            with span("bulk_send.history_write", card_id=card.id):
+                history = History(
+                    user_id=u.id,
+                    customer_name=card.person_name,
+                    company_name=card.company_name,
+                    email=card.email,
+                    mail_subject=subject,
+                    mail_body=body
+                )
+                db.session.add(history)
+
+                # 1件ごとにコミットすることで、途中失敗しても成功分は残す
+                db.session.commit()
             count_success += 1
             
             # レート制限対策（連続送信時のAPI制限回避）
-            time.sleep(1)
+            time.sleep(Config.BULK_SEND_INTERVAL)
 
+        except AIQuotaExceeded as e:
+            # 途中で上限に達した場合は残りを生成せずに終える（送信済みの分は結果に含める）
+            count_failed += sum(1 for c in cards_to_send[index:] if c.email)
+            quota_message = str(e)
+            break
         except Exception as e:
-            print(f"DEBUG: Error sending to card {card.id}: {str(e)}")
+            logger.exception("Bulk send: failed to send to card %s", card.id)
             count_failed += 1
-            
+
+    message = f"{count_success}件のメールを送信しました（失敗: {count_failed}件）"
+    if quota_message:
+        message += f" {quota_message}"
     return jsonify({
         "success_count": count_success,
         "failed_count": count_failed,
-        "message": f"{count_success}件のメールを送信しました（失敗: {count_failed}件）"
+        "message": message
     })
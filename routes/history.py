@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import current_user, login_required
 from extensions import db
-from models import History, User
-from services.mail_service import get_monthly_sent_count
+from database import delete_by_ids
+from models import History
+from services.mail_service import get_monthly_sent_count, reset_sent_counters
+from services.user_service import get_user_directory
 
 history_bp = Blueprint("history", __name__)
 
@@ -19,10 +21,11 @@ def show_history():
         if user_id:
             query = query.filter_by(user_id=user_id)
         histories = query.order_by(History.sent_at.desc()).all()
-        users = User.query.all()
+        users = get_user_directory()
         return render_template("history.html", 
                                histories=histories, 
                                users=users, 
+                               user_map={u.id: u for u in users},
                                selected_user_id=user_id,
                                monthly_sent_count=monthly_sent_count,
                                monthly_limit=monthly_limit)
@@ -47,17 +50,17 @@ def delete_history():
         if not history_ids:
             return jsonify({"message": "削除対象が選択されていません"}), 400
             
-        if current_user.is_admin:
-            histories_to_delete = History.query.filter(History.id.in_(history_ids)).all()
-        else:
-            histories_to_delete = History.query.filter(
-                History.id.in_(history_ids),
-                History.user_id == current_user.id
-            ).all()
+        criteria = [] if current_user.is_admin else [History.user_id == current_user.id]
+        count, rows = delete_by_ids(History, history_ids, *criteria,
+                                    returning=(History.user_id, History.sent_at))
         
-        count = len(histories_to_delete)
-        for h in histories_to_delete:
-            db.session.delete(h)
+        # 一括削除はセッションのイベントを経由しないため、送信数カウンタを明示的に破棄する
+        affected = {}
+        for row in rows:
+            if row.sent_at:
+                affected.setdefault(row.sent_at.strftime("%Y-%m"), set()).add(row.user_id)
+        for period, user_ids in affected.items():
+            reset_sent_counters(list(user_ids), period)
             
         db.session.commit()
         return jsonify({"message": f"{count}件の履歴を削除しました"})
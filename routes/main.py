@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, request, jsonify
+from flask import Blueprint, Response, render_template, redirect, url_for, request, jsonify, stream_with_context
 from flask_login import current_user, login_required
 from extensions import db
 from models import Card, History
 from services.mail_service import get_monthly_sent_count, send_email
+from services.draft_service import format_sse
+from services.rewrite_service import rewrite_draft, stream_rewrite
+from services.usage_service import AIQuotaExceeded
 
 main_bp = Blueprint("main", __name__)
 
@@ -39,6 +42,40 @@ def send():
         return jsonify({"message": f"送信失敗: {str(e)}"}), 500
 
 
+@main_bp.route("/rewrite", methods=["POST"])
+@login_required
+def rewrite():
+    """メールの下書きを調整指示に従って書き換える（stream が true なら Server-Sent Events で返す）"""
+    data = request.get_json(silent=True) or {}
+    instruction = (data.get("instruction") or "").strip()
+    body = (data.get("current_body") or "").strip()
+    subject = (data.get("current_subject") or "").strip()
+    customer_info = data.get("customer_info") or {}
+    if not instruction or not body:
+        return jsonify({"error": "調整指示と本文を入力してください"}), 400
+
+    if data.get("stream"):
+        def generate():
+            try:
+                for event, payload in stream_rewrite(current_user.id, subject, body, instruction, customer_info):
+                    yield format_sse(event, payload if event == "done" else {"text": payload})
+            except Exception as e:
+                yield format_sse("error", {"error": str(e)})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        return jsonify(rewrite_draft(current_user.id, subject, body, instruction, customer_info))
+    except AIQuotaExceeded as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @main_bp.route("/")
 @login_required
 def index():
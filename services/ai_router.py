@@ -0,0 +1,210 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderHealth:
+    """プロバイダごとの直近のレイテンシ・成否とサーキットブレーカーの状態"""
+
+    def __init__(self, window=50, failure_threshold=3, error_rate_threshold=0.5, min_samples=10, cooldown=30):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self._should_open():
+                # half-open の試行に失敗した場合も含めて開き直す
+                self.opened_at = time.monotonic()
+
+    def _should_open(self):
+        if self.consecutive_failures >= self.failure_threshold:
+            return True
+        if len(self.outcomes) >= self.min_samples:
+            return self.error_rate_locked() >= self.error_rate_threshold
+        return False
+
+    def error_rate_locked(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def error_rate(self):
+        with self._lock:
+            return self.error_rate_locked()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def available(self):
+        """リクエストを送ってよいか（half-open では試行を許可し、結果で閉じるか開き直す）"""
+        return self.state != "open"
+
+    def percentile(self, pct):
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+    def sample_count(self):
+        with self._lock:
+            return len(self.latencies)
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "samples": self.sample_count(),
+            "error_rate": round(self.error_rate(), 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+class AllProvidersFailed(Exception):
+    pass
+
+
+class AIRouter:
+    """複数のAIプロバイダを健全性に応じて振り分ける
+
+    サーキットが開いているプロバイダは飛ばして次のプロバイダへフェイルオーバーする。
+    hedge を有効にすると、先頭のプロバイダが p95 レイテンシを超えても応答しない場合に
+    次のプロバイダへも同じリクエストを送り、先に成功した方を返す。
+    """
+
+    def __init__(self, providers, stream_providers=None, hedge=False, hedge_percentile=95,
+                 hedge_min_samples=20, hedge_min_delay=0.5, max_workers=8, **health_options):
+        self.providers = providers
+        self.stream_providers = stream_providers or {}
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.health = {name: ProviderHealth(**health_options) for name in providers}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-hedge") if hedge else None
+
+    def _candidates(self, order):
+        order = [name for name in order if name in self.providers]
+        available = [name for name in order if self.health[name].available()]
+        # 全て開いている場合は、最も早く開いたプロバイダを試す（全停止を避ける）
+        if not available and order:
+            available = [min(order, key=lambda n: self.health[n].opened_at or 0)]
+        return available
+
+    def _call(self, name, args, kwargs):
+        started = time.perf_counter()
+        try:
+            result = self.providers[name](*args, **kwargs)
+        except Exception:
+            self.health[name].record_failure()
+            raise
+        self.health[name].record_success(time.perf_counter() - started)
+        return result
+
+    def _hedge_delay(self, name):
+        health = self.health[name]
+        if health.sample_count() < self.hedge_min_samples:
+            return None
+        return max(health.percentile(self.hedge_percentile), self.hedge_min_delay)
+
+    def complete(self, order, *args, **kwargs):
+        """order の順にプロバイダを試し、最初に成功した結果を返す"""
+        candidates = self._candidates(order)
+        errors = []
+        while candidates:
+            name = candidates.pop(0)
+            delay = self._hedge_delay(name) if self.hedge and candidates else None
+            if delay is None:
+                try:
+                    return self._call(name, args, kwargs)
+                except Exception as e:
+                    logger.warning("AI provider '%s' failed, failing over: %s", name, e)
+                    errors.append(e)
+                    continue
+
+            backup = candidates.pop(0)
+            try:
+                return self._hedged(name, backup, delay, args, kwargs)
+            except Exception as e:
+                errors.append(e)
+        self._raise(errors)
+
+    def _hedged(self, primary, backup, delay, args, kwargs):
+        # 別スレッドでも呼び出し元の span の下に記録されるよう、コンテキストを引き継ぐ
+        futures = {self._executor.submit(contextvars.copy_context().run, self._call, primary, args, kwargs): primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done or next(iter(done)).exception() is not None:
+            logger.info("AI provider '%s' slower than %.2fs or failed, hedging to '%s'", primary, delay, backup)
+            futures[self._executor.submit(contextvars.copy_context().run, self._call, backup, args, kwargs)] = backup
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def stream(self, order, *args, **kwargs):
+        """ストリーミング生成。最初のテキストが届く前に失敗した場合のみ次のプロバイダへ切り替える"""
+        errors = []
+        for name in self._candidates(order):
+            started = time.perf_counter()
+            yielded = False
+            try:
+                for chunk in self.stream_providers[name](*args, **kwargs):
+                    if not yielded:
+                        # 最初のテキストまでの時間をレイテンシとして記録する
+                        self.health[name].record_success(time.perf_counter() - started)
+                        yielded = True
+                    yield chunk
+                if not yielded:
+                    self.health[name].record_success(time.perf_counter() - started)
+                return
+            except Exception as e:
+                self.health[name].record_failure()
+                if yielded:
+                    raise
+                logger.warning("AI provider '%s' stream failed, failing over: %s", name, e)
+                errors.append(e)
+        self._raise(errors)
+
+    @staticmethod
+    def _raise(errors):
+        # プロバイダが1つだけの場合は元の例外をそのまま返す
+        if len(errors) == 1:
+            raise errors[0]
+        raise AllProvidersFailed(f"All AI providers failed: {errors}") from (errors[-1] if errors else None)
+
+    def snapshot(self):
+        return {name: health.snapshot() for name, health in self.health.items()}
@@ -1,18 +1,28 @@
 import json
+import logging
+import threading
+import time
 from azure.ai.vision.imageanalysis import ImageAnalysisClient
 from azure.ai.vision.imageanalysis.models import VisualFeatures
 from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
+from openai import AzureOpenAI, RateLimitError
 from google import genai
 
+from flask import current_app, has_app_context
 from config import Config
+from metrics import AI_REQUEST_SECONDS, AI_REQUESTS, AI_RETRIES, CARD_EXTRACTIONS, track
+from tracing import span
+from services.usage_service import check_ai_quota, record_tokens, track_usage
+from services.ai_router import AIRouter
+from services.fake_providers import FakeAzureOpenAI, FakeGeminiClient, FakeVisionClient
+from services.card_text_parser import CARD_FIELDS, merge_fields, resolve_fields
+from services.image_preprocess import ImageQueueFull, guess_mime_type, normalize_card_image
 
-import io
-
-
-from PIL import Image
+logger = logging.getLogger(__name__)
 
 def get_vision_client():
+    if Config.FAKE_PROVIDERS:
+        return FakeVisionClient()
     if not Config.VISION_KEY or not Config.VISION_ENDPOINT:
         return None
     return ImageAnalysisClient(
@@ -21,6 +31,8 @@ def get_vision_client():
     )
 
 def get_openai_client():
+    if Config.FAKE_PROVIDERS:
+        return FakeAzureOpenAI(), "fake-deployment"
     if not Config.OPENAI_KEY or not Config.OPENAI_ENDPOINT:
         return None
     
@@ -49,6 +61,8 @@ def get_openai_client():
 
 
 def get_gemini_client():
+    if Config.FAKE_PROVIDERS:
+        return FakeGeminiClient()
     if Config.GEMINI_API_KEY:
         return genai.Client(api_key=Config.GEMINI_API_KEY)
     return None
@@ -58,106 +72,322 @@ def list_gemini_models():
     try:
         client = get_gemini_client()
         if not client:
-            print("Gemini API Key not configured.")
+            logger.warning("Gemini API Key not configured.")
             return
 
-        print("--- Available Gemini Models ---")
         # Note: list_models in new SDK might differ, using simple iteration if iterable or verifying documentation.
         # Assuming client.models.list() exists and returns models.
-        for m in client.models.list():
-            print(f"Name: {m.name}, DisplayName: {m.display_name}")
-        print("-------------------------------")
+        models = [f"{m.name} ({m.display_name})" for m in client.models.list()]
+        logger.info("Available Gemini models: %s", ", ".join(models))
     except Exception as e:
-        print(f"Error listing Gemini models: {str(e)}")
+        logger.warning("Error listing Gemini models: %s", e)
 
-def get_ai_completion(prompt, system_prompt="You are a professional business assistant.", response_format=None):
-    """Azure OpenAI または Gemini を使用してテキスト生成を行う"""
-    if Config.AI_ENGINE_TYPE == "gemini":
-        client = get_gemini_client()
-        if not client:
-             raise Exception("Gemini API Key is not configured.")
+ENGINES = ("azure", "gemini")
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash"
 
-        # 429 (Rate Limit) への対策としてリトライ処理を追加
-        import time
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # 利用可能な最新の安定版 'gemini-2.0-flash' を使用
-                config = {}
-                if response_format == "json_object":
-                    config["response_mime_type"] = "application/json"
-                
-                if system_prompt:
-                    config["system_instruction"] = system_prompt
 
-                response = client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=prompt,
-                    config=config
-                )
-                if response_format == "json_object":
-                    parsed_res = json.loads(response.text)
-                    # リスト形式 [{...}] で返ってきた場合、最初の1件を取り出す
-                    if isinstance(parsed_res, list) and len(parsed_res) > 0:
-                        return parsed_res[0]
-                    return parsed_res
-                
-                return response.text
-            except Exception as e:
-                # SDK might raise custom errors, but checking string for 429 is a safe fallback
-                if "429" in str(e) and attempt < max_retries - 1:
-                    time.sleep(2 ** attempt) # 指数バックオフ
-                    continue
-                if "404" in str(e) or "not found" in str(e).lower():
-                    list_gemini_models()
-                raise e
+def get_model(engine, tier=None):
+    """エンジンごとのモデル（Azure はデプロイ名）。tier="rewrite" は書き換え用の軽量モデル
 
-    else:
-        # Azure OpenAI
-        result = get_openai_client()
-        if not result:
-            raise Exception("Azure OpenAI client is not configured.")
-        client, deployment = result
+    None の場合は各エンジンの通常のモデルを使う。
+    """
+    if tier == "rewrite":
+        if engine == "gemini":
+            return Config.GEMINI_REWRITE_MODEL or None
+        return Config.OPENAI_REWRITE_DEPLOYMENT or None
+    return None
+
+
+def get_rewrite_model():
+    """現在のエンジンの書き換え用モデル（未設定なら None で通常のモデルを使う）"""
+    return get_model(Config.AI_ENGINE_TYPE, "rewrite")
+
+
+def _is_rate_limited(e):
+    return isinstance(e, RateLimitError) or "429" in str(e)
+
+
+def _retry_wait(e, attempt):
+    """Retry-After ヘッダがあればそれに従い、無ければ指数バックオフ（上限あり）"""
+    wait = 2 ** attempt
+    response = getattr(e, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            pass
+    return min(wait, Config.AI_RETRY_MAX_WAIT)
+
+
+def _gemini_completion(prompt, system_prompt, response_format=None, tier=None):
+    client = get_gemini_client()
+    if not client:
+         raise Exception("Gemini API Key is not configured.")
+
+    # 429 (Rate Limit) への対策としてリトライ処理を追加
+    max_retries = Config.AI_MAX_RETRIES
+    for attempt in range(max_retries):
+        try:
+            # 利用可能な最新の安定版 'gemini-2.0-flash' を使用
+            config = {}
+            if response_format == "json_object":
+                config["response_mime_type"] = "application/json"
+            
+            if system_prompt:
+                config["system_instruction"] = system_prompt
+
+            model = get_model("gemini", tier) or DEFAULT_GEMINI_MODEL
+            response = client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=config
+            )
+            _record_gemini_usage(response, model)
+            if response_format == "json_object":
+                parsed_res = json.loads(response.text)
+                # リスト形式 [{...}] で返ってきた場合、最初の1件を取り出す
+                if isinstance(parsed_res, list) and len(parsed_res) > 0:
+                    return parsed_res[0]
+                return parsed_res
             
-        args = {
-            "model": deployment,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ]
-        }
-        if response_format == "json_object":
-            args["response_format"] = {"type": "json_object"}
+            return response.text
+        except Exception as e:
+            # SDK might raise custom errors, but checking string for 429 is a safe fallback
+            if _is_rate_limited(e) and attempt < max_retries - 1:
+                AI_RETRIES.inc(operation="completion", provider="gemini")
+                time.sleep(_retry_wait(e, attempt)) # 指数バックオフ
+                continue
+            if "404" in str(e) or "not found" in str(e).lower():
+                list_gemini_models()
+            raise e
+
+
+def _azure_completion(prompt, system_prompt, response_format=None, tier=None):
+    result = get_openai_client()
+    if not result:
+        raise Exception("Azure OpenAI client is not configured.")
+    client, deployment = result
         
-        response = client.chat.completions.create(**args)
-        return response.choices[0].message.content
+    args = {
+        "model": get_model("azure", tier) or deployment,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+    }
+    if response_format == "json_object":
+        args["response_format"] = {"type": "json_object"}
+
+    # 429 (Rate Limit) は Retry-After に従って再試行し、それでも駄目ならルーターが切り替える
+    max_retries = Config.AI_MAX_RETRIES
+    for attempt in range(max_retries):
+        try:
+            response = client.chat.completions.create(**args)
+            _record_openai_usage(response, args["model"])
+            return response.choices[0].message.content
+        except Exception as e:
+            if _is_rate_limited(e) and attempt < max_retries - 1:
+                AI_RETRIES.inc(operation="completion", provider="azure")
+                time.sleep(_retry_wait(e, attempt))
+                continue
+            raise e
+
+
+def _gemini_stream(prompt, system_prompt, tier=None):
+    client = get_gemini_client()
+    if not client:
+        raise Exception("Gemini API Key is not configured.")
+
+    config = {}
+    if system_prompt:
+        config["system_instruction"] = system_prompt
+    model = get_model("gemini", tier) or DEFAULT_GEMINI_MODEL
+    last = None
+    for chunk in client.models.generate_content_stream(
+        model=model,
+        contents=prompt,
+        config=config
+    ):
+        last = chunk
+        if chunk.text:
+            yield chunk.text
+    # usage_metadata は累計のため最後のチャンクの値を使う
+    if last is not None:
+        _record_gemini_usage(last, model)
+
+
+def _azure_stream(prompt, system_prompt, tier=None):
+    result = get_openai_client()
+    if not result:
+        raise Exception("Azure OpenAI client is not configured.")
+    client, deployment = result
+
+    model = get_model("azure", tier) or deployment
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        stream=True,
+        # 最後のチャンクでトークン数を受け取る
+        stream_options={"include_usage": True}
+    )
+    for chunk in response:
+        if getattr(chunk, "usage", None) is not None:
+            _record_openai_usage(chunk, model)
+        # Azure はコンテンツフィルタ結果のみのチャンク（choices が空）を返すことがある
+        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _classify_error(e):
+    if isinstance(e, GeneratorExit):
+        # ストリーミング中にクライアントが切断した
+        return "cancelled"
+    return "rate_limited" if _is_rate_limited(e) else "error"
+
+
+def _usage_operation(operation, tier):
+    # 書き換え（軽量モデル）は利用記録では別の処理として集計する
+    return "rewrite" if tier == "rewrite" else operation
+
+
+def _record_openai_usage(response, model):
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_tokens(usage.prompt_tokens, usage.completion_tokens, model)
+
+
+def _record_gemini_usage(response, model):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_tokens(usage.prompt_token_count, usage.candidates_token_count, model)
+
+
+def _tracked(operation, provider, func):
+    """プロバイダ呼び出しの所要時間と結果をメトリクス・トレース・利用記録に記録する"""
+    def call(*args, **kwargs):
+        with span(f"ai.{operation}", provider=provider, tier=kwargs.get("tier")), \
+                track(AI_REQUESTS, AI_REQUEST_SECONDS, classify=_classify_error, operation=operation, provider=provider), \
+                track_usage(_usage_operation(operation, kwargs.get("tier")), provider):
+            return func(*args, **kwargs)
+    return call
+
+
+def _tracked_stream(provider, func):
+    """ストリーミング呼び出しを最後のテキストまでの所要時間で記録する"""
+    def stream(*args, **kwargs):
+        with track(AI_REQUESTS, AI_REQUEST_SECONDS, classify=_classify_error, operation="stream", provider=provider), \
+                track_usage(_usage_operation("stream", kwargs.get("tier")), provider):
+            yield from func(*args, **kwargs)
+    return stream
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_ai_router():
+    """プロセス内で共有するプロバイダルーター（健全性の統計を保持する）"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = AIRouter(
+                # 呼び出し時に関数名を解決する（テストでの差し替えを反映するため lambda で包む）
+                providers={
+                    "azure": _tracked("completion", "azure", lambda *args, **kwargs: _azure_completion(*args, **kwargs)),
+                    "gemini": _tracked("completion", "gemini", lambda *args, **kwargs: _gemini_completion(*args, **kwargs)),
+                },
+                stream_providers={
+                    "azure": _tracked_stream("azure", lambda *args, **kwargs: _azure_stream(*args, **kwargs)),
+                    "gemini": _tracked_stream("gemini", lambda *args, **kwargs: _gemini_stream(*args, **kwargs)),
+                },
+                hedge=Config.AI_HEDGE_ENABLED,
+                hedge_percentile=Config.AI_HEDGE_PERCENTILE,
+                hedge_min_samples=Config.AI_HEDGE_MIN_SAMPLES,
+                failure_threshold=Config.AI_CIRCUIT_FAILURES,
+                error_rate_threshold=Config.AI_CIRCUIT_ERROR_RATE,
+                cooldown=Config.AI_CIRCUIT_COOLDOWN,
+            )
+        return _router
+
+
+def reset_ai_router():
+    global _router
+    with _router_lock:
+        _router = None
+
+
+def _engine_configured(engine):
+    if Config.FAKE_PROVIDERS:
+        return True
+    if engine == "gemini":
+        return bool(Config.GEMINI_API_KEY)
+    return bool(Config.OPENAI_KEY and Config.OPENAI_ENDPOINT)
+
+
+def provider_order():
+    """AI_ENGINE_TYPE のエンジンを優先し、フェイルオーバー有効時は設定済みの他エンジンを後ろに並べる"""
+    primary = Config.AI_ENGINE_TYPE if Config.AI_ENGINE_TYPE in ENGINES else "azure"
+    order = [primary]
+    if Config.AI_FAILOVER_ENABLED:
+        order += [e for e in ENGINES if e != primary and _engine_configured(e)]
+    return order
+
+
+def get_ai_completion(prompt, system_prompt="You are a professional business assistant.", response_format=None, tier=None):
+    """Azure OpenAI または Gemini を使用してテキスト生成を行う
+
+    AI_ENGINE_TYPE のエンジンを優先し、障害時はもう一方のエンジンに切り替える。
+    tier="rewrite" で書き換え用の軽量モデルを使う。
+    ログインユーザーが今月の利用上限に達している場合は AIQuotaExceeded。
+    """
+    check_ai_quota()
+    return get_ai_router().complete(provider_order(), prompt, system_prompt, response_format=response_format, tier=tier)
+
+
+def stream_ai_completion(prompt, system_prompt="You are a professional business assistant.", tier=None):
+    """Azure OpenAI または Gemini のストリーミングAPIで生成し、テキストの差分を順に返す"""
+    check_ai_quota()
+    yield from get_ai_router().stream(provider_order(), prompt, system_prompt, tier=tier)
 
 
 def analyze_card_image(image_data, filename):
-#"""名刺画像をリサイズしてから解析して構造化データを返す"""
-    
-    # --- 画像リサイズ処理の追加 ---
-    try:
-        img = Image.open(io.BytesIO(image_data))
-        # アスペクト比を維持したまま、最大幅を1200pxに制限
-        max_size = 1200
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # リサイズした画像をバイトデータに戻す
-            output = io.BytesIO()
-            img.save(output, format="JPEG", quality=85) # 圧縮率85%でJPEG保存
-            image_data = output.getvalue()
-            print(f"DEBUG: Image resized to {img.width}x{img.height}")
-    except Exception as e:
-        print(f"DEBUG: Resize failed, using original: {e}")
+    """名刺画像を解析して構造化データを返す（所要時間と結果をメトリクス・トレースに記録する）"""
+    check_ai_quota()
+    provider = "gemini" if Config.AI_ENGINE_TYPE == "gemini" else "azure"
+    with span("ai.vision", provider=provider, bytes=len(image_data)), \
+            track(AI_REQUESTS, AI_REQUEST_SECONDS, classify=_classify_error, operation="vision", provider=provider), \
+            track_usage("vision", provider):
+        return _analyze_card_image(image_data, filename)
+
+
+def normalize_image(image_data):
+    """名刺画像を OCR 向けに正規化する（アプリ内ではプロセスプールで実行、読み込めない画像はそのまま）"""
+    preprocessor = current_app.extensions.get("image_preprocessor") if has_app_context() else None
+    with span("image.normalize", bytes=len(image_data)):
+        try:
+            if preprocessor is not None:
+                return preprocessor.normalize(image_data)
+            return normalize_card_image(image_data)
+        except ImageQueueFull:
+            raise
+        except Exception as e:
+            logger.debug("Image normalization failed, using original: %s", e)
+            return image_data
+
+
+def _analyze_card_image(image_data, filename):
+    """名刺画像を正規化してから解析して構造化データを返す"""
+    image_data = normalize_image(image_data)
 
     if Config.AI_ENGINE_TYPE == "gemini":
         client = get_gemini_client()
         if not client:
              raise Exception("Gemini API Key is not configured.")
 
-        import time
         max_retries = 3
         for attempt in range(max_retries):
             try:
@@ -175,19 +405,15 @@ def analyze_card_image(image_data, filename):
                 # Create image part
                 # Assuming image_data is bytes
                 # We can construct the content part
-                image_part = types.Part.from_bytes(data=image_data, mime_type="image/jpeg") # Default to jpeg, adjust as needed or rely on SDK detection if possible
-                
-                # Adjust mime type based on filename if needed
-                if filename.lower().endswith(".png"):
-                    image_part = types.Part.from_bytes(data=image_data, mime_type="image/png")
-                elif filename.lower().endswith(".webp"):
-                    image_part = types.Part.from_bytes(data=image_data, mime_type="image/webp")
+                # 正規化後は JPEG、正規化できなかった場合は元の形式
+                image_part = types.Part.from_bytes(data=image_data, mime_type=guess_mime_type(image_data, filename))
 
                 response = client.models.generate_content(
-                    model="gemini-2.0-flash",
+                    model=DEFAULT_GEMINI_MODEL,
                     contents=[prompt, image_part],
                     config={"response_mime_type": "application/json"}
                 )
+                _record_gemini_usage(response, DEFAULT_GEMINI_MODEL)
                 parsed_res = json.loads(response.text)
                 
                 # Geminiが [{...}] のようにリストで返してきた場合、最初の1件(辞書)を取り出す
@@ -197,6 +423,7 @@ def analyze_card_image(image_data, filename):
                 return parsed_res
             except Exception as e:
                 if "429" in str(e) and attempt < max_retries - 1:
+                    AI_RETRIES.inc(operation="vision", provider="gemini")
                     time.sleep(2 ** attempt)
                     continue
                 if "404" in str(e) or "not found" in str(e).lower():
@@ -212,11 +439,20 @@ def analyze_card_image(image_data, filename):
         result = vision_client.analyze(
             image_data=image_data, visual_features=[VisualFeatures.READ]
         )
-        raw_text = " ".join(
-            [line.text for block in result.read.blocks for line in block.lines]
-        )
+        lines = [line.text for block in result.read.blocks for line in block.lines]
+        raw_text = " ".join(lines)
+
+        # メール・電話・会社名などはローカルで抽出し、判定できなかった項目だけを AI に問い合わせる
+        if Config.CARD_LOCAL_EXTRACTION:
+            fields, unresolved = resolve_fields(lines)
+        else:
+            fields, unresolved = {}, list(CARD_FIELDS)
+        if not unresolved:
+            CARD_EXTRACTIONS.inc(method="local")
+            return merge_fields(fields, {}, [])
+        CARD_EXTRACTIONS.inc(method="llm")
 
-        struct_prompt = f"以下のテキストからJSON(name, company, department, title, url, email, phone)を抽出して。テキスト: {raw_text}"
+        struct_prompt = f"以下のテキストからJSON({', '.join(unresolved)})を抽出して。テキスト: {raw_text}"
         result = get_openai_client()
         if not result:
             raise Exception("Azure OpenAI client is not configured.")
@@ -233,5 +469,6 @@ def analyze_card_image(image_data, filename):
             ],
             response_format={"type": "json_object"},
         )
-        return json.loads(struct_res.choices[0].message.content)
+        _record_openai_usage(struct_res, deployment)
+        return merge_fields(fields, json.loads(struct_res.choices[0].message.content), unresolved)
 
@@ -0,0 +1,165 @@
+"""
+名刺の OCR テキストからの項目抽出（正規表現と辞書による）
+
+メール・電話・URL は正規表現、会社名は法人格、役職は辞書、部署は語尾、氏名は「姓 名」の形で判定する。
+判定できなかった項目は AI による構造化に任せる（resolve_fields を参照）。
+"""
+import re
+import unicodedata
+
+CARD_FIELDS = ["name", "company", "department", "title", "url", "email", "phone"]
+# 見つからなければ必ず AI に問い合わせる項目（名刺に必ずあるもの）
+REQUIRED_FIELDS = ["name", "company", "email"]
+# 行の形から推定する項目（解釈できない行が残る場合は AI にも問い合わせ、AI の値を優先する）
+INFERRED_FIELDS = ["name", "department", "title"]
+
+EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+")
+URL = re.compile(r"(?:https?://|www\.)[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+(?:/[\w./%?=&#-]*)?", re.IGNORECASE)
+PHONE = re.compile(r"(?<!\d)(?:\+81[\s-]?\(?0?\)?[\s-]?|\(?0)\d{1,4}\)?[\s-]?\(?\d{1,4}\)?[\s-]?\d{3,4}(?!\d)")
+PHONE_LABEL = re.compile(r"(FAX|Fax|F|TEL|Tel|T|携帯|Mobile|M|電話|直通)\s*[.:]?\s*$")
+# OCR で数字の区切りに使われる各種ダッシュ・長音
+DASHES = re.compile(r"(?<=\d)\s*[‐‑‒–—―−ーｰ]\s*(?=\d)")
+
+LEGAL_FORMS = re.compile(
+    r"株式会社|有限会社|合同会社|合資会社|合名会社|(?:一般|公益)(?:社団|財団)法人|\(株\)|\(有\)|\(同\)"
+    r"|Co\.,?\s*Ltd|Inc\.|Corporation|Corp\.|K\.K\.|LLC",
+    re.IGNORECASE,
+)
+TITLES = sorted([
+    "代表取締役社長", "代表取締役会長", "代表取締役", "取締役社長", "専務取締役", "常務取締役", "取締役", "執行役員",
+    "社長", "副社長", "会長", "本部長", "事業部長", "部長代理", "副部長", "部長", "次長", "課長代理", "課長", "係長",
+    "主任", "主査", "室長", "所長", "支店長", "店長", "工場長", "センター長", "マネージャー", "マネジャー", "リーダー",
+    "チーフ", "ディレクター", "エンジニア", "コンサルタント", "担当", "顧問", "相談役", "監査役", "理事長", "理事",
+    "参与", "フェロー", "CEO", "COO", "CTO", "CFO",
+], key=len, reverse=True)
+# 阿部・服部などの姓と区別するため、3文字以上の語だけを部署とみなす
+DEPARTMENT = re.compile(r"\S*(?:事業部|本部|部|課|室|局|センター|グループ|チーム|支店|支社|営業所|工場)$")
+DEPARTMENT_MIN_LENGTH = 3
+JAPANESE_NAME = re.compile(r"^[一-龥々〆ヶ]{1,4} [一-龥々〆ヶぁ-んァ-ヶー]{1,5}$")
+ROMAN_NAME = re.compile(r"^[A-Z][a-zA-Z]+ [A-Z][a-zA-Z]+$")
+# 住所・郵便番号の行（項目には使わないが、未解釈の行としても扱わない）
+ADDRESS = re.compile(r"〒|^\d{3}-\d{4}|[都道府県].*[市区町村郡]|\d+丁目|\d+番地|\d+-\d+-\d+|ビル|\d+F$|\d+階")
+LABEL_ONLY = re.compile(r"^(?:TEL|FAX|E-?mail|Mail|URL|Web|Mobile|携帯|電話)\s*[.:]?$", re.IGNORECASE)
+
+
+def normalize_line(text):
+    """全角英数・記号を半角にし、数字の間のダッシュをハイフンに揃える"""
+    text = unicodedata.normalize("NFKC", text or "").strip()
+    text = DASHES.sub("-", text)
+    return re.sub(r"\s+", " ", text)
+
+
+def _phones(line):
+    """行内の電話番号を (種類, 番号) で返す。直前のラベルが FAX のものは fax"""
+    found = []
+    for match in PHONE.finditer(line):
+        digits = re.sub(r"\D", "", match.group())
+        if not 10 <= len(digits) <= 12:
+            continue
+        label = PHONE_LABEL.search(line[:match.start()])
+        kind = "fax" if label and label.group(1).upper() in ("FAX", "F") else "phone"
+        found.append((kind, match.group().strip()))
+    return found
+
+
+def _split_title(line):
+    """行から役職を取り出し、(役職, 残り) を返す"""
+    for title in TITLES:
+        index = line.find(title)
+        if index >= 0:
+            return title, (line[:index] + " " + line[index + len(title):]).strip()
+    return None, line
+
+
+def _unique(values):
+    values = list(dict.fromkeys(v for v in values if v))
+    return values[0] if len(values) == 1 else None
+
+
+def extract_card_fields(lines):
+    """OCR の行から判定できた項目を返す: (項目の辞書, 未解釈の行)"""
+    lines = [line for line in (normalize_line(t) for t in lines) if line]
+    explained = set()
+    emails, urls, phones, companies, titles, departments, names, roman_names = [], [], [], [], [], [], [], []
+
+    for index, line in enumerate(lines):
+        line_emails = EMAIL.findall(line)
+        line_urls = [u for u in URL.findall(EMAIL.sub(" ", line))]
+        line_phones = _phones(line)
+        if line_emails or line_urls or line_phones:
+            emails += line_emails
+            urls += line_urls
+            phones += [number for kind, number in line_phones if kind == "phone"]
+            explained.add(index)
+            continue
+        if LEGAL_FORMS.search(line):
+            companies.append((index, line))
+            continue
+        if ADDRESS.search(line) or LABEL_ONLY.match(line) or not re.search(r"\w", line):
+            explained.add(index)
+            continue
+
+        title, rest = _split_title(line)
+        if title:
+            titles.append(title)
+        if JAPANESE_NAME.match(rest) and not DEPARTMENT.match(rest.split()[-1]):
+            # 氏名の形の行には部署を探さない（「阿部 太郎」の「阿部」を部署にしない）
+            names.append((index, rest))
+            continue
+        tokens = rest.split()
+        dept_tokens = [t for t in tokens if len(t) >= DEPARTMENT_MIN_LENGTH and DEPARTMENT.match(t)]
+        rest = " ".join(t for t in tokens if t not in dept_tokens)
+        if dept_tokens:
+            departments.append(" ".join(dept_tokens))
+        if not rest:
+            if title or dept_tokens:
+                explained.add(index)
+        elif JAPANESE_NAME.match(rest):
+            names.append((index, rest))
+        elif ROMAN_NAME.match(rest):
+            roman_names.append(index)
+
+    fields = {}
+    for field, values in (("email", emails), ("url", urls), ("phone", phones),
+                          ("title", titles), ("department", departments)):
+        value = _unique(values) if field != "phone" else (phones[0] if phones else None)
+        if value:
+            fields[field] = value
+
+    # 会社名は日本語表記と英語表記が並ぶことが多いため、日本語の行が1つならそれを使う
+    japanese = [(i, c) for i, c in companies if re.search(r"[぀-ヿ一-龥]", c)]
+    chosen = japanese if len(japanese) == 1 else companies if len(companies) == 1 else []
+    if chosen:
+        fields["company"] = chosen[0][1]
+        explained.update(i for i, _ in companies)
+
+    if len(names) == 1:
+        fields["name"] = names[0][1]
+        # ローマ字の氏名は同じ人の表記とみなす
+        explained.update([names[0][0], *roman_names])
+
+    leftover = [line for i, line in enumerate(lines) if i not in explained]
+    return fields, leftover
+
+
+def resolve_fields(lines):
+    """ローカルで判定できた項目と、AI に問い合わせる項目を返す: (項目の辞書, AI に問い合わせる項目)
+
+    未解釈の行が残っていれば、見つからなかった項目と推定した項目（氏名・部署・役職）を、
+    残っていなければ必須項目のうち見つからなかったものだけを問い合わせる（空ならAIを呼ばずに済む）。
+    """
+    fields, leftover = extract_card_fields(lines)
+    if leftover:
+        unresolved = [f for f in CARD_FIELDS if f not in fields or f in INFERRED_FIELDS]
+    else:
+        unresolved = [f for f in REQUIRED_FIELDS if f not in fields]
+    return fields, unresolved
+
+
+def merge_fields(fields, extracted, unresolved):
+    """ローカルの抽出結果と AI の結果をまとめる（AI に問い合わせた項目は AI の値を優先する）"""
+    merged = {}
+    for key in CARD_FIELDS:
+        value = extracted.get(key) if key in unresolved else None
+        merged[key] = value or fields.get(key) or ""
+    return merged
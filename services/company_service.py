@@ -0,0 +1,157 @@
+import re
+from datetime import datetime, timedelta
+from config import Config
+from database import upsert
+from extensions import db
+from metrics import COMPANY_PROFILE_LOOKUPS
+from tracing import span
+from models import CompanyProfile
+from services.web_service import STATUS_MESSAGES, fetch_company_profile, fetch_domains, normalize_domain
+
+PROFILE_FIELDS = ["title", "description", "og_title", "og_description", "og_site_name"]
+# String(255) の列
+SHORT_FIELDS = ["title", "og_title", "og_site_name"]
+
+# 要約の文単位の区切り（日本語の句点・英語のピリオド・縦棒など）
+_SENTENCE_SPLIT = re.compile(r"(?<=[。．！？!?])\s*|\s+[|｜]\s+|\s{2,}")
+
+
+def build_summary(profile, max_chars=None):
+    """抽出結果から要約を作る
+
+    meta description / OpenGraph の説明を優先し、足りない分を本文の先頭から補う。
+    重複する文は除き、max_chars 以内に収める。
+    """
+    max_chars = max_chars or Config.COMPANY_SUMMARY_MAX_CHARS
+    name = profile.get("og_site_name") or profile.get("og_title") or profile.get("title") or ""
+    sources = [profile.get("description"), profile.get("og_description"), profile.get("text")]
+
+    seen = set()
+    sentences = []
+    length = len(name)
+    for source in sources:
+        for sentence in _SENTENCE_SPLIT.split(source or ""):
+            sentence = sentence.strip()
+            key = re.sub(r"\W", "", sentence)
+            if len(key) < 2 or key in seen:
+                continue
+            if length + len(sentence) + 1 > max_chars:
+                break
+            seen.add(key)
+            sentences.append(sentence)
+            length += len(sentence) + 1
+
+    summary = " ".join(sentences)
+    if name and name not in summary:
+        summary = f"{name}: {summary}" if summary else name
+    return summary[:max_chars]
+
+
+def _is_fresh(profile, now):
+    if profile.status == "ok":
+        return profile.fetched_at >= now - timedelta(days=Config.COMPANY_PROFILE_TTL_DAYS)
+    return profile.fetched_at >= now - timedelta(hours=Config.COMPANY_PROFILE_RETRY_HOURS)
+
+
+def _save_profiles(fetched, urls_by_domain, now):
+    """取得結果を保存する（commit は呼び出し側で行う）
+
+    取得に失敗した場合は保存済みの要約を消さない。status が ok のプロフィールは
+    COMPANY_PROFILE_RETRY_HOURS 後に取得し直すよう fetched_at だけを調整する。
+    """
+    table = CompanyProfile.__table__
+    connection = db.session.connection()
+    retry_at = now - timedelta(days=Config.COMPANY_PROFILE_TTL_DAYS) + timedelta(hours=Config.COMPANY_PROFILE_RETRY_HOURS)
+    for domain, data in fetched.items():
+        values = {
+            "url": urls_by_domain[domain],
+            "status": data["status"],
+            "summary": build_summary(data) if data["status"] == "ok" else None,
+            "fetched_at": now,
+        }
+        values.update({field: data.get(field) for field in PROFILE_FIELDS})
+        for field in SHORT_FIELDS:
+            values[field] = (values[field] or "")[:255]
+
+        if data["status"] == "ok":
+            # 同時に別のリクエストが同じドメインを保存していても後勝ちで上書きする
+            upsert(connection, table, dict(values, domain=domain), [table.c.domain], values)
+            continue
+        upsert(
+            connection, table, dict(values, domain=domain), [table.c.domain],
+            {"status": values["status"], "fetched_at": now}, where=table.c.status != "ok",
+        )
+        connection.execute(
+            table.update()
+            .where(table.c.domain == domain, table.c.status == "ok", table.c.fetched_at < retry_at)
+            .values(fetched_at=retry_at)
+        )
+    db.session.flush()
+
+
+def get_company_profiles(urls, refresh=False):
+    """複数URLの会社プロフィールを返す。戻り値は {url: CompanyProfile または None}
+
+    保存済みで期限内のプロフィールはそのまま使い、それ以外のドメインだけを並列に取得して保存する。
+    保存した内容の commit は呼び出し側で行う。
+    URL からドメインが取り出せない場合は None。
+    """
+    urls = [u for u in dict.fromkeys(urls) if u]
+    domains = {url: normalize_domain(url) for url in urls}
+    wanted = {d for d in domains.values() if d}
+    if not wanted:
+        return {url: None for url in urls}
+
+    now = datetime.now()
+    profiles = {p.domain: p for p in CompanyProfile.query.filter(CompanyProfile.domain.in_(wanted)).all()}
+    stale = {}
+    for url, domain in domains.items():
+        if domain and domain not in stale and (refresh or domain not in profiles or not _is_fresh(profiles[domain], now)):
+            stale[domain] = url
+
+    COMPANY_PROFILE_LOOKUPS.inc(len(wanted) - len(stale), source="database")
+    if stale:
+        COMPANY_PROFILE_LOOKUPS.inc(len(stale), source="fetched")
+        with span("company.fetch_profiles", domains=len(stale)):
+            fetched = fetch_domains(stale, fetch=fetch_company_profile)
+        fetched = {d: data for d, data in fetched.items() if data["status"] != "invalid"}
+        if fetched:
+            _save_profiles(fetched, stale, now)
+            # 保存済みのインスタンスは SQL で更新したため、読み込み直して最新の値にする
+            query = CompanyProfile.query.filter(CompanyProfile.domain.in_(fetched.keys()))
+            for profile in query.populate_existing().all():
+                profiles[profile.domain] = profile
+
+    return {url: profiles.get(domain) if domain else None for url, domain in domains.items()}
+
+
+def get_company_profile(url, refresh=False):
+    """URLの会社プロフィールを返す（保存済みで期限内なら取得しない）"""
+    return get_company_profiles([url], refresh=refresh).get(url) if url else None
+
+
+def find_company_profile(url):
+    """保存済みの会社プロフィールを返す（Webサイトへのアクセスはしない）"""
+    domain = normalize_domain(url)
+    if domain is None:
+        return None
+    return CompanyProfile.query.filter_by(domain=domain).first()
+
+
+def describe_profile(profile):
+    """プロンプトに渡す会社情報テキストを返す"""
+    if profile is None:
+        return STATUS_MESSAGES["invalid"]
+    if profile.status != "ok" or not profile.summary:
+        return STATUS_MESSAGES.get(profile.status, STATUS_MESSAGES["error"])
+    return profile.summary
+
+
+def get_company_info(url):
+    """URLから会社のWebサイト情報（要約）を取得する"""
+    return describe_profile(get_company_profile(url))
+
+
+def get_company_info_batch(urls):
+    """複数URLの会社情報（要約）を返す。戻り値は {url: 会社情報テキスト}"""
+    return {url: describe_profile(profile) for url, profile in get_company_profiles(urls).items()}
@@ -1,7 +1,11 @@
 import io
+import logging
 import pandas as pd
 from extensions import db
-from models import Card
+from models import Card, ContactKey
+from services.dedup_service import normalize_email, normalize_text
+
+logger = logging.getLogger(__name__)
 
 def process_csv_import(file_content, user_id):
     """CSVを解析してDBに登録/更新する。フォーマットを自動判別する"""
@@ -10,10 +14,10 @@ def process_csv_import(file_content, user_id):
     for enc in ["utf-8-sig", "cp932"]:
         try:
             df = pd.read_csv(io.BytesIO(file_content), encoding=enc)
-            print(f"DEBUG: Successfully read CSV with encoding {enc}")
+            logger.debug("Read CSV with encoding %s", enc)
             break
         except Exception as e:
-            print(f"DEBUG: Failed to read CSV with encoding {enc}: {str(e)}")
+            logger.debug("Failed to read CSV with encoding %s: %s", enc, e)
     
     if df is None:
         raise Exception("CSVファイルの読み込みに失敗しました（対応していない文字コードです）")
@@ -21,16 +25,43 @@ def process_csv_import(file_content, user_id):
     columns = list(df.columns)
     # 1. 自動判別: 「企業名」と「代表者名」が含まれていれば企業リスト形式とみなす
     if "企業名" in columns and "代表者名" in columns:
-        print("DEBUG: Detected Corporate List format")
+        logger.info("Importing CSV as corporate list format (%d rows)", len(df))
         return _process_corporate_list(df, user_id)
     else:
-        print("DEBUG: Detected Eight format (or default)")
+        logger.info("Importing CSV as Eight format (%d rows)", len(df))
         return _process_eight_csv(df, user_id)
 
+def _load_existing_cards(user_id, emails, chunk_size=500):
+    """CSV内のメールアドレスに一致する既存名刺をまとめて取得する（行ごとのSELECTを避ける）
+
+    キーは正規化したメールアドレス（NFKC・小文字）で、大文字小文字や全角の違いを同一視する。
+    """
+    emails = list({e for e in emails if e})
+    normalized = list({normalize_email(e) for e in emails} - {""})
+    existing = {}
+    for start in range(0, len(normalized), chunk_size):
+        chunk = normalized[start:start + chunk_size]
+        cards = (
+            Card.query.join(ContactKey, ContactKey.card_id == Card.id)
+            .filter(ContactKey.user_id == user_id, ContactKey.kind == "email", ContactKey.value.in_(chunk))
+            .order_by(Card.id)
+        )
+        for card in cards:
+            existing.setdefault(normalize_text(card.email), card)
+    # キー未作成の古い名刺は完全一致で補う
+    for start in range(0, len(emails), chunk_size):
+        chunk = emails[start:start + chunk_size]
+        for card in Card.query.filter(Card.user_id == user_id, Card.email.in_(chunk)).order_by(Card.id):
+            existing.setdefault(normalize_text(card.email), card)
+    return existing
+
 def _process_corporate_list(df, user_id):
     """企業リスト形式のCSV処理"""
     count_success = 0
     count_updated = 0
+    existing_cards = _load_existing_cards(
+        user_id, (str(e).strip() for e in df.get("メールアドレス", []))
+    )
     
     for i, row in df.iterrows():
         # メールアドレスをキーにする
@@ -50,7 +81,7 @@ def _process_corporate_list(df, user_id):
         # 業種（分類１） -> department_name (便宜上)
         department = _get_val(row, "業種（分類１）")
         
-        existing_card = Card.query.filter_by(user_id=user_id, email=email).first()
+        existing_card = existing_cards.get(normalize_text(email))
         
         if existing_card:
             existing_card.company_name = company
@@ -73,6 +104,7 @@ def _process_corporate_list(df, user_id):
                 url=url
             )
             db.session.add(new_card)
+            existing_cards[normalize_text(email)] = new_card
             count_success += 1
             
     db.session.commit()
@@ -97,6 +129,9 @@ def _process_eight_csv(df, user_id):
 
     count_success = 0
     count_updated = 0
+    existing_cards = _load_existing_cards(
+        user_id, (str(e).strip() for e in df.get("email", []))
+    )
 
     for i, row in df.iterrows():
         email = str(row.get("email", "")).strip()
@@ -110,13 +145,13 @@ def _process_eight_csv(df, user_id):
             phone = str(row.get("phone_number_office", "")).strip()
         
         if not email or email == "nan":
-            print(f"DEBUG: Row {i} skipped: Email empty. (Name: {person_name})")
+            logger.debug("Row %s skipped: email empty", i)
             continue
         
-        existing_card = Card.query.filter_by(user_id=user_id, email=email).first()
+        existing_card = existing_cards.get(normalize_text(email))
         
         if existing_card:
-            print(f"DEBUG: Updating existing card: {email}")
+            logger.debug("Row %s: updating existing card %s", i, existing_card.id)
             existing_card.company_name = _get_row_val(row, "company_name", existing_card.company_name)
             existing_card.department_name = _get_row_val(row, "department_name", existing_card.department_name)
             existing_card.job_title = _get_row_val(row, "job_title", existing_card.job_title)
@@ -125,7 +160,7 @@ def _process_eight_csv(df, user_id):
             existing_card.url = _get_row_val(row, "url", existing_card.url)
             count_updated += 1
         else:
-            print(f"DEBUG: Registering new card: {email}")
+            logger.debug("Row %s: registering new card", i)
             new_card = Card(
                 user_id=user_id,
                 image_path="no-image.png",
@@ -138,6 +173,7 @@ def _process_eight_csv(df, user_id):
                 url=_get_row_val(row, "url", "")
             )
             db.session.add(new_card)
+            existing_cards[normalize_text(email)] = new_card
             count_success += 1
 
     db.session.commit()
@@ -0,0 +1,235 @@
+import re
+import unicodedata
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, aliased
+from database import DELETE_CHUNK_SIZE, delete_by_ids
+from extensions import db
+from models import Card, ContactKey
+
+# 会社名の比較時に取り除く法人格の表記
+COMPANY_SUFFIXES = [
+    "株式会社", "有限会社", "合同会社", "合資会社", "合名会社",
+    "一般社団法人", "一般財団法人", "(株)", "(有)", "(同)", "㈱", "㈲",
+]
+
+# 統合時に重複側から補完する項目
+MERGE_FIELDS = [
+    "company_name", "department_name", "job_title", "last_name", "first_name",
+    "phone_number", "email", "url",
+]
+
+
+def normalize_text(value):
+    """NFKC 正規化・小文字化し、空白（全角含む）を除去する"""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKC", str(value)).lower()
+    return re.sub(r"\s+", "", value)
+
+
+def normalize_email(value):
+    value = normalize_text(value)
+    return value if "@" in value else ""
+
+
+def normalize_phone(value):
+    """数字のみを残し、+81 表記は国内表記（0始まり）に揃える"""
+    digits = re.sub(r"\D", "", unicodedata.normalize("NFKC", str(value or "")))
+    if digits.startswith("81") and len(digits) >= 11:
+        digits = "0" + digits[2:]
+    return digits if len(digits) >= 9 else ""
+
+
+def normalize_company(value):
+    value = unicodedata.normalize("NFKC", str(value or ""))
+    for suffix in COMPANY_SUFFIXES:
+        value = value.replace(unicodedata.normalize("NFKC", suffix), "")
+    return normalize_text(value)
+
+
+def compute_keys(card):
+    """名刺から (kind, value) のブロッキングキーを作る"""
+    keys = []
+    email = normalize_email(card.email)
+    if email:
+        keys.append(("email", email))
+    phone = normalize_phone(card.phone_number)
+    if phone:
+        keys.append(("phone", phone))
+    name = normalize_text(f"{card.last_name or ''}{card.first_name or ''}")
+    company = normalize_company(card.company_name)
+    if name and company and name != normalize_text("氏名不明"):
+        keys.append(("name_company", f"{name}|{company}"[:255]))
+    return keys
+
+
+def _replace_keys(connection, cards):
+    table = ContactKey.__table__
+    card_ids = [card.id for card in cards]
+    for start in range(0, len(card_ids), DELETE_CHUNK_SIZE):
+        connection.execute(table.delete().where(table.c.card_id.in_(card_ids[start:start + DELETE_CHUNK_SIZE])))
+    rows = [
+        {"card_id": card.id, "user_id": card.user_id, "kind": kind, "value": value}
+        for card in cards
+        for kind, value in compute_keys(card)
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+@event.listens_for(Session, "before_flush")
+def _delete_keys_of_deleted_cards(session, flush_context, instances):
+    # 外部キー制約のあるDBでは名刺より先にキーを削除する必要がある
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Card) and obj.id is not None]
+    if deleted:
+        delete_contact_keys(deleted, connection=session.connection())
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_contact_keys(session, flush_context):
+    # 追加・更新された名刺だけキーを作り直す（全件の再走査はしない）
+    changed = [obj for obj in session.new | session.dirty if isinstance(obj, Card)]
+    if changed:
+        _replace_keys(session.connection(), changed)
+
+
+def delete_contact_keys(card_ids, user_id=None, connection=None):
+    """名刺のキーを削除する。一括削除（イベントを経由しない削除）の前に呼び出す"""
+    table = ContactKey.__table__
+    execute = connection.execute if connection is not None else db.session.execute
+    card_ids = [int(i) for i in card_ids]
+    for start in range(0, len(card_ids), DELETE_CHUNK_SIZE):
+        stmt = table.delete().where(table.c.card_id.in_(card_ids[start:start + DELETE_CHUNK_SIZE]))
+        if user_id is not None:
+            stmt = stmt.where(table.c.user_id == user_id)
+        execute(stmt)
+
+
+def rebuild_contact_keys(user_id=None, batch_size=1000):
+    """既存の名刺からキーを作り直す（導入時のバックフィル用）。処理件数を返す"""
+    query = Card.query.order_by(Card.id)
+    if user_id is not None:
+        query = query.filter(Card.user_id == user_id)
+    connection = db.session.connection()
+    total = 0
+    last_id = 0
+    while True:
+        cards = query.filter(Card.id > last_id).limit(batch_size).all()
+        if not cards:
+            break
+        _replace_keys(connection, cards)
+        total += len(cards)
+        last_id = cards[-1].id
+    db.session.commit()
+    return total
+
+
+def find_duplicate_candidates(card):
+    """指定した名刺とキーを共有する同一ユーザーの名刺を返す（インデックス検索）"""
+    mine = aliased(ContactKey)
+    other = aliased(ContactKey)
+    return (
+        Card.query.join(other, other.card_id == Card.id)
+        .join(mine, (mine.user_id == other.user_id) & (mine.kind == other.kind) & (mine.value == other.value))
+        .filter(mine.card_id == card.id, other.card_id != card.id)
+        .distinct()
+        .order_by(Card.id)
+        .all()
+    )
+
+
+def find_duplicate_groups(user_id):
+    """ユーザーの名刺を重複候補ごとにまとめる
+
+    同じキーを共有する名刺同士を union-find で連結し、
+    [{"card_ids": [...], "reasons": ["email", ...]}, ...] を返す。
+    """
+    shared = (
+        select(ContactKey.kind, ContactKey.value)
+        .where(ContactKey.user_id == user_id)
+        .group_by(ContactKey.kind, ContactKey.value)
+        .having(func.count(func.distinct(ContactKey.card_id)) > 1)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ContactKey.kind, ContactKey.value, ContactKey.card_id)
+        .join(shared, (shared.c.kind == ContactKey.kind) & (shared.c.value == ContactKey.value))
+        .join(Card, Card.id == ContactKey.card_id)
+        .where(ContactKey.user_id == user_id)
+        .order_by(ContactKey.kind, ContactKey.value, ContactKey.card_id)
+    ).all()
+
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    first_of_key = {}
+    reasons = {}
+    for kind, value, card_id in rows:
+        root = find(card_id)
+        key = (kind, value)
+        if key in first_of_key:
+            other_root = find(first_of_key[key])
+            if other_root != root:
+                parent[max(root, other_root)] = min(root, other_root)
+        else:
+            first_of_key[key] = card_id
+        reasons.setdefault(card_id, set()).add(kind)
+
+    groups = {}
+    for card_id in parent:
+        groups.setdefault(find(card_id), []).append(card_id)
+    result = []
+    for card_ids in groups.values():
+        if len(card_ids) < 2:
+            continue
+        card_ids.sort()
+        kinds = set().union(*(reasons[c] for c in card_ids))
+        result.append({"card_ids": card_ids, "reasons": sorted(kinds)})
+    result.sort(key=lambda g: g["card_ids"][0])
+    return result
+
+
+def merge_cards(primary_id, duplicate_ids, user_id=None):
+    """重複名刺を主となる名刺に統合する
+
+    主名刺の空欄を重複側の値で補完し、重複側は削除する。
+    user_id を指定した場合はそのユーザーの名刺のみを対象とする。
+    戻り値は (主名刺, 削除した名刺の image_path リスト)。主名刺が無ければ (None, [])。
+    """
+    duplicate_ids = [int(i) for i in duplicate_ids if int(i) != int(primary_id)]
+    primary = db.session.get(Card, int(primary_id))
+    if primary is None or (user_id is not None and primary.user_id != user_id):
+        return None, []
+
+    duplicates = (
+        Card.query.filter(Card.id.in_(duplicate_ids), Card.user_id == primary.user_id)
+        .order_by(Card.created_at.desc())
+        .all()
+    ) if duplicate_ids else []
+
+    for field in MERGE_FIELDS:
+        if getattr(primary, field):
+            continue
+        for dup in duplicates:
+            if getattr(dup, field):
+                setattr(primary, field, getattr(dup, field))
+                break
+    if not primary.image_path or primary.image_path == "no-image.png":
+        for dup in duplicates:
+            if dup.image_path and dup.image_path != "no-image.png":
+                primary.image_path = dup.image_path
+                break
+
+    removed_ids = [dup.id for dup in duplicates]
+    removed_images = [dup.image_path for dup in duplicates if dup.image_path != primary.image_path]
+    db.session.flush()
+    if removed_ids:
+        delete_contact_keys(removed_ids)
+        delete_by_ids(Card, removed_ids)
+    return primary, removed_images
@@ -0,0 +1,245 @@
+import json
+import logging
+from config import Config
+from services.ai_service import get_ai_completion
+from services.usage_service import AIQuotaExceeded
+
+logger = logging.getLogger(__name__)
+
+NO_WEB_INFO = "ウェブサイト情報なし"
+
+
+def build_sender_block(user):
+    return f"""【差出人情報（あなた）】
+会社名: {user.company_name or '（会社名未設定）'}
+氏名: {user.real_name or '（氏名未設定）'}
+事業概要: {user.business_summary or '営業支援'}"""
+
+
+def build_recipient_block(card, web_info=None):
+    return f"""会社名: {card.company_name or '貴社'}
+氏名: {card.person_name or '担当者'}
+役職: {card.job_title or ''}
+部署: {card.department_name or ''}
+URL: {card.url or ''}
+相手企業の事業概要: {web_info or NO_WEB_INFO}"""
+
+
+JSON_OUTPUT_RULES = """【出力ルール】
+- 以下のJSON形式のみを出力してください。
+{
+    "subject": "件名",
+    "body": "メール本文"
+}"""
+
+# ストリーミング時は JSON だと途中経過を表示しにくいため、行頭の見出しで区切った形式にする
+TEXT_OUTPUT_RULES = """【出力ルール】
+- 以下の形式のみを出力してください（前置きや説明は不要です）。
+件名: （件名）
+本文:
+（メール本文）"""
+
+
+def build_email_prompt(user, card, web_info=None, output_rules=JSON_OUTPUT_RULES):
+    """1件分のお礼メール生成プロンプト"""
+    return f"""あなたはプロの営業担当です。以下の情報を元に、名刺交換のお礼メールの件名と本文を作成してください。
+
+{build_sender_block(user)}
+
+【相手の情報】
+{build_recipient_block(card, web_info)}
+
+{output_rules}"""
+
+
+def build_batch_prompt(user, cards, web_infos):
+    """複数の相手分をまとめて生成するプロンプト（差出人情報は1回だけ含める）"""
+    recipients = "\n\n".join(
+        f"--- card_id: {card.id} ---\n{build_recipient_block(card, web_infos.get(card.url))}"
+        for card in cards
+    )
+    return f"""あなたはプロの営業担当です。以下の相手それぞれに、名刺交換のお礼メールの件名と本文を作成してください。
+メールは相手ごとに個別の内容とし、他の相手の情報を混ぜないでください。
+
+{build_sender_block(user)}
+
+【相手の情報（{len(cards)}件）】
+{recipients}
+
+【出力ルール】
+- 以下のJSON形式のみを出力してください。emails には全ての card_id を1件ずつ含めてください。
+{{
+    "emails": [
+        {{"card_id": 123, "subject": "件名", "body": "メール本文"}}
+    ]
+}}"""
+
+
+def _parse_json(result):
+    if isinstance(result, str):
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            return None
+    return result
+
+
+def _valid_draft(item):
+    if not isinstance(item, dict):
+        return None
+    subject, body = item.get("subject"), item.get("body")
+    if not isinstance(subject, str) or not isinstance(body, str) or not subject.strip() or not body.strip():
+        return None
+    return {"subject": subject, "body": body}
+
+
+def split_batch_response(result, card_ids):
+    """一括生成の応答を検証し、{card_id: {"subject", "body"}} に分割する
+
+    対象外の card_id・重複・件名や本文が空の項目は除外する。
+    """
+    parsed = _parse_json(result)
+    items = parsed.get("emails") if isinstance(parsed, dict) else parsed
+    if isinstance(parsed, dict) and "card_id" in parsed:
+        # 配列で返され、Gemini 側で先頭の1件だけが取り出された場合
+        items = [parsed]
+    if not isinstance(items, list):
+        return {}
+    wanted = set(card_ids)
+    drafts = {}
+    for item in items:
+        try:
+            card_id = int(item.get("card_id"))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        draft = _valid_draft(item)
+        if card_id in wanted and card_id not in drafts and draft:
+            drafts[card_id] = draft
+    return drafts
+
+
+def parse_draft(result):
+    """AIの応答（JSON 文字列または dict）から件名・本文を取り出す。不正なら None"""
+    return _valid_draft(_parse_json(result))
+
+
+def generate_email_draft(user, card, web_info=None):
+    """1件分のメールを生成する。生成できなければ None"""
+    result = get_ai_completion(build_email_prompt(user, card, web_info), response_format="json_object")
+    return parse_draft(result)
+
+
+def generate_email_drafts(user, cards, web_infos=None, batch_size=None):
+    """複数の名刺のメールを生成し、{card_id: {"subject", "body"} または None} を返す
+
+    batch_size 件ずつ1回のリクエストにまとめて生成し、応答に含まれなかった・不正だった名刺だけを
+    個別に生成し直す。batch_size が 1 以下なら1件ずつ生成する。
+    """
+    web_infos = web_infos or {}
+    batch_size = Config.BULK_PROMPT_BATCH_SIZE if batch_size is None else batch_size
+    drafts = {}
+
+    if batch_size > 1:
+        for start in range(0, len(cards), batch_size):
+            chunk = cards[start:start + batch_size]
+            if len(chunk) == 1:
+                continue
+            try:
+                result = get_ai_completion(build_batch_prompt(user, chunk, web_infos), response_format="json_object")
+                drafts.update(split_batch_response(result, [card.id for card in chunk]))
+            except AIQuotaExceeded:
+                raise
+            except Exception as e:
+                logger.warning("Batch generation failed, retrying individually: %s", e)
+
+    for card in cards:
+        if card.id in drafts:
+            continue
+        try:
+            drafts[card.id] = generate_email_draft(user, card, web_infos.get(card.url))
+        except AIQuotaExceeded:
+            # 上限に達した後は1件ずつ生成し直しても同じく失敗するため、呼び出し側に返す
+            raise
+        except Exception as e:
+            logger.exception("Failed to generate email for card %s", card.id)
+            drafts[card.id] = None
+    return drafts
+
+
+def format_sse(event, data):
+    """Server-Sent Events の1イベント分の文字列を作る"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class DraftStreamParser:
+    """ストリーミング出力（件名: ... / 本文: ...）を受け取りながら件名と本文の差分に振り分ける
+
+    feed() は [("subject" または "body", 差分テキスト), ...] を返す。
+    見出しが無い出力は全体を本文として扱う。
+    """
+    SUBJECT_MARKERS = ("件名:", "件名：")
+    BODY_MARKERS = ("本文:", "本文：")
+
+    def __init__(self):
+        self.state = "head"
+        self.buffer = ""
+        self.subject = ""
+        self.body = ""
+
+    @staticmethod
+    def _match(text, markers):
+        """見出しで始まれば見出しの長さ、見出しの途中までなら 0、違えば None"""
+        for marker in markers:
+            if text.startswith(marker):
+                return len(marker)
+            if marker.startswith(text):
+                return 0
+        return None
+
+    def feed(self, text):
+        self.buffer += text
+        events = []
+        while self.buffer:
+            if self.state in ("head", "between"):
+                stripped = self.buffer.lstrip()
+                if not stripped:
+                    break
+                markers = self.SUBJECT_MARKERS if self.state == "head" else self.BODY_MARKERS
+                matched = self._match(stripped, markers)
+                if matched == 0:
+                    break
+                if matched is None:
+                    self.state = "body"
+                    self.buffer = stripped
+                else:
+                    self.state = "subject" if self.state == "head" else "body_start"
+                    self.buffer = stripped[matched:]
+            elif self.state == "body_start":
+                # 「本文:」直後の空白・改行は捨てる
+                self.buffer = self.buffer.lstrip()
+                if self.buffer:
+                    self.state = "body"
+            elif self.state == "subject":
+                line, newline, rest = self.buffer.partition("\n")
+                if not self.subject:
+                    line = line.lstrip()
+                if line:
+                    self.subject += line
+                    events.append(("subject", line))
+                self.buffer = rest
+                if newline:
+                    self.state = "between"
+                elif not rest:
+                    break
+            else:
+                self.body += self.buffer
+                events.append(("body", self.buffer))
+                self.buffer = ""
+        return events
+
+    def result(self):
+        # 見出しの途中で終わった場合などに残ったテキストは本文として扱う
+        if self.buffer.strip() and self.state != "subject":
+            self.body += self.buffer
+            self.buffer = ""
+        return {"subject": self.subject.strip(), "body": self.body.strip()}
@@ -0,0 +1,212 @@
+"""
+負荷試験用のローカル代替プロバイダ（FAKE_PROVIDERS=true で有効）
+
+Azure OpenAI / Gemini / Azure Vision / メール送信の代わりに、SDK と同じ形の
+オブジェクトを返す。レイテンシ（対数正規分布）・エラー・429 の発生率と
+プロバイダごとの秒間リクエスト上限を環境変数で指定でき、課金やクォータを消費せずに
+bulk_send_emails や /upload を負荷試験できる。
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from config import Config
+
+
+class FakeProviderError(Exception):
+    """代替プロバイダが注入したエラー（メッセージに HTTP ステータスを含める）"""
+
+    def __init__(self, status, message):
+        super().__init__(f"Error code: {status} - {message}")
+        self.status_code = status
+        self.response = SimpleNamespace(status_code=status, headers={"retry-after": "0"})
+
+
+class TokenBucket:
+    """秒間リクエスト数の上限（rate 0 以下で無制限）"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class FakeBehavior:
+    """レイテンシ・エラー注入・スループット制限の設定"""
+
+    def __init__(self, latency_ms, sigma=0.0, error_rate=0.0, rate_limit_rate=0.0, max_rps=0, seed=None):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.bucket = TokenBucket(max_rps)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        """latency_ms を中央値とする対数正規分布から遅延（秒）を取り出す"""
+        if self.latency_ms <= 0:
+            return 0.0
+        with self._lock:
+            factor = math.exp(self._random.gauss(0, self.sigma)) if self.sigma > 0 else 1.0
+        return self.latency_ms * factor / 1000
+
+    def before_call(self, name):
+        """遅延を入れ、設定に応じて 429 / 503 を発生させる"""
+        if not self.bucket.take():
+            raise FakeProviderError(429, f"{name}: rate limit exceeded (fake)")
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise FakeProviderError(429, f"{name}: too many requests (fake)")
+        time.sleep(self.sample_latency())
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise FakeProviderError(503, f"{name}: service unavailable (fake)")
+
+
+_behaviors = {}
+_behaviors_lock = threading.Lock()
+
+
+def get_behavior(name):
+    """プロバイダ名ごとの設定（FAKE_<NAME>_* があればそちらを優先する）"""
+    with _behaviors_lock:
+        if name not in _behaviors:
+            def setting(key, default):
+                value = getattr(Config, f"FAKE_{name.upper()}_{key}", None)
+                if value is None:
+                    value = getattr(Config, f"FAKE_{key}", default)
+                return float(value)
+
+            _behaviors[name] = FakeBehavior(
+                latency_ms=setting("LATENCY_MS", 0),
+                sigma=setting("LATENCY_SIGMA", 0),
+                error_rate=setting("ERROR_RATE", 0),
+                rate_limit_rate=setting("RATE_LIMIT_RATE", 0),
+                max_rps=setting("MAX_RPS", 0),
+                seed=Config.FAKE_SEED,
+            )
+        return _behaviors[name]
+
+
+def reset_behaviors():
+    with _behaviors_lock:
+        _behaviors.clear()
+
+
+# --- 応答内容の生成 ---
+
+def _fake_email(label):
+    return {
+        "subject": f"先日の名刺交換のお礼（{label}）",
+        "body": f"{label}様\n\n先日は名刺交換の機会をいただき、ありがとうございました。\n今後ともよろしくお願いいたします。",
+    }
+
+
+def fake_completion_text(prompt, json_mode):
+    """プロンプトの出力ルールに合わせた決定的な応答を作る"""
+    if "name, company" in prompt or "テキストからJSON(" in prompt:
+        return json.dumps({
+            "name": "負荷 太郎", "company": "ロードテスト株式会社", "department": "開発部", "title": "部長",
+            "url": "https://loadtest.example.com", "email": f"load-{uuid.uuid4().hex[:8]}@example.com",
+            "phone": "03-0000-0000",
+        }, ensure_ascii=False)
+    card_ids = re.findall(r"card_id: (\d+)", prompt)
+    if card_ids:
+        return json.dumps({"emails": [{"card_id": int(i), **_fake_email(f"card {i}")} for i in card_ids]}, ensure_ascii=False)
+    email = _fake_email("ご担当者")
+    if json_mode or '"subject"' in prompt:
+        return json.dumps(email, ensure_ascii=False)
+    return f"件名: {email['subject']}\n本文:\n{email['body']}"
+
+
+def _estimate_tokens(text):
+    # 日本語混じりの文章でおおよそ2文字を1トークンとみなす
+    return max(1, len(text) // 2)
+
+
+def _chunks(text, size=8):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# --- SDK と同じ形のクライアント ---
+
+class _FakeChatCompletions:
+    def create(self, model, messages, response_format=None, stream=False, **kwargs):
+        get_behavior("azure").before_call("azure")
+        prompt = messages[-1]["content"]
+        text = fake_completion_text(prompt, json_mode=response_format is not None)
+        usage = SimpleNamespace(prompt_tokens=_estimate_tokens(prompt), completion_tokens=_estimate_tokens(text))
+        if stream:
+            chunks = [
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))], usage=None)
+                for part in _chunks(text)
+            ]
+            return iter(chunks + [SimpleNamespace(choices=[], usage=usage)])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+
+class FakeAzureOpenAI:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_FakeChatCompletions())
+
+
+def _gemini_usage(prompt, text):
+    return SimpleNamespace(prompt_token_count=_estimate_tokens(prompt), candidates_token_count=_estimate_tokens(text))
+
+
+class _FakeGeminiModels:
+    def generate_content(self, model, contents, config=None):
+        get_behavior("gemini").before_call("gemini")
+        prompt = contents if isinstance(contents, str) else contents[0]
+        json_mode = bool(config and config.get("response_mime_type") == "application/json")
+        text = fake_completion_text(prompt, json_mode)
+        return SimpleNamespace(text=text, usage_metadata=_gemini_usage(prompt, text))
+
+    def generate_content_stream(self, model, contents, config=None):
+        get_behavior("gemini").before_call("gemini")
+        text = fake_completion_text(contents, json_mode=False)
+        for part in _chunks(text):
+            yield SimpleNamespace(text=part, usage_metadata=_gemini_usage(contents, text))
+
+    def list(self):
+        return []
+
+
+class FakeGeminiClient:
+    def __init__(self):
+        self.models = _FakeGeminiModels()
+
+
+class FakeVisionClient:
+    def analyze(self, image_data, visual_features=None, **kwargs):
+        get_behavior("vision").before_call("vision")
+        lines = [
+            "ロードテスト株式会社", "開発部 部長", "負荷 太郎", "TEL 03-0000-0000",
+            f"load-{uuid.uuid4().hex[:8]}@example.com", "https://loadtest.example.com",
+        ]
+        block = SimpleNamespace(lines=[SimpleNamespace(text=line) for line in lines])
+        return SimpleNamespace(read=SimpleNamespace(blocks=[block]))
+
+
+def fake_send_email(user, data):
+    """メール送信の代替（実際には送信しない）"""
+    get_behavior("mail").before_call("mail")
+    return f"fake-{uuid.uuid4()}", "テスト用の代替プロバイダで送信しました（実際には送信されません）"
@@ -0,0 +1,175 @@
+"""
+名刺画像の前処理（OCR 用の正規化）
+
+EXIF の向きの補正・名刺部分の切り抜き・グレースケール化とコントラスト調整・縮小を行う。
+CPU を使う処理のため、IMAGE_WORKERS 個のプロセスプールで実行し、リクエストのスレッドを塞がない。
+ワーカーから読み込まれるため、このモジュールは Flask アプリや DB に依存させない。
+"""
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat
+
+logger = logging.getLogger(__name__)
+
+# 切り抜き判定に使う縮小画像の大きさと、背景との差とみなす明るさの差
+_PROBE_SIZE = 256
+_EDGE_THRESHOLD = 40
+# 名刺とみなす領域の面積比（これ以外は切り抜かない）
+_CARD_MIN_RATIO = 0.2
+_CARD_MAX_RATIO = 0.9
+
+# ワーカー1つが処理する画像数の上限（メモリの断片化を溜め込まないよう入れ替える）
+_MAX_TASKS_PER_CHILD = 200
+
+
+class ImageQueueFull(Exception):
+    """前処理待ちの画像が上限に達している"""
+
+
+class ImageProcessingTimeout(ImageQueueFull):
+    """前処理が時間内に終わらなかった（待ちあふれと同じく混雑として扱う）"""
+
+
+def _background_level(gray):
+    """四隅の明るさの中央値を背景の明るさとする"""
+    w, h = gray.size
+    size = max(2, min(w, h) // 16)
+    corners = [(0, 0), (w - size, 0), (0, h - size), (w - size, h - size)]
+    levels = sorted(ImageStat.Stat(gray.crop((x, y, x + size, y + size))).median[0] for x, y in corners)
+    return (levels[1] + levels[2]) // 2
+
+
+def _card_box(gray):
+    """背景との差が大きい領域（名刺）の範囲を返す。見つからなければ None"""
+    probe = gray.copy()
+    probe.thumbnail((_PROBE_SIZE, _PROBE_SIZE))
+    diff = ImageChops.difference(probe, Image.new("L", probe.size, _background_level(probe)))
+    mask = diff.point(lambda v: 255 if v > _EDGE_THRESHOLD else 0).filter(ImageFilter.MedianFilter(5))
+    box = mask.getbbox()
+    if box is None:
+        return None
+    ratio = (box[2] - box[0]) * (box[3] - box[1]) / (probe.width * probe.height)
+    if not _CARD_MIN_RATIO <= ratio <= _CARD_MAX_RATIO:
+        return None
+
+    # 縮小画像での範囲を元の大きさに戻し、少し余白を付ける
+    scale_x, scale_y = gray.width / probe.width, gray.height / probe.height
+    margin_x, margin_y = gray.width * 0.02, gray.height * 0.02
+    return (
+        max(0, int(box[0] * scale_x - margin_x)), max(0, int(box[1] * scale_y - margin_y)),
+        min(gray.width, int(box[2] * scale_x + margin_x)), min(gray.height, int(box[3] * scale_y + margin_y)),
+    )
+
+
+def normalize_card_image(image_data, max_size=1200, grayscale=True, crop=True, quality=85):
+    """名刺画像を OCR 向けに正規化した JPEG のバイト列を返す（読み込めない画像は例外）"""
+    img = Image.open(io.BytesIO(image_data))
+    if img.format == "JPEG":
+        # JPEG は縮小しながら読み込む（12 メガピクセルの写真を全画素展開しない）
+        img.draft("L" if grayscale else "RGB", (max_size, max_size))
+    img = ImageOps.exif_transpose(img)
+    img = img.convert("L") if grayscale else img.convert("RGB")
+
+    if crop:
+        box = _card_box(img if grayscale else img.convert("L"))
+        if box is not None:
+            img = img.crop(box)
+    if grayscale:
+        img = ImageOps.autocontrast(img, cutoff=1)
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+def guess_mime_type(image_data, filename=""):
+    """画像の先頭バイト（わからなければ拡張子）から MIME タイプを返す"""
+    if image_data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if image_data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+    name = (filename or "").lower()
+    if name.endswith(".png"):
+        return "image/png"
+    if name.endswith(".webp"):
+        return "image/webp"
+    return "image/jpeg"
+
+
+class ImagePreprocessor:
+    """名刺画像の正規化をプロセスプールで実行する（待ち数に上限あり）
+
+    workers が 0 の場合は呼び出したスレッドで実行する。
+    """
+
+    def __init__(self, workers=2, max_pending=8, wait_timeout=10.0, task_timeout=30.0, **options):
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self.task_timeout = task_timeout
+        self.options = options
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # fork はスレッド（ログ・利用記録の書き込み等）のロックを引き継ぐため spawn で起動する
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=_MAX_TASKS_PER_CHILD,
+                )
+            return self._executor
+
+    def normalize(self, image_data):
+        """正規化した画像を返す
+
+        待ち数が上限のまま wait_timeout 秒経つと ImageQueueFull、
+        ワーカーが task_timeout 秒以内に返さなければ ImageProcessingTimeout。
+        """
+        if self.workers <= 0:
+            return normalize_card_image(image_data, **self.options)
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise ImageQueueFull("画像の処理が混み合っています。しばらくしてから再度お試しください。")
+        try:
+            future = self._pool().submit(normalize_card_image, image_data, **self.options)
+        except BaseException:
+            self._slots.release()
+            raise
+        # 空きはワーカーの処理が終わったときに戻す（時間切れで待つのをやめた処理も、終わるまでは待ち数に数える）
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.task_timeout)
+        except FutureTimeoutError:
+            raise ImageProcessingTimeout("画像の処理に時間がかかっています。しばらくしてから再度お試しください。")
+        except BrokenProcessPool:
+            # ワーカーが異常終了した場合は次回に作り直す
+            self.shutdown(wait=False)
+            raise
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def init_image_preprocessor(app):
+    app.extensions["image_preprocessor"] = ImagePreprocessor(
+        workers=app.config.get("IMAGE_WORKERS", 2),
+        max_pending=app.config.get("IMAGE_QUEUE_SIZE", 8),
+        wait_timeout=app.config.get("IMAGE_QUEUE_TIMEOUT", 10.0),
+        task_timeout=app.config.get("IMAGE_TASK_TIMEOUT", 30.0),
+        max_size=app.config.get("IMAGE_MAX_SIZE", 1200),
+        grayscale=app.config.get("IMAGE_GRAYSCALE", True),
+        crop=app.config.get("IMAGE_CROP", True),
+    )
@@ -0,0 +1,76 @@
+import logging
+import os
+import queue
+import threading
+from flask import current_app
+from extensions import db
+from models import Card
+
+logger = logging.getLogger(__name__)
+
+# CSV取込などで設定される共通のダミー画像は削除しない
+PLACEHOLDER_IMAGES = {"no-image.png"}
+
+
+class ImageSweeper:
+    """削除された名刺の画像ファイルをバックグラウンドスレッドで片付ける"""
+
+    def __init__(self, app):
+        self.app = app
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, filenames):
+        names = {name for name in filenames if name and name not in PLACEHOLDER_IMAGES}
+        if not names:
+            return
+        self._queue.put(names)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="image-sweeper", daemon=True)
+                self._thread.start()
+
+    def join(self):
+        """キュー内の削除処理がすべて終わるまで待つ（テスト・終了処理用）"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            names = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self.sweep(names)
+            except Exception as e:
+                logger.exception("Image sweep failed")
+            finally:
+                self._queue.task_done()
+
+    def sweep(self, names):
+        """どの名刺からも参照されなくなった画像ファイルを削除する。削除したファイル名を返す"""
+        try:
+            still_used = {
+                row[0] for row in db.session.query(Card.image_path).filter(Card.image_path.in_(list(names)))
+            }
+        finally:
+            db.session.remove()
+
+        folder = self.app.config["UPLOAD_FOLDER"]
+        removed = []
+        for name in set(names) - still_used:
+            path = os.path.join(folder, os.path.basename(name))
+            try:
+                os.remove(path)
+                removed.append(name)
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+def init_image_sweeper(app):
+    app.extensions["image_sweeper"] = ImageSweeper(app)
+
+
+def schedule_image_cleanup(filenames):
+    """名刺削除のコミット後に呼び出し、画像ファイルの削除をバックグラウンドに回す"""
+    current_app.extensions["image_sweeper"].enqueue(filenames)
@@ -4,20 +4,100 @@ import smtplib
 import uuid
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
 from config import Config
-from models import History
-from datetime import date
+from database import upsert
+from extensions import db
+from metrics import MAIL_SEND_SECONDS, MAIL_SENDS, track
+from tracing import span
+from models import History, SendCounter
+from services.fake_providers import fake_send_email
+from datetime import date, datetime
 
 resend.api_key = Config.RESEND_API_KEY
 
+def _period_of(value):
+    return value.strftime("%Y-%m")
+
+def _period_bounds(period):
+    year, month = (int(x) for x in period.split("-"))
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
 def get_monthly_sent_count(user_id):
     """ユーザーの今月のメール送信数を取得する"""
-    first_day = date(date.today().year, date.today().month, 1)
-    count = History.query.filter(
-        History.user_id == user_id,
-        History.sent_at >= first_day
-    ).count()
-    return count
+    return get_monthly_sent_counts([user_id])[user_id]
+
+def get_monthly_sent_counts(user_ids):
+    """複数ユーザーの今月の送信数をまとめて取得する（カウンタ未作成分は History から集計）"""
+    period = _period_of(date.today())
+    counts = dict(
+        db.session.query(SendCounter.user_id, SendCounter.sent_count)
+        .filter(SendCounter.user_id.in_(user_ids), SendCounter.period == period)
+        .all()
+    )
+    missing = [user_id for user_id in user_ids if user_id not in counts]
+    if missing:
+        start, end = _period_bounds(period)
+        counts.update(
+            db.session.query(History.user_id, func.count(History.id))
+            .filter(History.user_id.in_(missing), History.sent_at >= start, History.sent_at < end)
+            .group_by(History.user_id)
+            .all()
+        )
+    return {user_id: counts.get(user_id, 0) for user_id in user_ids}
+
+def reset_sent_counters(user_ids, period=None):
+    """カウンタを破棄し、次回参照時に History から再集計させる（一括削除後などに使用）"""
+    if not user_ids:
+        return
+    period = period or _period_of(date.today())
+    db.session.query(SendCounter).filter(
+        SendCounter.user_id.in_(user_ids), SendCounter.period == period
+    ).delete(synchronize_session=False)
+
+@event.listens_for(Session, "before_flush")
+def _collect_send_counter_changes(session, flush_context, instances):
+    ops = session.info.setdefault("send_counter_ops", [])
+    for obj in session.new:
+        if isinstance(obj, History):
+            ops.append(("insert", obj.user_id, _period_of(obj.sent_at or datetime.now())))
+    for obj in session.deleted:
+        if isinstance(obj, History) and obj.sent_at:
+            ops.append(("delete", obj.user_id, _period_of(obj.sent_at)))
+
+@event.listens_for(Session, "after_flush")
+def _apply_send_counter_changes(session, flush_context):
+    ops = session.info.pop("send_counter_ops", None)
+    if not ops:
+        return
+    connection = session.connection()
+    table = SendCounter.__table__
+
+    inserted = {}
+    for op, user_id, period in ops:
+        if op == "insert":
+            inserted[(user_id, period)] = inserted.get((user_id, period), 0) + 1
+        else:
+            # 削除時はカウンタを破棄して再集計に任せる
+            connection.execute(
+                table.delete().where(table.c.user_id == user_id, table.c.period == period)
+            )
+
+    for (user_id, period), added in inserted.items():
+        start, end = _period_bounds(period)
+        # 初回は History の実件数（今回の追加分を含む）で作成し、以降は加算する
+        seed = select(func.count(History.id)).where(
+            History.user_id == user_id, History.sent_at >= start, History.sent_at < end
+        ).scalar_subquery()
+        upsert(
+            connection, table,
+            values={"user_id": user_id, "period": period, "sent_count": seed},
+            index_elements=[table.c.user_id, table.c.period],
+            set_={"sent_count": table.c.sent_count + added},
+        )
 
 def get_resend_metrics():
     """Resend APIから送信済みメールのメトリクスを取得する"""
@@ -57,12 +137,15 @@ def get_resend_metrics():
 
 def send_email(user, data):
     """メールを送信する (Gmail SMTP or Resend)"""
-    email_provider = user.email_provider or "resend"
-    
-    if email_provider == "gmail" and user.email_address and user.gmail_app_password:
-        return _send_via_gmail(user, data)
+    if Config.FAKE_PROVIDERS:
+        provider, sender = "fake", fake_send_email
+    elif (user.email_provider or "resend") == "gmail" and user.email_address and user.gmail_app_password:
+        provider, sender = "gmail", _send_via_gmail
     else:
-        return _send_via_resend(user, data)
+        provider, sender = "resend", _send_via_resend
+
+    with span("mail.send", provider=provider), track(MAIL_SENDS, MAIL_SEND_SECONDS, provider=provider):
+        return sender(user, data)
 
 def _send_via_gmail(user, data):
     sender_email = user.email_address
@@ -0,0 +1,100 @@
+import hashlib
+import json
+from flask import current_app, has_app_context
+from config import Config
+from services.ai_service import get_ai_completion, get_rewrite_model, stream_ai_completion
+from services.cache_service import TTLCache
+from services.draft_service import DraftStreamParser, JSON_OUTPUT_RULES, TEXT_OUTPUT_RULES, parse_draft
+from services.usage_service import record_cache_hit
+
+
+def init_rewrite_cache(app):
+    """書き換え結果のキャッシュをアプリごとに用意する（TTL 秒、0 で無効）"""
+    app.extensions["rewrite_cache"] = TTLCache(
+        ttl=app.config.get("REWRITE_CACHE_TTL", 600),
+        maxsize=app.config.get("REWRITE_CACHE_SIZE", 256),
+    )
+
+
+def _rewrite_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("rewrite_cache")
+
+
+def build_rewrite_prompt(subject, body, instruction, customer_info=None, output_rules=JSON_OUTPUT_RULES):
+    """既存の下書きを指示に従って書き換えるプロンプト"""
+    customer_info = customer_info or {}
+    return f"""以下の営業メールの下書きを、調整指示に従って書き換えてください。
+指示に関係しない内容（事実・固有名詞・署名）は変えないでください。件名が空の場合は本文に合う件名を付けてください。
+
+【相手】
+会社名: {customer_info.get('company') or ''}
+氏名: {customer_info.get('name') or ''}
+役職: {customer_info.get('title') or ''}
+
+【調整指示】
+{instruction}
+
+【現在の件名】
+{subject or ''}
+
+【現在の本文】
+{body}
+
+{output_rules}"""
+
+
+def _cache_key(user_id, subject, body, instruction, customer_info):
+    model = get_rewrite_model()
+    raw = json.dumps(
+        [user_id, Config.AI_ENGINE_TYPE, model, subject or "", body, instruction, customer_info or {}],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def rewrite_draft(user_id, subject, body, instruction, customer_info=None):
+    """下書きを書き換えて {"subject", "body"} を返す。同じ下書き・指示はキャッシュから返す"""
+    cache = _rewrite_cache()
+    key = _cache_key(user_id, subject, body, instruction, customer_info)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        record_cache_hit("rewrite")
+        return cached
+
+    result = get_ai_completion(
+        build_rewrite_prompt(subject, body, instruction, customer_info),
+        response_format="json_object",
+        tier="rewrite",
+    )
+    draft = parse_draft(result)
+    if draft is None:
+        raise ValueError("AIの応答を解釈できませんでした")
+    if cache is not None:
+        cache.set(key, draft)
+    return draft
+
+
+def stream_rewrite(user_id, subject, body, instruction, customer_info=None):
+    """下書きをストリーミングで書き換える
+
+    ("subject" / "body", 差分テキスト) を順に返し、最後に ("done", {"subject", "body"}) を返す。
+    キャッシュにある場合は done のみを返す。
+    """
+    cache = _rewrite_cache()
+    key = _cache_key(user_id, subject, body, instruction, customer_info)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        record_cache_hit("rewrite")
+        yield "done", cached
+        return
+
+    parser = DraftStreamParser()
+    prompt = build_rewrite_prompt(subject, body, instruction, customer_info, output_rules=TEXT_OUTPUT_RULES)
+    for delta in stream_ai_completion(prompt, tier="rewrite"):
+        yield from parser.feed(delta)
+    draft = parser.result()
+    if cache is not None and draft["body"]:
+        cache.set(key, draft)
+    yield "done", draft
@@ -0,0 +1,122 @@
+import logging
+import re
+from sqlalchemy import and_, event, or_, table, column, text
+from sqlalchemy.exc import OperationalError
+from extensions import db
+from models import Card
+
+logger = logging.getLogger(__name__)
+
+# 検索対象の列（card テーブルと同じ並び）
+SEARCH_COLUMNS = [
+    "company_name", "department_name", "job_title",
+    "last_name", "first_name", "email", "url",
+]
+
+# trigram トークナイザは 3 文字未満の語を検索できないため、短い語は LIKE で絞り込む
+TRIGRAM_MIN_LENGTH = 3
+
+_cols = ", ".join(SEARCH_COLUMNS)
+_new_cols = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+_old_cols = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+
+# card を外部コンテンツとする FTS5 仮想テーブル。trigram で日本語も部分一致検索できる
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS card_fts USING fts5(
+        {_cols}, content='card', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS card_fts_ai AFTER INSERT ON card BEGIN
+        INSERT INTO card_fts(rowid, {_cols}) VALUES (new.id, {_new_cols});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS card_fts_ad AFTER DELETE ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, {_cols}) VALUES ('delete', old.id, {_old_cols});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS card_fts_au AFTER UPDATE ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, {_cols}) VALUES ('delete', old.id, {_old_cols});
+        INSERT INTO card_fts(rowid, {_cols}) VALUES (new.id, {_new_cols});
+    END""",
+]
+
+card_fts = table("card_fts", column("rowid"))
+
+
+def ensure_card_search_index(connection, rebuild=False):
+    """FTS5 の検索インデックスと同期トリガーを作成する（SQLite のみ）。作成できたら True"""
+    if connection.dialect.name != "sqlite":
+        return False
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'card_fts'")
+    ).first() is not None
+    try:
+        for ddl in FTS_DDL:
+            connection.execute(text(ddl))
+    except OperationalError as e:
+        # FTS5 / trigram 非対応の SQLite では LIKE 検索のみで動作する
+        logger.warning("Full-text search unavailable: %s", e)
+        return False
+    if rebuild or not exists:
+        connection.execute(text("INSERT INTO card_fts(card_fts) VALUES ('rebuild')"))
+    return True
+
+
+@event.listens_for(Card.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        # card を作り直した場合に古い索引が残らないよう作り直す
+        connection.execute(text("DROP TABLE IF EXISTS card_fts"))
+        ensure_card_search_index(connection)
+
+
+def _fts_available():
+    bind = db.session.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'card_fts'")
+    ).first() is not None
+
+
+def _split_terms(query_text):
+    # 全角スペースも区切りとして扱う
+    return [t for t in re.split(r"[\s　]+", query_text or "") if t]
+
+
+def _like_condition(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{escaped}%"
+    return or_(*[getattr(Card, c).ilike(pattern, escape="\\") for c in SEARCH_COLUMNS])
+
+
+def search_cards(query_text, user_id=None, page=1, per_page=20):
+    """名刺を全文検索し、(該当名刺のリスト, 総件数) を返す
+
+    3 文字以上の語は FTS5 (trigram) で検索して関連度順に並べ、
+    それより短い語は LIKE で絞り込む。FTS5 が使えない場合は LIKE のみで検索する。
+    """
+    terms = _split_terms(query_text)
+    query = Card.query
+    if user_id is not None:
+        query = query.filter(Card.user_id == user_id)
+
+    use_fts = _fts_available()
+    fts_terms = [t for t in terms if use_fts and len(t) >= TRIGRAM_MIN_LENGTH]
+    like_terms = [t for t in terms if t not in fts_terms]
+
+    if fts_terms:
+        match = " AND ".join('"' + t.replace('"', '""') + '"' for t in fts_terms)
+        query = (
+            query.join(card_fts, card_fts.c.rowid == Card.id)
+            .filter(text("card_fts MATCH :match").bindparams(match=match))
+        )
+    if like_terms:
+        query = query.filter(and_(*[_like_condition(t) for t in like_terms]))
+
+    total = query.order_by(None).count()
+    if fts_terms:
+        query = query.order_by(text("card_fts.rank"), Card.created_at.desc())
+    else:
+        query = query.order_by(Card.created_at.desc())
+
+    page = max(page, 1)
+    cards = query.offset((page - 1) * per_page).limit(per_page).all()
+    return cards, total
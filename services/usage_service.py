@@ -0,0 +1,249 @@
+import atexit
+import contextvars
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from flask import current_app, has_app_context, has_request_context
+from flask_login import current_user
+from sqlalchemy import func
+from config import Config
+from database import upsert
+from extensions import db
+from models import AIUsage, AIUsageMonthly, User
+
+logger = logging.getLogger(__name__)
+
+# 実行中のAI呼び出しの記録（プロバイダ関数がトークン数・モデルを書き込む）
+_current_call = contextvars.ContextVar("ai_usage_call", default=None)
+
+
+class AIQuotaExceeded(Exception):
+    """今月のAI利用トークン数が上限に達した"""
+
+
+def _period_of(value):
+    return value.strftime("%Y-%m")
+
+
+def _token_count(value):
+    return value if isinstance(value, int) else 0
+
+
+def current_user_id():
+    """リクエスト中のログインユーザーの ID（無ければ None）"""
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    return None
+
+
+def record_tokens(prompt_tokens=None, completion_tokens=None, model=None):
+    """プロバイダの応答のトークン数・モデルを実行中の呼び出しに記録する"""
+    call = _current_call.get()
+    if call is None:
+        return
+    if prompt_tokens is not None:
+        call["prompt_tokens"] += _token_count(prompt_tokens)
+    if completion_tokens is not None:
+        call["completion_tokens"] += _token_count(completion_tokens)
+    if model:
+        call["model"] = str(model)
+
+
+@contextmanager
+def track_usage(operation, provider):
+    """ブロック内のAI呼び出しを利用記録として書き込みキューに送る（アプリの外では記録しない）"""
+    writer = _usage_writer()
+    if writer is None:
+        yield
+        return
+    call = {"prompt_tokens": 0, "completion_tokens": 0, "model": None}
+    token = _current_call.set(call)
+    started = time.perf_counter()
+    success = False
+    try:
+        yield
+        success = True
+    finally:
+        try:
+            _current_call.reset(token)
+        except ValueError:
+            # ストリーミングの生成が別のコンテキストで閉じられた場合
+            pass
+        writer.enqueue(dict(
+            call,
+            user_id=current_user_id(),
+            operation=operation,
+            provider=provider,
+            latency_ms=int((time.perf_counter() - started) * 1000),
+            cache_hit=False,
+            success=success,
+            created_at=datetime.now(),
+        ))
+
+
+def record_cache_hit(operation):
+    """キャッシュから返したAI応答を記録する（キャッシュの効果の集計用）"""
+    writer = _usage_writer()
+    if writer is not None:
+        writer.enqueue({
+            "user_id": current_user_id(), "operation": operation, "provider": None, "model": None,
+            "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0,
+            "cache_hit": True, "success": True, "created_at": datetime.now(),
+        })
+
+
+class UsageWriter:
+    """利用記録をバックグラウンドスレッドでまとめて書き込み、月次集計に加算する"""
+
+    def __init__(self, app, batch_size=100, flush_interval=2.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._pending = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._exit_registered = False
+
+    def enqueue(self, record):
+        self._queue.put(record)
+        self._pending.set()
+        with self._lock:
+            if not self._exit_registered:
+                # 終了直前にキューへ入った記録も書き込む（デーモンスレッドは終了時に止まるため）
+                atexit.register(self.flush)
+                self._exit_registered = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ai-usage-writer", daemon=True)
+                self._thread.start()
+
+    def _drain(self):
+        records = []
+        while len(records) < self.batch_size:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+    def flush(self):
+        """キュー内の記録をすぐに書き込む（書き込み中の分も終わるまで待つ）"""
+        with self._write_lock:
+            while True:
+                records = self._drain()
+                if not records:
+                    return
+                self._write(records)
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            # 少し待ってからまとめて書き込む
+            time.sleep(self.flush_interval)
+            self._pending.clear()
+            self.flush()
+
+    def _write(self, records):
+        with self.app.app_context():
+            try:
+                write_usage(records)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Failed to write %d AI usage records", len(records))
+            finally:
+                db.session.remove()
+
+
+def write_usage(records):
+    """利用記録を保存し、ユーザー・月・処理ごとの集計に加算する"""
+    db.session.execute(AIUsage.__table__.insert(), records)
+
+    rollup = {}
+    for r in records:
+        key = (r["user_id"] or 0, _period_of(r["created_at"]), r["operation"])
+        totals = rollup.setdefault(key, dict.fromkeys(
+            ["requests", "failures", "cache_hits", "prompt_tokens", "completion_tokens", "latency_ms"], 0))
+        totals["requests"] += 1
+        totals["failures"] += 0 if r["success"] else 1
+        totals["cache_hits"] += 1 if r["cache_hit"] else 0
+        totals["prompt_tokens"] += r["prompt_tokens"]
+        totals["completion_tokens"] += r["completion_tokens"]
+        totals["latency_ms"] += r["latency_ms"]
+
+    table = AIUsageMonthly.__table__
+    connection = db.session.connection()
+    for (user_id, period, operation), totals in rollup.items():
+        upsert(
+            connection, table,
+            values=dict(totals, user_id=user_id, period=period, operation=operation),
+            index_elements=[table.c.user_id, table.c.period, table.c.operation],
+            set_={name: table.c[name] + value for name, value in totals.items()},
+        )
+    db.session.commit()
+
+
+def init_usage_writer(app):
+    app.extensions["ai_usage_writer"] = UsageWriter(
+        app,
+        batch_size=app.config.get("AI_USAGE_BATCH_SIZE", 100),
+        flush_interval=app.config.get("AI_USAGE_FLUSH_INTERVAL", 2.0),
+    )
+
+
+def _usage_writer():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("ai_usage_writer")
+
+
+def get_monthly_token_usage(user_id, period=None):
+    """ユーザーの今月のAI利用トークン数（集計済みの分）"""
+    period = period or _period_of(date.today())
+    total = db.session.query(
+        func.coalesce(func.sum(AIUsageMonthly.prompt_tokens + AIUsageMonthly.completion_tokens), 0)
+    ).filter(AIUsageMonthly.user_id == user_id, AIUsageMonthly.period == period).scalar()
+    return int(total)
+
+
+def check_ai_quota():
+    """ログインユーザーの今月のトークン数が AI_MONTHLY_TOKEN_LIMIT を超えていれば AIQuotaExceeded（0 で無制限）"""
+    limit = Config.AI_MONTHLY_TOKEN_LIMIT
+    user_id = current_user_id()
+    if not limit or user_id is None or current_user.is_admin:
+        return
+    if get_monthly_token_usage(user_id) >= limit:
+        raise AIQuotaExceeded("今月のAI利用上限に達しました。管理者にお問い合わせください。")
+
+
+def get_usage_summary(period=None):
+    """月次集計をユーザーごとにまとめて返す（管理ダッシュボード用、トークン数の多い順）"""
+    period = period or _period_of(date.today())
+    rows = (
+        db.session.query(AIUsageMonthly, User.username)
+        .outerjoin(User, User.id == AIUsageMonthly.user_id)
+        .filter(AIUsageMonthly.period == period)
+        .all()
+    )
+    users = {}
+    for usage, username in rows:
+        entry = users.setdefault(usage.user_id, {
+            "user_id": usage.user_id, "username": username or "（システム）", "operations": {},
+            "requests": 0, "failures": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0,
+        })
+        entry["operations"][usage.operation] = usage.requests
+        for name in ["requests", "failures", "cache_hits", "prompt_tokens", "completion_tokens", "latency_ms"]:
+            entry[name] += getattr(usage, name)
+
+    summary = []
+    for entry in users.values():
+        calls = entry["requests"] - entry["cache_hits"]
+        entry["total_tokens"] = entry["prompt_tokens"] + entry["completion_tokens"]
+        entry["cache_hit_rate"] = round(entry["cache_hits"] / entry["requests"] * 100, 1) if entry["requests"] else 0
+        entry["avg_latency_ms"] = round(entry["latency_ms"] / calls) if calls else 0
+        summary.append(entry)
+    summary.sort(key=lambda e: e["total_tokens"], reverse=True)
+    return summary
@@ -0,0 +1,108 @@
+from collections import namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from extensions import db
+from models import User
+from services.cache_service import TTLCache
+
+
+# 管理画面のユーザー絞り込み用の軽量な射影（パスワード等の列は読み込まない）
+UserEntry = namedtuple("UserEntry", ["id", "username", "display_name"])
+
+
+def init_user_cache(app):
+    """ログインユーザーとユーザー一覧のキャッシュをアプリごとに用意する（TTL 秒、0 で無効）"""
+    app.extensions["user_cache"] = TTLCache(ttl=app.config.get("USER_CACHE_TTL", 30))
+    app.extensions["user_directory"] = TTLCache(ttl=app.config.get("USER_DIRECTORY_TTL", 300), maxsize=1)
+
+
+def _user_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("user_cache")
+
+
+def get_user_directory():
+    """全ユーザーの (id, username, display_name) 一覧を返す。ユーザー変更時に作り直す"""
+    cache = current_app.extensions.get("user_directory") if has_app_context() else None
+    entries = cache.get("all") if cache is not None else None
+    if entries is None:
+        rows = (
+            db.session.query(User.id, User.username, User.last_name, User.first_name)
+            .order_by(User.id)
+            .all()
+        )
+        entries = [
+            UserEntry(
+                row.id,
+                row.username,
+                f"{row.last_name or ''} {row.first_name or ''}".strip() or row.username,
+            )
+            for row in rows
+        ]
+        if cache is not None:
+            cache.set("all", entries)
+    return entries
+
+
+def invalidate_user_directory():
+    if has_app_context() and "user_directory" in current_app.extensions:
+        current_app.extensions["user_directory"].clear()
+
+
+def _snapshot(user):
+    """セッションから切り離した User のコピーを作る（列の値のみ）"""
+    values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+    snapshot = User(**values)
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def load_user_cached(user_id):
+    """user_loader 用。キャッシュがあれば DB に問い合わせずにセッションへ取り込む"""
+    cache = _user_cache()
+    if cache is not None:
+        snapshot = cache.get(user_id)
+        if snapshot is not None:
+            # load=False で SELECT を発行せずに永続化状態のインスタンスを得る
+            return db.session.merge(snapshot, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None and cache is not None:
+        cache.set(user_id, _snapshot(user))
+    return user
+
+
+def invalidate_user(user_id):
+    cache = _user_cache()
+    if cache is not None:
+        cache.delete(user_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in session.dirty | session.deleted if isinstance(obj, User)}
+    added = any(isinstance(obj, User) for obj in session.new)
+    if changed:
+        session.info.setdefault("changed_user_ids", set()).update(changed)
+        for user_id in changed:
+            invalidate_user(user_id)
+    if changed or added:
+        session.info["user_directory_stale"] = True
+        invalidate_user_directory()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    # flush からコミットまでの間に古い値が再キャッシュされた場合に備え、コミット後にも破棄する
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_user(user_id)
+    if session.info.pop("user_directory_stale", False):
+        invalidate_user_directory()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+    session.info.pop("user_directory_stale", None)
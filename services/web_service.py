@@ -1,25 +1,231 @@
-import requests
+import asyncio
+import codecs
+import re
+import time
+import httpx
+from urllib.parse import urlsplit
 from bs4 import BeautifulSoup
+from charset_normalizer import from_bytes
+from config import Config
+from metrics import COMPANY_FETCH_SECONDS, COMPANY_FETCHES
+from tracing import span
 
-def get_company_info(url):
-    """URLから会社のWebサイト情報を取得する"""
+# lxml があれば高速な C 実装のパーサを使う（無ければ標準の html.parser）
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+REQUEST_HEADERS = {"User-Agent": "Mozilla/5.0"}
+REMOVE_TAGS = ["script", "style", "header", "footer", "nav", "noscript", "svg", "template"]
+
+# 取得できなかった場合にプロンプトへ渡す文言
+STATUS_MESSAGES = {
+    "invalid": "ウェブサイト情報なし",
+    "empty": "Webサイトに内容がありません",
+    "error": "Webサイトにアクセス不可",
+}
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+_HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?([A-Za-z0-9_.:-]+)", re.IGNORECASE)
+
+
+def _normalize_url(url):
     if not url or "." not in url:
-        return "ウェブサイト情報なし"
+        return None
     if not url.startswith("http"):
         url = "https://" + url
+    return url
+
+
+def _valid_codec(name):
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def detect_encoding(body, content_type=""):
+    """文字コードを HTTP ヘッダ → meta タグ → UTF-8 → 推定 の順に決める"""
+    match = _HEADER_CHARSET.search(content_type or "")
+    if match and _valid_codec(match.group(1)):
+        return _valid_codec(match.group(1))
+    match = _META_CHARSET.search(body[:4096])
+    if match and _valid_codec(match.group(1).decode("ascii", "ignore")):
+        return _valid_codec(match.group(1).decode("ascii", "ignore"))
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, timeout=10, headers=headers)
-        response.encoding = response.apparent_encoding
-        soup = BeautifulSoup(response.text, "html.parser")
-        for s in soup(["script", "style", "header", "footer", "nav"]):
-            s.decompose()
-        
-        text_content = soup.get_text()
-        if not text_content:
-            return "Webサイトに内容がありません"
-            
-        full_text = " ".join(text_content.split())
-        return str(full_text)[:1200]
-    except Exception:
-        return "Webサイトにアクセス不可"
+        body.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # 上限で途中切断したマルチバイト文字のみが原因なら UTF-8 とみなす
+        if e.start >= len(body) - 3:
+            return "utf-8"
+    # 全体ではなく先頭のみで推定する（apparent_encoding は全文を走査して遅い）
+    best = from_bytes(body[:65536]).best()
+    return best.encoding if best else "utf-8"
+
+
+def _extract_text_from_soup(soup, max_chars):
+    for s in soup(REMOVE_TAGS):
+        s.decompose()
+
+    pieces = []
+    length = 0
+    for text in soup.stripped_strings:
+        text = " ".join(text.split())
+        pieces.append(text)
+        length += len(text) + 1
+        if length >= max_chars:
+            break
+    return " ".join(pieces)[:max_chars]
+
+
+def extract_text(html, max_chars=None):
+    """HTML から本文テキストを取り出す。max_chars に達した時点で走査を打ち切る"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    return _extract_text_from_soup(soup, max_chars or Config.WEB_TEXT_MAX_CHARS)
+
+
+def _meta_content(soup, **attrs):
+    tag = soup.find("meta", attrs=attrs)
+    if tag is None:
+        return ""
+    return " ".join((tag.get("content") or "").split())
+
+
+def extract_profile(html, max_chars=None):
+    """HTML からタイトル・meta description・OpenGraph・本文テキストを取り出す"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    title = ""
+    if soup.title:
+        title = " ".join(soup.title.get_text().split())
+        soup.title.decompose()
+    return {
+        "title": title,
+        "description": _meta_content(soup, name="description"),
+        "og_title": _meta_content(soup, property="og:title"),
+        "og_description": _meta_content(soup, property="og:description"),
+        "og_site_name": _meta_content(soup, property="og:site_name"),
+        # meta 情報を先に取り出してから本文を抽出する（抽出時にタグを削除するため）
+        "text": _extract_text_from_soup(soup, max_chars or Config.WEB_TEXT_MAX_CHARS),
+    }
+
+
+async def fetch_html(client, url, max_bytes=None):
+    """レスポンスをストリームで読み込み、max_bytes に達したら打ち切って (本文, Content-Type) を返す"""
+    max_bytes = max_bytes or Config.WEB_FETCH_MAX_BYTES
+    body = bytearray()
+    async with client.stream("GET", url) as response:
+        content_type = response.headers.get("content-type", "")
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) >= max_bytes:
+                break
+    return bytes(body[:max_bytes]), content_type
+
+
+def make_client(transport=None):
+    return httpx.AsyncClient(
+        headers=REQUEST_HEADERS,
+        timeout=Config.WEB_FETCH_TIMEOUT,
+        follow_redirects=True,
+        transport=transport,
+    )
+
+
+async def fetch_company_profile(url, client=None):
+    """URLから会社のWebサイトを非同期に取得し、抽出結果の dict を返す
+
+    status は ok（取得成功）/ empty（本文なし）/ error（アクセス不可）/ invalid（URLなし）。
+    """
+    url = _normalize_url(url)
+    if url is None:
+        return {"status": "invalid"}
+    if client is None:
+        async with make_client() as own_client:
+            return await fetch_company_profile(url, own_client)
+    started = time.perf_counter()
+    with span("web.fetch", url=url) as current:
+        try:
+            body, content_type = await fetch_html(client, url)
+            html = body.decode(detect_encoding(body, content_type), errors="replace")
+            profile = extract_profile(html)
+            profile["status"] = "ok" if profile["text"] else "empty"
+        except Exception as e:
+            current.set_attribute("error", f"{type(e).__name__}: {e}")
+            profile = {"status": "error"}
+        current.set_attribute("status", profile["status"])
+    COMPANY_FETCH_SECONDS.observe(time.perf_counter() - started)
+    COMPANY_FETCHES.inc(outcome=profile["status"])
+    return profile
+
+
+async def fetch_company_info(url, client=None):
+    """URLから会社のWebサイト情報を非同期に取得する"""
+    profile = await fetch_company_profile(url, client)
+    if profile["status"] == "ok":
+        return profile["text"]
+    return STATUS_MESSAGES[profile["status"]]
+
+
+def get_company_info(url):
+    """URLから会社のWebサイト情報を取得する"""
+    if _normalize_url(url) is None:
+        return STATUS_MESSAGES["invalid"]
+    return asyncio.run(fetch_company_info(url))
+
+
+def normalize_domain(url):
+    """URLから比較用のドメイン（小文字・www. 除去）を取り出す。取り出せなければ None"""
+    url = _normalize_url(url)
+    if url is None:
+        return None
+    host = (urlsplit(url.strip()).hostname or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return host or None
+
+
+async def _fetch_domains(representatives, max_workers, transport=None, fetch=None):
+    fetch = fetch or fetch_company_info
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async with make_client(transport) as client:
+        async def limited(url):
+            async with semaphore:
+                return await fetch(url, client)
+
+        infos = await asyncio.gather(*(limited(url) for url in representatives.values()))
+    return dict(zip(representatives.keys(), infos))
+
+
+def fetch_domains(representatives, max_workers=None, transport=None, fetch=None):
+    """{キー: URL} をまとめて並列に取得し、{キー: 取得結果} を返す（fetch の既定は fetch_company_info）"""
+    if not representatives:
+        return {}
+    return asyncio.run(_fetch_domains(representatives, max_workers or Config.WEB_FETCH_WORKERS, transport, fetch))
+
+
+def get_company_info_batch(urls, max_workers=None, transport=None):
+    """複数URLの会社情報を取得する。同じドメインは1回だけ取得し、ドメイン間は並列に取得する
+
+    戻り値は {url: 会社情報テキスト}。
+    """
+    urls = [u for u in dict.fromkeys(urls) if u]
+    by_domain = {}
+    results = {}
+    for url in urls:
+        domain = normalize_domain(url)
+        if domain is None:
+            results[url] = STATUS_MESSAGES["invalid"]
+        else:
+            by_domain.setdefault(domain, []).append(url)
+
+    # 各ドメインの最初のURLを代表として取得する
+    representatives = {domain: group[0] for domain, group in by_domain.items()}
+    infos = fetch_domains(representatives, max_workers, transport)
+    for domain, group in by_domain.items():
+        for url in group:
+            results[url] = infos[domain]
+    return results
@@ -1,13 +1,21 @@
+import os
 import pytest
+
+# テスト中はログファイル・標準エラーに書き出さない（Config は import 時に環境変数を読む）
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_CONSOLE", "false")
+
 from app import create_app
 from extensions import db
 from models import User, Card
 from flask_bcrypt import generate_password_hash
 from flask_login import login_user
+from services.ai_service import reset_ai_router
 
 class TestConfig:
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    # TEST_DATABASE_URL を指定するとローカルの PostgreSQL 等でも実行できる
+    SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL", "sqlite:///:memory:")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = False
     SECRET_KEY = "test-secret-key-for-testing"
@@ -34,6 +42,15 @@ class TestConfig:
     
     # Path settings
     UPLOAD_FOLDER = "static/uploads/cards"
+    # 画像の前処理はプロセスプールを使わずに実行する
+    IMAGE_WORKERS = 0
+
+@pytest.fixture(autouse=True)
+def fresh_ai_router():
+    """プロバイダの健全性の統計がテスト間で持ち越されないようにする"""
+    reset_ai_router()
+    yield
+    reset_ai_router()
 
 @pytest.fixture(scope='function')
 def app():
@@ -60,6 +77,8 @@ def app():
         
         yield app
         
+        # バックグラウンドで書き込み待ちのAI利用記録を片付けてから破棄する
+        app.extensions["ai_usage_writer"].flush()
         db.session.remove()
         db.drop_all()
 
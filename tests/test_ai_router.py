@@ -0,0 +1,86 @@
+import threading
+import time
+import pytest
+from services.ai_router import AIRouter, AllProvidersFailed
+
+
+class FakeProvider:
+    """呼び出し回数を数え、指定した遅延・失敗を再現するプロバイダ"""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise Exception(f"{self.name} unavailable (429)")
+        return f"{self.name}:{prompt}"
+
+
+def test_failover_and_circuit_breaker():
+    """失敗したプロバイダから切り替え、連続失敗で遮断して呼ばなくなるか"""
+    azure, gemini = FakeProvider("azure", fail=True), FakeProvider("gemini")
+    router = AIRouter({"azure": azure, "gemini": gemini}, failure_threshold=2, cooldown=60)
+
+    assert router.complete(["azure", "gemini"], "a") == "gemini:a"
+    assert router.complete(["azure", "gemini"], "b") == "gemini:b"
+    assert router.health["azure"].state == "open"
+
+    assert router.complete(["azure", "gemini"], "c") == "gemini:c"
+    assert azure.calls == 2
+    assert router.snapshot()["gemini"]["samples"] == 3
+
+
+def test_half_open_recovers_after_cooldown():
+    """クールダウン後の試行が成功すればサーキットが閉じるか"""
+    azure, gemini = FakeProvider("azure", fail=True), FakeProvider("gemini")
+    router = AIRouter({"azure": azure, "gemini": gemini}, failure_threshold=1, cooldown=0.05)
+    router.complete(["azure", "gemini"], "a")
+    assert router.health["azure"].state == "open"
+
+    time.sleep(0.06)
+    azure.fail = False
+    assert router.health["azure"].state == "half_open"
+    assert router.complete(["azure", "gemini"], "b") == "azure:b"
+    assert router.health["azure"].state == "closed"
+
+
+def test_all_providers_failed():
+    router = AIRouter({"azure": FakeProvider("azure", fail=True), "gemini": FakeProvider("gemini", fail=True)})
+    with pytest.raises(AllProvidersFailed):
+        router.complete(["azure", "gemini"], "a")
+
+
+def test_hedged_request_returns_faster_provider():
+    """優先プロバイダが p95 を超えて遅い場合に、もう一方の結果を先に返すか"""
+    azure, gemini = FakeProvider("azure", delay=0.01), FakeProvider("gemini")
+    router = AIRouter({"azure": azure, "gemini": gemini}, hedge=True, hedge_min_samples=5, hedge_min_delay=0.02)
+    for i in range(5):
+        assert router.complete(["azure", "gemini"], str(i)) == f"azure:{i}"
+    assert gemini.calls == 0
+
+    azure.delay = 1.0
+    started = time.perf_counter()
+    assert router.complete(["azure", "gemini"], "slow") == "gemini:slow"
+    assert time.perf_counter() - started < 0.5
+    assert gemini.calls == 1
+
+
+def test_stream_fails_over_before_first_chunk():
+    """最初のテキストが届く前の失敗のみ次のプロバイダへ切り替えるか"""
+    def broken(prompt):
+        raise Exception("connection reset")
+        yield
+
+    def working(prompt):
+        yield from ["件名: ", prompt]
+
+    router = AIRouter({"azure": broken, "gemini": working}, stream_providers={"azure": broken, "gemini": working})
+    assert list(router.stream(["azure", "gemini"], "テスト")) == ["件名: ", "テスト"]
+    assert router.health["azure"].consecutive_failures == 1
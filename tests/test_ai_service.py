@@ -1,7 +1,7 @@
 import pytest
 import json
 from unittest.mock import patch, MagicMock
-from services.ai_service import get_ai_completion, analyze_card_image
+from services.ai_service import get_ai_completion, analyze_card_image, stream_ai_completion
 
 class TestAIService:
     """AI サービスのモックテスト"""
@@ -43,6 +43,46 @@ class TestAIService:
         assert result == "Gemini応答"
         mock_client.models.generate_content.assert_called_once()
     
+    @patch("services.ai_service.time.sleep")
+    @patch("services.ai_service.get_gemini_client")
+    @patch("services.ai_service.get_openai_client")
+    def test_azure_rate_limit_retries_then_fails_over(self, mock_openai, mock_gemini, mock_sleep):
+        """Azure の 429 は再試行し、それでも失敗すれば Gemini に切り替えるか"""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = Exception("Error code: 429 - rate limit")
+        mock_openai.return_value = (mock_client, "gpt-4o-mini")
+        gemini_client = MagicMock()
+        gemini_client.models.generate_content.return_value = MagicMock(text="Gemini応答")
+        mock_gemini.return_value = gemini_client
+
+        with patch("services.ai_service.Config.AI_ENGINE_TYPE", "azure"), \
+                patch("services.ai_service.Config.GEMINI_API_KEY", "dummy"):
+            result = get_ai_completion("テストプロンプト")
+
+        assert result == "Gemini応答"
+        assert mock_client.chat.completions.create.call_count == 3
+        assert mock_sleep.call_count == 2
+
+    @patch("services.ai_service.get_openai_client")
+    def test_stream_ai_completion_azure(self, mock_get_client):
+        """Azure OpenAI のストリーミングで差分テキストのみが順に返るか"""
+        def chunk(content):
+            c = MagicMock()
+            c.choices = [MagicMock()] if content is not None else []
+            if content is not None:
+                c.choices[0].delta.content = content
+            return c
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = iter([chunk(None), chunk("件名: "), chunk(""), chunk("テスト")])
+        mock_get_client.return_value = (mock_client, "gpt-4o-mini")
+
+        with patch("services.ai_service.Config.AI_ENGINE_TYPE", "azure"):
+            result = list(stream_ai_completion("テストプロンプト"))
+
+        assert result == ["件名: ", "テスト"]
+        assert mock_client.chat.completions.create.call_args.kwargs["stream"] is True
+
     @patch("services.ai_service.get_gemini_client")
     def test_analyze_card_image_gemini(self, mock_get_client):
         """Gemini での名刺画像解析テスト"""
@@ -116,3 +156,21 @@ class TestAIService:
         assert result["email"] == "sato@test.example.com"
         mock_vision.analyze.assert_called_once()
         mock_openai.chat.completions.create.assert_called_once()
+
+    @patch("services.ai_service.get_openai_client")
+    @patch("services.ai_service.get_vision_client")
+    def test_analyze_card_image_azure_local_only(self, mock_vision_client, mock_openai_client):
+        """OCR テキストをすべてローカルで解釈できた場合は AI を呼ばないか"""
+        lines = ["テスト株式会社", "営業部 課長", "佐藤 花子", "TEL 090-9876-5432", "sato@test.example.com"]
+        block = MagicMock()
+        block.lines = [MagicMock(text=text) for text in lines]
+        mock_vision_client.return_value.analyze.return_value.read.blocks = [block]
+
+        with patch("services.ai_service.Config.AI_ENGINE_TYPE", "azure"):
+            result = analyze_card_image(b"fake-image-data", "test.png")
+
+        assert result == {
+            "name": "佐藤 花子", "company": "テスト株式会社", "department": "営業部", "title": "課長",
+            "url": "", "email": "sato@test.example.com", "phone": "090-9876-5432",
+        }
+        mock_openai_client.assert_not_called()
@@ -0,0 +1,63 @@
+from services.card_text_parser import extract_card_fields, merge_fields, normalize_line, resolve_fields
+
+
+def test_extract_typical_card():
+    """住所・FAX・英語表記を含む一般的な名刺をすべてローカルで解釈できるか"""
+    lines = [
+        "株式会社ＡＢＣ商事", "ABC Shoji Co., Ltd.", "営業本部 第一営業部 課長", "山田 一郎", "Ichiro Yamada",
+        "〒100-0001 東京都千代田区千代田1-1-1", "TEL:03－1234－5678 FAX:03-1234-5679",
+        "yamada@abc.co.jp", "https://www.abc.co.jp",
+    ]
+    fields, leftover = extract_card_fields(lines)
+    assert fields == {
+        "name": "山田 一郎", "company": "株式会社ABC商事", "department": "営業本部 第一営業部", "title": "課長",
+        "url": "https://www.abc.co.jp", "email": "yamada@abc.co.jp", "phone": "03-1234-5678",
+    }
+    assert leftover == []
+
+
+def test_fax_is_not_phone():
+    """FAX の番号を電話番号にせず、携帯の番号を使うか"""
+    fields, _ = extract_card_fields(["FAX 03-1111-2222", "携帯 090-3333-4444"])
+    assert fields["phone"] == "090-3333-4444"
+
+
+def test_resolve_asks_only_for_unresolved_fields():
+    """解釈できない行があれば未判定の項目を、なければ必須項目だけを AI に問い合わせるか"""
+    fields, unresolved = resolve_fields(["謎のロゴ", "山田 一郎", "yamada@x.jp"])
+    assert fields == {"name": "山田 一郎", "email": "yamada@x.jp"}
+    assert unresolved == ["name", "company", "department", "title", "url", "phone"]
+
+    _, unresolved = resolve_fields(["テスト株式会社", "佐藤 花子"])
+    assert unresolved == ["email"]
+
+
+def test_surname_ending_in_department_suffix():
+    """阿部・服部などの姓を部署と取り違えないか"""
+    fields, unresolved = resolve_fields(["テスト株式会社", "代表取締役", "阿部 太郎", "TEL 03-1234-5678", "abe@test.jp"])
+    assert fields["name"] == "阿部 太郎"
+    assert fields["title"] == "代表取締役"
+    assert "department" not in fields
+    assert unresolved == []
+
+    fields, _ = resolve_fields(["営業部 課長 服部 花子"])
+    assert (fields["department"], fields["title"], fields["name"]) == ("営業部", "課長", "服部 花子")
+
+
+def test_unspaced_name_defers_inferred_fields_to_llm():
+    """氏名が解釈できない行に残る場合は、推定した氏名・部署・役職より AI の値を優先するか"""
+    fields, unresolved = resolve_fields(["テスト株式会社", "山田太郎", "技術 顧問", "yamada@test.jp"])
+    assert "name" in unresolved and "title" in unresolved
+    assert "email" not in unresolved and "company" not in unresolved
+
+    extracted = {"name": "山田 太郎", "title": "技術顧問", "email": "wrong@example.com"}
+    merged = merge_fields(fields, extracted, unresolved)
+    assert merged["name"] == "山田 太郎"
+    assert merged["title"] == "技術顧問"
+    assert merged["email"] == "yamada@test.jp"
+    assert merged["url"] == ""
+
+
+def test_normalize_line():
+    """全角の英数字・空白・長音を半角とハイフンに揃えるか"""
+    assert normalize_line("ＴＥＬ　０３ー１２３４ー５６７８") == "TEL 03-1234-5678"
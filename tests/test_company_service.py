@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from extensions import db
+from models import CompanyProfile
+from services.company_service import build_summary, get_company_info_batch, get_company_profiles
+from services.web_service import extract_profile
+
+
+def test_extract_profile_and_build_summary():
+    """title・meta description・OpenGraph を取り出し、重複を除いた短い要約になるか"""
+    html = """
+    <html><head><title>テスト株式会社 | 公式サイト</title>
+    <meta name="description" content="テスト株式会社は名刺管理サービスを提供しています。">
+    <meta property="og:site_name" content="テスト株式会社">
+    <meta property="og:description" content="テスト株式会社は名刺管理サービスを提供しています。">
+    </head><body><nav>メニュー</nav><p>名刺管理サービスを提供しています。</p><p>営業支援も行っています。</p></body></html>
+    """
+    profile = extract_profile(html)
+    assert profile["title"] == "テスト株式会社 | 公式サイト"
+    assert profile["og_site_name"] == "テスト株式会社"
+    assert "メニュー" not in profile["text"]
+
+    summary = build_summary(profile, max_chars=200)
+    assert summary == "テスト株式会社は名刺管理サービスを提供しています。 名刺管理サービスを提供しています。 営業支援も行っています。"
+    assert len(build_summary(profile, max_chars=30)) <= 30
+
+
+@patch("services.company_service.fetch_domains")
+def test_company_profiles_are_stored_and_reused(mock_fetch, app):
+    """同じドメインは保存済みの要約を再利用し、期限切れのものだけ取得し直すか"""
+    mock_fetch.side_effect = lambda targets, fetch=None: {
+        domain: {"status": "ok", "title": "Example", "description": f"{domain} の事業概要です。", "text": ""}
+        for domain in targets
+    }
+    with app.app_context():
+        infos = get_company_info_batch(["https://www.example.co.jp/", "http://example.co.jp/about"])
+        assert infos["http://example.co.jp/about"] == "Example: example.co.jp の事業概要です。"
+        assert mock_fetch.call_count == 1
+        assert CompanyProfile.query.count() == 1
+
+        get_company_profiles(["example.co.jp", "https://other.com"])
+        assert mock_fetch.call_count == 2
+        assert set(mock_fetch.call_args.args[0]) == {"other.com"}
+
+        profile = CompanyProfile.query.filter_by(domain="example.co.jp").first()
+        profile.fetched_at = datetime.now() - timedelta(days=365)
+        db.session.commit()
+        get_company_profiles(["https://example.co.jp"])
+        assert set(mock_fetch.call_args.args[0]) == {"example.co.jp"}
+        assert CompanyProfile.query.count() == 2
+
+
+@patch("services.company_service.fetch_domains")
+def test_failed_refetch_keeps_existing_summary(mock_fetch, app):
+    """期限切れの取得し直しに失敗しても保存済みの要約を残し、再試行の間隔を空けるか"""
+    mock_fetch.return_value = {"example.co.jp": {"status": "ok", "title": "Example", "description": "事業概要です。", "text": ""}}
+    with app.app_context():
+        get_company_profiles(["https://example.co.jp"])
+        db.session.commit()
+        profile = CompanyProfile.query.filter_by(domain="example.co.jp").first()
+        profile.fetched_at = datetime.now() - timedelta(days=365)
+        db.session.commit()
+
+        mock_fetch.return_value = {"example.co.jp": {"status": "timeout"}}
+        profile = get_company_profiles(["https://example.co.jp"])["https://example.co.jp"]
+        assert profile.status == "ok"
+        assert profile.summary == "Example: 事業概要です。"
+
+        get_company_profiles(["https://example.co.jp"])
+        assert mock_fetch.call_count == 2
@@ -0,0 +1,92 @@
+import os
+import pytest
+from unittest.mock import patch
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from app import create_app
+from database import build_engine_options, dialect_insert, reset_sequences, upsert
+from extensions import db
+from models import SendCounter, User
+from tests.conftest import TestConfig
+
+
+def _file_config(db_path):
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(db_path)
+        SQLITE_BUSY_TIMEOUT_MS = 7000
+        SQLITE_POOL_SIZE = 3
+    return FileConfig
+
+
+def test_sqlite_pragmas_applied_on_file_db(tmp_path):
+    """ファイルDBでは接続ごとに WAL 等の PRAGMA が適用されるか"""
+    app = create_app(_file_config(tmp_path / "tuned.db"))
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 7000
+        assert db.engine.pool.size() == 3
+        db.engine.dispose()
+
+
+@pytest.mark.skipif(not TestConfig.SQLALCHEMY_DATABASE_URI.startswith("sqlite"), reason="SQLite only")
+def test_sqlite_memory_db_keeps_static_pool(app):
+    """インメモリDBではプール設定を上書きしないか"""
+    with app.app_context():
+        assert type(db.engine.pool).__name__ == "StaticPool"
+        with db.engine.connect() as conn:
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 15000
+
+
+def test_postgres_engine_options_use_pool_settings(app):
+    """PostgreSQL の場合はプール設定が適用されるか"""
+    class PgConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "postgresql://user:pw@localhost/wesales"
+        # TEST_DATABASE_URL が PostgreSQL の場合はアプリ作成時の設定が入っているため空にする
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        DB_POOL_SIZE = 4
+        DB_POOL_RECYCLE = 600
+
+    app.config.from_object(PgConfig)
+    options = build_engine_options(app)
+    assert options["pool_size"] == 4
+    assert options["pool_recycle"] == 600
+    assert options["pool_pre_ping"] is True
+
+
+def test_dialect_insert_compiles_on_conflict_for_postgres():
+    """PostgreSQL 向けに ON CONFLICT 句付きの INSERT が生成されるか"""
+    table = SendCounter.__table__
+    stmt = dialect_insert(table, postgresql.dialect()).values(user_id=1, period="2026-01", sent_count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.period],
+        set_={"sent_count": table.c.sent_count + 1},
+    )
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (user_id, period) DO UPDATE" in sql
+
+
+def test_upsert_falls_back_to_update_then_insert(app):
+    """ON CONFLICT 非対応の方言では UPDATE・INSERT で同じ結果になるか"""
+    table = SendCounter.__table__
+    key = [table.c.user_id, table.c.period]
+    with patch("database.UPSERT_DIALECTS", ()):
+        for _ in range(2):
+            upsert(db.session.connection(), table, {"user_id": 1, "period": "2026-01", "sent_count": 1}, key,
+                   {"sent_count": table.c.sent_count + 1})
+    assert db.session.query(SendCounter.sent_count).filter_by(user_id=1, period="2026-01").scalar() == 2
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL", "").startswith("postgresql"),
+    reason="TEST_DATABASE_URL に PostgreSQL を指定した場合のみ実行",
+)
+def test_reset_sequences_after_explicit_ids(app):
+    """ID を指定して INSERT した後も、通常の INSERT が重複せずに採番されるか（PostgreSQL）"""
+    db.session.execute(User.__table__.insert(), [{"id": 1000, "username": "bulk1000", "password": "x"}])
+    reset_sequences(User.__table__, db.session.connection())
+    user = User(username="after-bulk", password="x")
+    db.session.add(user)
+    db.session.commit()
+    assert user.id == 1001
@@ -0,0 +1,76 @@
+from extensions import db
+from models import Card, ContactKey, User
+from services.csv_service import process_csv_import
+from services.dedup_service import (
+    compute_keys, find_duplicate_candidates, find_duplicate_groups,
+    merge_cards, normalize_phone, rebuild_contact_keys,
+)
+
+
+def test_compute_keys_normalizes_fields():
+    """NFKC・大文字小文字・電話番号の表記ゆれを吸収したキーになるか"""
+    a = Card(email="Yamada@Example.COM", phone_number="03-1234-5678",
+             last_name="山田", first_name="太郎", company_name="株式会社テスト")
+    b = Card(email="ｙａｍａｄａ@example.com ", phone_number="+81 3 1234 5678",
+             last_name="山田　", first_name="太郎", company_name="テスト（株）")
+    assert compute_keys(a) == compute_keys(b)
+    assert normalize_phone("０９０‐１２３４‐５６７８") == "09012345678"
+
+
+def test_duplicate_detection_and_merge(app):
+    """重複候補の検出と統合ができるか"""
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        first = Card(user_id=user.id, email="sato@example.com", person_name="佐藤 花子", company_name="テスト株式会社")
+        second = Card(user_id=user.id, email="SATO@example.com", person_name="佐藤 花子",
+                      company_name="テスト株式会社", phone_number="03-0000-1111", url="https://example.com")
+        third = Card(user_id=user.id, phone_number="03 0000 1111", company_name="別名義")
+        unrelated = Card(user_id=user.id, email="other@example.com", person_name="鈴木 一郎")
+        db.session.add_all([first, second, third, unrelated])
+        db.session.commit()
+
+        assert [c.id for c in find_duplicate_candidates(first)] == [second.id]
+        groups = find_duplicate_groups(user.id)
+        assert groups == [{"card_ids": [first.id, second.id, third.id],
+                           "reasons": ["email", "name_company", "phone"]}]
+
+        removed_ids = [second.id, third.id]
+        primary, _ = merge_cards(first.id, removed_ids, user_id=user.id)
+        db.session.commit()
+        assert normalize_phone(primary.phone_number) == "0300001111"
+        assert primary.url == "https://example.com"
+        assert Card.query.filter_by(user_id=user.id).count() == 2
+        assert find_duplicate_groups(user.id) == []
+        assert ContactKey.query.filter(ContactKey.card_id.in_(removed_ids)).count() == 0
+
+
+def test_merge_api_rejects_other_users_cards(auth_client, app):
+    """他ユーザーの名刺は統合できないか"""
+    with app.app_context():
+        admin = User.query.filter_by(username="admin").first()
+        a = Card(user_id=admin.id, email="x@example.com")
+        b = Card(user_id=admin.id, email="x@example.com")
+        db.session.add_all([a, b])
+        db.session.commit()
+        ids = (a.id, b.id)
+
+    response = auth_client.post("/api/cards/merge", json={"merges": [{"primary_id": ids[0], "duplicate_ids": [ids[1]]}]})
+    assert response.get_json()["merged_count"] == 0
+    with app.app_context():
+        assert Card.query.filter(Card.id.in_(ids)).count() == 2
+
+
+def test_csv_import_matches_email_case_insensitively(app):
+    """CSV取込で大文字小文字違いのメールアドレスを既存名刺として更新するか"""
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        db.session.add(Card(user_id=user.id, email="Case@Example.com", company_name="旧社名"))
+        db.session.commit()
+        ContactKey.query.delete()
+        db.session.commit()
+        assert rebuild_contact_keys(user.id) == 1
+
+        csv_content = "姓,名,会社名,e-mail\n山田,太郎,新社名,case@example.com\n".encode("utf-8-sig")
+        success, updated = process_csv_import(csv_content, user.id)
+        assert (success, updated) == (0, 1)
+        assert Card.query.filter_by(user_id=user.id).one().company_name == "新社名"
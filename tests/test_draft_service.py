@@ -0,0 +1,54 @@
+import json
+from unittest.mock import patch
+from models import Card, User
+from services.draft_service import generate_email_drafts, split_batch_response
+
+
+def _cards():
+    return [Card(id=i, person_name=f"担当 {i}", company_name=f"会社{i}", email=f"p{i}@example.com") for i in (1, 2, 3)]
+
+
+def test_split_batch_response_validates_items():
+    """対象外・重複・空の項目を除いて分割できるか"""
+    result = json.dumps({"emails": [
+        {"card_id": 1, "subject": "件名1", "body": "本文1"},
+        {"card_id": "2", "subject": "件名2", "body": "本文2"},
+        {"card_id": 2, "subject": "重複", "body": "重複"},
+        {"card_id": 3, "subject": "", "body": "本文3"},
+        {"card_id": 99, "subject": "対象外", "body": "対象外"},
+    ]})
+    drafts = split_batch_response(result, [1, 2, 3])
+    assert drafts == {1: {"subject": "件名1", "body": "本文1"}, 2: {"subject": "件名2", "body": "本文2"}}
+    assert split_batch_response("not json", [1]) == {}
+
+
+@patch("services.draft_service.get_ai_completion")
+def test_generate_email_drafts_retries_only_failed_items(mock_ai):
+    """まとめて1回生成し、応答に欠けた名刺だけを個別に生成し直すか"""
+    mock_ai.side_effect = [
+        {"emails": [{"card_id": 1, "subject": "件名1", "body": "本文1"},
+                    {"card_id": 3, "subject": "件名3", "body": "本文3"}]},
+        json.dumps({"subject": "件名2", "body": "本文2"}),
+    ]
+    user = User(username="sender", company_name="差出人株式会社")
+
+    drafts = generate_email_drafts(user, _cards(), batch_size=5)
+
+    assert mock_ai.call_count == 2
+    batch_prompt = mock_ai.call_args_list[0].args[0]
+    assert batch_prompt.count("差出人株式会社") == 1
+    assert "card_id: 3" in batch_prompt
+    assert "会社2" in mock_ai.call_args_list[1].args[0]
+    assert drafts[2] == {"subject": "件名2", "body": "本文2"}
+    assert set(drafts) == {1, 2, 3}
+
+
+@patch("services.draft_service.get_ai_completion")
+def test_generate_email_drafts_falls_back_when_batch_fails(mock_ai):
+    """一括生成が失敗した場合は1件ずつ生成するか"""
+    mock_ai.side_effect = [Exception("timeout")] + [{"subject": "件名", "body": "本文"}] * 3
+
+    drafts = generate_email_drafts(User(username="sender"), _cards(), batch_size=5)
+
+    assert mock_ai.call_count == 4
+    assert all(drafts[i] == {"subject": "件名", "body": "本文"} for i in (1, 2, 3))
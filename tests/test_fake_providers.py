@@ -0,0 +1,58 @@
+import io
+from unittest.mock import patch
+import pytest
+from extensions import db
+from models import Card, History, User
+from services.fake_providers import FakeBehavior, FakeProviderError, reset_behaviors
+
+
+@pytest.fixture
+def fake_mode():
+    """遅延なしの代替プロバイダで外部サービスを使わずに実行する"""
+    reset_behaviors()
+    with patch("config.Config.FAKE_PROVIDERS", True), \
+            patch("config.Config.FAKE_LATENCY_MS", 0), \
+            patch("config.Config.FAKE_VISION_LATENCY_MS", 0), \
+            patch("config.Config.FAKE_MAIL_LATENCY_MS", 0), \
+            patch("config.Config.BULK_SEND_INTERVAL", 0):
+        yield
+    reset_behaviors()
+
+
+def test_fake_behavior_injects_errors_and_rate_limits():
+    """エラー率と秒間上限に応じて 429 / 503 が発生するか"""
+    always_429 = FakeBehavior(latency_ms=0, rate_limit_rate=1.0, seed=1)
+    with pytest.raises(FakeProviderError, match="429"):
+        always_429.before_call("azure")
+
+    throttled = FakeBehavior(latency_ms=0, max_rps=2)
+    throttled.before_call("mail")
+    throttled.before_call("mail")
+    with pytest.raises(FakeProviderError, match="429"):
+        throttled.before_call("mail")
+
+
+def test_upload_and_bulk_send_with_fake_providers(fake_mode, auth_client, app, tmp_path):
+    """代替プロバイダで /upload と一括送信が実際のルートを通して動くか"""
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    response = auth_client.post(
+        "/upload", data={"image": (io.BytesIO(b"fake-image-data"), "card.jpg")}, content_type="multipart/form-data"
+    )
+    assert response.status_code == 200
+    card_id = response.get_json()["card_id"]
+
+    with app.app_context():
+        card = db.session.get(Card, card_id)
+        assert card.company_name == "ロードテスト株式会社"
+        user = User.query.filter_by(username="testuser").first()
+        others = [Card(user_id=user.id, person_name=f"相手 {i}", email=f"fake{i}@example.com") for i in range(3)]
+        db.session.add_all(others)
+        db.session.commit()
+        ids = [card_id] + [c.id for c in others]
+
+    with patch("services.company_service.fetch_domains", return_value={}):
+        response = auth_client.post("/api/bulk_send_emails", json={"ids": ids})
+    assert response.get_json()["success_count"] == 4
+
+    with app.app_context():
+        assert History.query.filter(History.email.like("fake%@example.com")).count() == 3
@@ -0,0 +1,83 @@
+import io
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+import pytest
+from PIL import Image
+from services.image_preprocess import (
+    ImagePreprocessor, ImageProcessingTimeout, ImageQueueFull, guess_mime_type, normalize_card_image,
+)
+
+
+def _photo(orientation=None, size=(3000, 2000), card=(1600, 1000)):
+    """暗い机の上に置いた白い名刺の写真（orientation は EXIF の向き）"""
+    image = Image.new("RGB", size, (40, 45, 50))
+    left, top = (size[0] - card[0]) // 2, (size[1] - card[1]) // 2
+    image.paste((245, 245, 240), (left, top, left + card[0], top + card[1]))
+    image.paste((20, 20, 20), (left + 100, top + 100, left + 900, top + 200))  # 文字の代わり
+    output = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(output, format="JPEG", quality=90, exif=exif)
+    return output.getvalue()
+
+
+def test_normalize_rotates_crops_and_downscales():
+    """EXIF の向きを補正し、名刺部分をグレースケールで切り抜いて縮小するか"""
+    result = Image.open(io.BytesIO(normalize_card_image(_photo(orientation=6), max_size=800)))
+    assert result.format == "JPEG" and result.mode == "L"
+    # 横長の名刺が 90 度回転して保存されているため、補正後は縦長になる
+    assert result.height > result.width
+    assert max(result.size) <= 800
+    # 切り抜き後は背景（暗い部分）がほとんど残らない
+    assert result.height / result.width == pytest.approx(1600 / 1000, rel=0.1)
+
+
+def test_normalize_keeps_frame_without_background():
+    """名刺が画面いっぱいの場合は切り抜かないか"""
+    result = Image.open(io.BytesIO(normalize_card_image(_photo(size=(1000, 600), card=(1000, 600)), max_size=2000)))
+    assert result.size == (1000, 600)
+
+
+def test_preprocessor_process_pool():
+    """プロセスプールでもスレッド内と同じ結果になるか"""
+    photo = _photo(orientation=3)
+    preprocessor = ImagePreprocessor(workers=1, max_size=600)
+    try:
+        assert preprocessor.normalize(photo) == normalize_card_image(photo, max_size=600)
+    finally:
+        preprocessor.shutdown()
+
+
+def test_preprocessor_queue_full():
+    """待ち数が上限のときは待った後に ImageQueueFull になるか"""
+    preprocessor = ImagePreprocessor(workers=1, max_pending=1, wait_timeout=0.01)
+    preprocessor._slots.acquire()
+    with pytest.raises(ImageQueueFull):
+        preprocessor.normalize(_photo())
+
+
+def test_preprocessor_task_timeout_keeps_slot():
+    """ワーカーが応答しない場合は待ち続けずに ImageProcessingTimeout になり、処理が終わるまで空きを戻さないか"""
+    preprocessor = ImagePreprocessor(workers=1, max_pending=1, wait_timeout=0.01, task_timeout=0.01)
+    pool = MagicMock()
+    future = Future()
+    pool.submit.return_value = future
+    with patch.object(preprocessor, "_pool", return_value=pool):
+        with pytest.raises(ImageProcessingTimeout):
+            preprocessor.normalize(_photo())
+        # 時間切れの処理がまだ動いているため、次の画像は待ちあふれになる
+        with pytest.raises(ImageQueueFull) as excinfo:
+            preprocessor.normalize(_photo())
+        assert type(excinfo.value) is ImageQueueFull
+        assert pool.submit.call_count == 1
+
+    future.set_result(b"")
+    assert preprocessor._slots.acquire(blocking=False)
+
+
+def test_guess_mime_type():
+    """先頭バイトから形式を判定し、判定できなければ拡張子を使うか"""
+    assert guess_mime_type(_photo(), "card.png") == "image/jpeg"
+    assert guess_mime_type(b"\x89PNG\r\n\x1a\n....", "card.jpg") == "image/png"
+    assert guess_mime_type(b"unknown", "card.webp") == "image/webp"
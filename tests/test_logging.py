@@ -0,0 +1,45 @@
+import json
+import logging
+import queue
+from logging_config import JsonFormatter, RequestContextFilter, _QueueHandler, parse_levels
+
+
+def test_parse_levels():
+    """モジュールごとのレベル指定を解釈できるか"""
+    assert parse_levels("services.csv_service=debug, sqlalchemy.engine=WARNING,invalid") == {
+        "services.csv_service": "DEBUG",
+        "sqlalchemy.engine": "WARNING",
+    }
+
+
+def test_request_id_header(client):
+    """リクエスト ID が発行され、X-Request-ID を指定した場合は引き継がれるか"""
+    assert len(client.get("/login").headers["X-Request-ID"]) == 32
+    response = client.get("/login", headers={"X-Request-ID": "abc-123 <script>"})
+    assert response.headers["X-Request-ID"] == "abc-123script"
+
+
+def test_queued_record_is_json_with_request_id(app):
+    """キュー経由のログがリクエスト ID・追加項目・例外付きの JSON になるか"""
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    logger = logging.getLogger("tests.structured")
+    logger.addHandler(handler)
+    try:
+        with app.test_request_context("/cards", headers={"X-Request-ID": "req-1"}):
+            app.preprocess_request()
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Failed for card %s", 42, extra={"card_id": 42})
+    finally:
+        logger.removeHandler(handler)
+
+    data = json.loads(JsonFormatter().format(log_queue.get_nowait()))
+    assert data["message"] == "Failed for card 42"
+    assert data["level"] == "ERROR"
+    assert data["request_id"] == "req-1"
+    assert data["path"] == "/cards"
+    assert data["card_id"] == 42
+    assert "ValueError: boom" in data["exc_info"]
@@ -8,7 +8,7 @@ from services.mail_service import (
     _send_via_gmail,
     _send_via_resend
 )
-from models import User, History
+from models import User, History, SendCounter
 from extensions import db
 
 
@@ -36,6 +36,27 @@ class TestMailService:
             # カウントを確認
             count = get_monthly_sent_count(user.id)
             assert count == 3
+
+    def test_monthly_sent_counter_tracks_inserts_and_deletes(self, app):
+        """送信数カウンタが履歴の追加・削除に追随するか"""
+        with app.app_context():
+            user = User.query.filter_by(username="testuser").first()
+
+            histories = [History(user_id=user.id, email=f"c{i}@example.com") for i in range(2)]
+            db.session.add_all(histories)
+            db.session.commit()
+
+            counter = db.session.get(SendCounter, (user.id, date.today().strftime("%Y-%m")))
+            assert counter.sent_count == 2
+
+            db.session.add(History(user_id=user.id, email="c2@example.com"))
+            db.session.commit()
+            assert get_monthly_sent_count(user.id) == 3
+
+            db.session.delete(histories[0])
+            db.session.commit()
+            assert db.session.get(SendCounter, (user.id, date.today().strftime("%Y-%m"))) is None
+            assert get_monthly_sent_count(user.id) == 2
     
     @patch("services.mail_service.resend.Emails.list")
     def test_get_resend_metrics(self, mock_list):
@@ -0,0 +1,74 @@
+from unittest.mock import MagicMock, patch
+import pytest
+from metrics import MAIL_SENDS, Histogram, HistogramBuckets, Registry, track
+
+
+def test_histogram_percentile():
+    """パーセンタイルが区切りの上端で近似されるか"""
+    histogram = HistogramBuckets(buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.05, 0.3, 0.8):
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.percentile(50) == 0.1
+    assert histogram.percentile(95) == 1.0
+    histogram.observe(5.0)
+    assert histogram.percentile(100) == float("inf")
+
+
+def test_registry_renders_prometheus_text():
+    """カウンターとヒストグラムが Prometheus テキスト形式で出力されるか"""
+    registry = Registry()
+    calls = registry.counter("test_calls_total", "Calls.", ("provider", "outcome"))
+    latency = registry.histogram("test_seconds", "Latency.", ("provider",), buckets=(0.1, 1.0))
+
+    with track(calls, latency, provider="azure"):
+        pass
+    with pytest.raises(RuntimeError):
+        with track(calls, latency, classify=lambda e: "rate_limited", provider="azure"):
+            raise RuntimeError("429")
+
+    text = registry.render()
+    assert "# TYPE test_calls_total counter" in text
+    assert 'test_calls_total{provider="azure",outcome="success"} 1' in text
+    assert 'test_calls_total{provider="azure",outcome="rate_limited"} 1' in text
+    assert 'test_seconds_bucket{provider="azure",le="+Inf"} 2' in text
+    assert 'test_seconds_count{provider="azure"} 2' in text
+    assert registry.counter("test_calls_total", "Calls.", ("provider", "outcome")) is calls
+
+
+def test_labels_must_match():
+    """宣言と異なるラベルで記録するとエラーになるか"""
+    with pytest.raises(ValueError):
+        Histogram("test_seconds", "Latency.", ("provider",)).observe(1.0, engine="azure")
+
+
+@patch("services.mail_service._send_via_resend", return_value=("id", "ok"))
+def test_send_email_counted(mock_send, app):
+    """メール送信がプロバイダと結果ごとに数えられるか"""
+    from services.mail_service import send_email
+
+    user = MagicMock(email_provider="resend")
+    before = MAIL_SENDS.value(provider="resend", outcome="success")
+    send_email(user, {"to": "a@example.com", "subject": "s", "body": "b"})
+    assert MAIL_SENDS.value(provider="resend", outcome="success") == before + 1
+
+
+def test_metrics_endpoint_forbidden_for_users(auth_client):
+    """一般ユーザーは /metrics を参照できないか"""
+    assert auth_client.get("/metrics").status_code == 403
+
+
+def test_metrics_endpoint_admin(admin_client):
+    """管理者は /metrics を Prometheus テキスト形式で参照できるか"""
+    response = admin_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE wesales_ai_requests_total counter" in response.get_data(as_text=True)
+
+
+def test_metrics_endpoint_token(app, client):
+    """METRICS_TOKEN を指定すると Bearer 認証で収集できるか"""
+    app.config["METRICS_TOKEN"] = "scrape-token"
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).status_code == 200
@@ -0,0 +1,33 @@
+import logging
+
+
+def test_request_stats_recorded(app, admin_client):
+    """リクエストごとの所要時間と SQL 件数が集計され、Server-Timing が付くか"""
+    response = admin_client.get("/admin/users")
+    assert response.status_code == 200
+    assert "db;dur=" in response.headers["Server-Timing"]
+
+    stats = admin_client.get("/admin/api/request_stats").get_json()
+    entry = next(row for row in stats if row["endpoint"] == "admin.admin_users")
+    assert entry["requests"] == 1
+    assert entry["avg_queries"] >= 1
+
+
+def test_request_stats_admin_only(auth_client):
+    """一般ユーザーは集計を参照できないか"""
+    assert auth_client.get("/admin/api/request_stats").status_code == 403
+
+
+def test_query_heavy_request_logged(app, admin_client, caplog):
+    """SQL 件数・SQL の所要時間がしきい値を超えた場合に警告されるか"""
+    with caplog.at_level(logging.WARNING, logger="monitoring"):
+        admin_client.get("/admin/users")
+    assert not caplog.records
+
+    app.config["REQUEST_QUERY_WARN"] = 1
+    app.config["SLOW_QUERY_MS"] = 0
+    with caplog.at_level(logging.WARNING, logger="monitoring"):
+        admin_client.get("/admin/users")
+    messages = [r.getMessage() for r in caplog.records]
+    assert any(m.startswith("Query-heavy request GET /admin/users") for m in messages)
+    assert any(m.startswith("Slow query") and "SELECT" in m for m in messages)
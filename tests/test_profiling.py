@@ -0,0 +1,62 @@
+import os
+from unittest.mock import patch
+import pytest
+
+
+@pytest.fixture
+def profile_dir(app, tmp_path):
+    app.extensions["profile_dir"] = str(tmp_path)
+    return tmp_path
+
+
+def test_admin_can_profile_request(admin_client, profile_dir):
+    """管理者が ?_profile=1 を付けたリクエストが保存され、ダッシュボードから取得できるか"""
+    response = admin_client.get("/admin/users?_profile=1")
+    assert response.status_code == 200
+    name = response.headers["X-Profile-Id"]
+    assert name.endswith(".pstats") and "admin.admin_users" in name
+    assert os.listdir(profile_dir) == [name]
+
+    dashboard = admin_client.get("/admin/dashboard")
+    assert name.encode() in dashboard.data
+
+    report = admin_client.get(f"/admin/profiles/{name}?format=text")
+    assert report.status_code == 200
+    assert b"function calls" in report.data
+    download = admin_client.get(f"/admin/profiles/{name}")
+    assert download.status_code == 200
+    assert download.headers["Content-Disposition"].startswith("attachment")
+
+
+def test_profile_flag_ignored_for_users(auth_client, profile_dir):
+    """一般ユーザーのフラグでは計測せず、プロファイルも取得できないか"""
+    response = auth_client.get("/cards", headers={"X-Profile": "1"})
+    assert "X-Profile-Id" not in response.headers
+    assert os.listdir(profile_dir) == []
+    assert auth_client.get("/admin/profiles/x.pstats").status_code == 403
+
+
+def test_sampling_and_retention(app, client, profile_dir):
+    """PROFILE_SAMPLE_RATE で計測され、PROFILE_KEEP を超えた古いものが削除されるか"""
+    app.config["PROFILE_SAMPLE_RATE"] = 1.0
+    app.config["PROFILE_KEEP"] = 2
+    for _ in range(3):
+        assert "_sampled_" in client.get("/login").headers["X-Profile-Id"]
+    assert len(os.listdir(profile_dir)) == 2
+
+
+def test_profiler_conflict_does_not_fail_request(app, client, profile_dir):
+    """別のプロファイラと競合して計測を開始できなくても、リクエストは成功するか"""
+    app.config["PROFILE_SAMPLE_RATE"] = 1.0
+    with patch("profiling.cProfile.Profile.enable", side_effect=ValueError("Another profiling tool is already active")):
+        response = client.get("/login")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    # ロックは解放され、次のリクエストは計測される
+    assert "X-Profile-Id" in client.get("/login").headers
+
+
+def test_invalid_profile_name(admin_client, profile_dir):
+    """不正なファイル名は 404 になるか"""
+    assert admin_client.get("/admin/profiles/..%2Fconfig.py").status_code == 404
+    assert admin_client.get("/admin/profiles/missing.pstats").status_code == 404
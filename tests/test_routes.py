@@ -3,7 +3,8 @@ import io
 import json
 from unittest.mock import patch
 from extensions import db
-from models import Card, User
+from models import Card, User, History
+from services.mail_service import get_monthly_sent_count
 
 def test_login_page(client):
     """ログイン画面が表示されるか"""
@@ -82,6 +83,63 @@ def test_generate_email_mocked(mock_ai, mock_web, auth_client, app):
     assert "これはモックされたメール本文です。" in res_data["body"]
     assert res_data["subject"] == "テスト件名"
 
+@patch("routes.cards.get_company_info")
+@patch("routes.cards.stream_ai_completion")
+def test_generate_email_stream(mock_stream, mock_web, auth_client, app):
+    """メール下書きが件名・本文の差分イベントとして順に送られるか"""
+    mock_stream.return_value = iter(["件名: お礼", "のご連絡\n本", "文:\nこんにちは", "。"])
+    mock_web.return_value = "モックされた企業情報"
+
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        card = Card(user_id=user.id, person_name="送信先様", email="stream@example.com")
+        db.session.add(card)
+        db.session.commit()
+        card_id = card.id
+
+    response = auth_client.get(f"/api/generate_initial_email/{card_id}/stream")
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = [
+        (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+        for block in response.get_data(as_text=True).split("\n\n") if block.startswith("event:")
+    ]
+    assert [e for e, _ in events] == ["subject", "subject", "body", "body", "done"]
+    assert events[-1][1] == {"subject": "お礼のご連絡", "body": "こんにちは。"}
+
+
+@patch("services.rewrite_service.get_ai_completion")
+def test_rewrite_uses_light_model_and_cache(mock_ai, auth_client):
+    """書き換えは軽量モデルの指定で行い、同じ下書き・指示はキャッシュから返すか"""
+    mock_ai.return_value = json.dumps({"subject": "短い件名", "body": "短くした本文"})
+    payload = {"instruction": "短めに", "current_subject": "件名", "current_body": "長い本文です。",
+               "customer_info": {"name": "山田 太郎", "company": "テスト株式会社"}}
+
+    with patch("services.ai_service.Config.AI_ENGINE_TYPE", "gemini"):
+        first = auth_client.post("/rewrite", json=payload)
+        second = auth_client.post("/rewrite", json=payload)
+        auth_client.post("/rewrite", json={**payload, "instruction": "丁寧に"})
+
+    assert first.get_json() == {"subject": "短い件名", "body": "短くした本文"}
+    assert second.get_json() == first.get_json()
+    assert mock_ai.call_count == 2
+    assert mock_ai.call_args.kwargs["tier"] == "rewrite"
+    assert auth_client.post("/rewrite", json={"instruction": "短めに"}).status_code == 400
+
+
+@patch("services.rewrite_service.stream_ai_completion")
+def test_rewrite_stream(mock_stream, auth_client):
+    """stream 指定時は書き換え結果が Server-Sent Events で返るか"""
+    mock_stream.return_value = iter(["件名: 新しい件名\n本文:\n", "新しい本文"])
+    payload = {"instruction": "情熱的に", "current_body": "本文", "stream": True}
+
+    response = auth_client.post("/rewrite", json=payload)
+    text = response.get_data(as_text=True)
+    assert response.mimetype == "text/event-stream"
+    assert "event: body" in text
+    assert 'event: done\ndata: {"subject": "新しい件名", "body": "新しい本文"}' in text
+
+
 def test_edit_card_page(auth_client, app):
     """名刺編集画面が表示されるか"""
     with app.app_context():
@@ -96,3 +154,84 @@ def test_edit_card_page(auth_client, app):
     assert response.status_code == 200
     assert "名刺編集".encode("utf-8") in response.data
     assert "編集テスト株式会社".encode("utf-8") in response.data
+
+def test_bulk_delete_cards_only_own(auth_client, app):
+    """一括削除で自分の名刺のみが削除されるか"""
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        admin = User.query.filter_by(username="admin").first()
+        own = [Card(user_id=user.id, company_name=f"自社{i}") for i in range(3)]
+        other = Card(user_id=admin.id, company_name="他人の名刺")
+        db.session.add_all(own + [other])
+        db.session.commit()
+        ids = [c.id for c in own] + [other.id]
+        other_id = other.id
+
+    response = auth_client.post("/cards/delete", json={"ids": ids})
+    assert response.status_code == 200
+    assert "3件" in response.get_json()["message"]
+
+    with app.app_context():
+        assert Card.query.filter(Card.id.in_(ids)).count() == 1
+        assert db.session.get(Card, other_id) is not None
+
+
+def test_bulk_delete_history_resets_sent_count(auth_client, app):
+    """履歴の一括削除後に今月の送信数が再集計されるか"""
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        histories = [History(user_id=user.id, email=f"h{i}@example.com") for i in range(3)]
+        db.session.add_all(histories)
+        db.session.commit()
+        ids = [h.id for h in histories[:2]]
+        user_id = user.id
+
+    response = auth_client.post("/history/delete", json={"ids": ids})
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert get_monthly_sent_count(user_id) == 1
+
+
+@patch("routes.cards.time.sleep")
+@patch("routes.cards.send_email")
+@patch("routes.cards.get_company_info_batch")
+@patch("services.draft_service.get_ai_completion")
+def test_bulk_send_generates_drafts_in_one_request(mock_ai, mock_web, mock_send, mock_sleep, auth_client, app):
+    """一括送信で複数の相手のメールが1回のAIリクエストで生成されるか"""
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        cards = [Card(user_id=user.id, person_name=f"相手 {i}", email=f"to{i}@example.com") for i in range(2)]
+        db.session.add_all(cards)
+        db.session.commit()
+        ids = [c.id for c in cards]
+    mock_web.return_value = {}
+    mock_send.return_value = ("id", "ok")
+    mock_ai.return_value = {"emails": [{"card_id": i, "subject": f"件名{i}", "body": "本文"} for i in ids]}
+
+    response = auth_client.post("/api/bulk_send_emails", json={"ids": ids})
+    assert response.get_json()["success_count"] == 2
+    assert mock_ai.call_count == 1
+    assert mock_send.call_count == 2
+
+    with app.app_context():
+        assert History.query.filter(History.mail_subject == f"件名{ids[1]}").count() == 1
+
+
+def test_image_sweeper_removes_only_unreferenced_files(app, tmp_path):
+    """参照されなくなった画像のみ削除されるか"""
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    for name in ["gone.jpg", "kept.jpg"]:
+        (tmp_path / name).write_bytes(b"x")
+
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        db.session.add(Card(user_id=user.id, image_path="kept.jpg"))
+        db.session.commit()
+
+    sweeper = app.extensions["image_sweeper"]
+    sweeper.enqueue(["gone.jpg", "kept.jpg", "no-image.png"])
+    sweeper.join()
+
+    assert not (tmp_path / "gone.jpg").exists()
+    assert (tmp_path / "kept.jpg").exists()
@@ -0,0 +1,56 @@
+from extensions import db
+from models import Card, User
+from services.search_service import search_cards
+
+
+def _add_cards(app):
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        admin = User.query.filter_by(username="admin").first()
+        db.session.add_all([
+            Card(user_id=user.id, company_name="株式会社サンプル商事", person_name="山田 太郎", email="yamada@sample.co.jp"),
+            Card(user_id=user.id, company_name="テスト工業株式会社", person_name="佐藤 花子", email="sato@test.example.com"),
+            Card(user_id=admin.id, company_name="株式会社サンプル物産", person_name="鈴木 一郎"),
+        ])
+        db.session.commit()
+        return user.id
+
+
+def test_search_cards_fulltext(app):
+    """3文字以上の語は全文検索で部分一致するか"""
+    user_id = _add_cards(app)
+    with app.app_context():
+        cards, total = search_cards("サンプル", user_id=user_id)
+        assert total == 1
+        assert cards[0].company_name == "株式会社サンプル商事"
+
+        cards, total = search_cards("サンプル")
+        assert total == 2
+
+
+def test_search_cards_short_terms_and_updates(app):
+    """2文字の語（氏名など）も検索でき、更新・削除が索引に反映されるか"""
+    user_id = _add_cards(app)
+    with app.app_context():
+        cards, total = search_cards("山田", user_id=user_id)
+        assert [c.person_name for c in cards] == ["山田 太郎"]
+
+        card = cards[0]
+        card.company_name = "新社名ホールディングス"
+        db.session.commit()
+        assert search_cards("サンプル商事", user_id=user_id)[1] == 0
+        assert search_cards("ホールディングス 山田", user_id=user_id)[1] == 1
+
+        db.session.delete(card)
+        db.session.commit()
+        assert search_cards("ホールディングス", user_id=user_id)[1] == 0
+
+
+def test_search_api_paginates_own_cards(auth_client, app):
+    """検索APIが自分の名刺のみをページング付きで返すか"""
+    _add_cards(app)
+    response = auth_client.get("/api/cards/search?q=株式会社&per_page=1")
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["total"] == 2
+    assert len(data["items"]) == 1
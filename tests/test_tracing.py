@@ -0,0 +1,72 @@
+import json
+from unittest.mock import patch
+import pytest
+import tracing
+from extensions import db
+from models import Card, User
+from tracing import FileTracer, span
+
+
+@pytest.fixture
+def spans(monkeypatch, tmp_path):
+    """span をテスト用のファイルに書き出し、書き出された span を返す関数を渡す"""
+    tracer = FileTracer(str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "_tracer", tracer)
+
+    def read():
+        tracer.flush()
+        path = tmp_path / "traces.jsonl"
+        if not path.exists():
+            return []
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    return read
+
+
+def test_nested_spans_and_errors(spans):
+    """入れ子の span が同じ trace に親子で記録され、例外が ERROR になるか"""
+    with span("outer", job="bulk"):
+        with pytest.raises(ValueError):
+            with span("inner"):
+                raise ValueError("boom")
+
+    inner, outer = spans()
+    assert outer["name"] == "outer" and outer["parent_span_id"] is None
+    assert outer["attributes"] == {"job": "bulk"}
+    assert inner["trace_id"] == outer["trace_id"]
+    assert inner["parent_span_id"] == outer["span_id"]
+    assert inner["status"] == "ERROR" and inner["error"] == "ValueError: boom"
+
+
+def test_span_is_noop_when_disabled(monkeypatch):
+    """トレース無効時も span が使えるか"""
+    monkeypatch.setattr(tracing, "_tracer", None)
+    with span("noop") as current:
+        current.set_attribute("key", "value")
+
+
+@patch("routes.cards.time.sleep")
+@patch("services.mail_service._send_via_resend", return_value=("id", "ok"))
+@patch("routes.cards.get_company_info_batch", return_value={})
+@patch("services.draft_service.get_ai_completion")
+def test_bulk_send_trace(mock_ai, mock_web, mock_send, mock_sleep, auth_client, app, spans):
+    """一括送信の各処理段階がリクエストの span の下に記録されるか"""
+    with app.app_context():
+        user = User.query.filter_by(username="testuser").first()
+        card = Card(user_id=user.id, person_name="相手", email="to@example.com")
+        db.session.add(card)
+        db.session.commit()
+        card_id = card.id
+    mock_ai.return_value = {"subject": "件名", "body": "本文"}
+
+    response = auth_client.post("/api/bulk_send_emails", json={"ids": [card_id]})
+    assert response.get_json()["success_count"] == 1
+
+    recorded = {s["name"]: s for s in spans()}
+    root = recorded["POST /api/bulk_send_emails"]
+    assert root["attributes"]["http.status_code"] == 200
+    assert root["attributes"]["request_id"] == response.headers["X-Request-ID"]
+    for name in ["bulk_send.load_cards", "bulk_send.company_info", "bulk_send.generate_drafts",
+                 "mail.send", "bulk_send.history_write"]:
+        assert recorded[name]["trace_id"] == root["trace_id"]
+        assert recorded[name]["parent_span_id"] == root["span_id"]
+    assert recorded["mail.send"]["attributes"] == {"provider": "resend"}
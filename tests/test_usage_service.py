@@ -0,0 +1,109 @@
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+from extensions import db
+from models import AIUsage, AIUsageMonthly, Card, User
+from services.draft_service import generate_email_drafts
+from services.usage_service import (
+    AIQuotaExceeded, UsageWriter, check_ai_quota, get_monthly_token_usage, get_usage_summary, record_tokens, track_usage, write_usage,
+)
+
+
+def _record(user_id, prompt_tokens=10, completion_tokens=5, success=True, cache_hit=False):
+    return {
+        "user_id": user_id, "operation": "completion", "provider": "azure", "model": "gpt",
+        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "latency_ms": 100,
+        "cache_hit": cache_hit, "success": success, "created_at": datetime.now(),
+    }
+
+
+def _user(name):
+    return User.query.filter_by(username=name).first()
+
+
+def test_write_usage_adds_to_monthly_rollup(app):
+    """同じユーザー・月・処理の記録が1行の集計に加算されるか"""
+    user = _user("testuser")
+    write_usage([_record(user.id), _record(user.id, success=False)])
+    write_usage([_record(user.id, prompt_tokens=0, completion_tokens=0, cache_hit=True)])
+
+    assert AIUsage.query.count() == 3
+    rollup = AIUsageMonthly.query.one()
+    assert (rollup.requests, rollup.failures, rollup.cache_hits) == (3, 1, 1)
+    assert get_monthly_token_usage(user.id) == 30
+
+    summary = get_usage_summary()
+    assert summary[0]["username"] == "testuser"
+    assert summary[0]["operations"] == {"completion": 3}
+    assert summary[0]["cache_hit_rate"] == 33.3
+    assert summary[0]["avg_latency_ms"] == 150
+
+
+def test_track_usage_records_tokens(app):
+    """プロバイダが記録したトークン数が書き込まれるか（リクエスト外はシステム扱い）"""
+    with track_usage("completion", "gemini"):
+        record_tokens(12, 8, model="gemini-2.0-flash")
+    app.extensions["ai_usage_writer"].flush()
+
+    usage = AIUsage.query.one()
+    assert (usage.user_id, usage.prompt_tokens, usage.completion_tokens) == (None, 12, 8)
+    assert usage.model == "gemini-2.0-flash" and usage.success
+    assert db.session.get(AIUsageMonthly, (0, usage.created_at.strftime("%Y-%m"), "completion")).requests == 1
+
+
+@patch("services.usage_service.atexit.register")
+def test_writer_flushes_at_exit(mock_register, app):
+    """終了時に書き込み待ちの記録を書き込むよう登録されるか"""
+    writer = UsageWriter(app, flush_interval=60)
+    writer.enqueue(_record(None))
+    writer.enqueue(_record(None))
+    mock_register.assert_called_once_with(writer.flush)
+
+    mock_register.call_args.args[0]()
+    assert AIUsage.query.count() == 2
+
+
+def test_quota_blocks_users_but_not_admins(app):
+    """月間上限を超えた一般ユーザーは拒否され、管理者は対象外か"""
+    user, admin = _user("testuser"), _user("admin")
+    write_usage([_record(user.id, prompt_tokens=60, completion_tokens=40), _record(admin.id, prompt_tokens=500)])
+
+    with patch("config.Config.AI_MONTHLY_TOKEN_LIMIT", 100):
+        with app.test_request_context(), patch("services.usage_service.current_user", user):
+            with pytest.raises(AIQuotaExceeded):
+                check_ai_quota()
+        with app.test_request_context(), patch("services.usage_service.current_user", admin):
+            check_ai_quota()
+
+
+def test_rewrite_returns_429_over_quota(auth_client, app):
+    """上限超過時に書き換えが 429 を返すか"""
+    write_usage([_record(_user("testuser").id, prompt_tokens=100)])
+    with patch("config.Config.AI_MONTHLY_TOKEN_LIMIT", 50):
+        response = auth_client.post("/rewrite", json={"current_subject": "件名", "current_body": "本文", "instruction": "丁寧に"})
+    assert response.status_code == 429
+    assert "上限" in response.get_json()["error"]
+
+
+def test_bulk_send_returns_429_over_quota(auth_client, app):
+    """上限超過時に一括送信が名刺ごとに生成を試みず 429 を返すか"""
+    user = _user("testuser")
+    db.session.add(Card(user_id=user.id, person_name="相手", email="partner@example.com"))
+    write_usage([_record(user.id, prompt_tokens=100)])
+    card_id = Card.query.one().id
+    with patch("config.Config.AI_MONTHLY_TOKEN_LIMIT", 50), \
+            patch("routes.cards.generate_email_drafts") as mock_generate:
+        response = auth_client.post("/api/bulk_send_emails", json={"ids": [card_id]})
+    assert response.status_code == 429
+    assert "上限" in response.get_json()["message"]
+    mock_generate.assert_not_called()
+
+
+@patch("services.draft_service.generate_email_draft")
+@patch("services.draft_service.get_ai_completion", side_effect=AIQuotaExceeded("上限"))
+def test_drafts_stop_at_quota(mock_completion, mock_draft, app):
+    """まとめて生成中に上限に達したら、1件ずつ生成し直さずに AIQuotaExceeded を返すか"""
+    cards = [Card(id=i, person_name=f"相手 {i}", email=f"p{i}@example.com") for i in range(1, 4)]
+    with pytest.raises(AIQuotaExceeded):
+        generate_email_drafts(_user("testuser"), cards, batch_size=3)
+    mock_draft.assert_not_called()
@@ -0,0 +1,87 @@
+from sqlalchemy import event
+from extensions import db
+from models import User
+from services.user_service import get_user_directory, load_user_cached
+
+
+def _capture_user_selects(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "FROM user" in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def test_load_user_cached_skips_query_on_hit(app):
+    """2回目以降はユーザー取得のSELECTが発行されないか"""
+    with app.app_context():
+        user_id = User.query.filter_by(username="testuser").first().id
+        db.session.remove()
+        load_user_cached(user_id)
+        db.session.remove()
+
+        statements = _capture_user_selects(app)
+        user = load_user_cached(user_id)
+
+        assert user.username == "testuser"
+        assert user in db.session
+        assert statements == []
+
+
+def test_user_update_invalidates_cache(app):
+    """ユーザー更新のコミット後はキャッシュが破棄され、新しい値が返るか"""
+    with app.app_context():
+        user_id = User.query.filter_by(username="testuser").first().id
+        db.session.remove()
+
+        user = load_user_cached(user_id)
+        user.company_name = "更新後株式会社"
+        db.session.commit()
+        db.session.remove()
+
+        assert app.extensions["user_cache"].get(user_id) is None
+        assert load_user_cached(user_id).company_name == "更新後株式会社"
+
+
+def test_cached_user_is_not_marked_dirty(app):
+    """キャッシュから取り込んだだけのユーザーは更新対象にならないか"""
+    with app.app_context():
+        user_id = User.query.filter_by(username="testuser").first().id
+        db.session.remove()
+        load_user_cached(user_id)
+        db.session.remove()
+
+        user = load_user_cached(user_id)
+        assert user not in db.session.dirty
+        db.session.commit()
+        assert app.extensions["user_cache"].get(user_id) is not None
+
+
+def test_user_directory_is_cached_and_refreshed_on_user_change(app):
+    """ユーザー一覧はキャッシュされ、ユーザー追加時に作り直されるか"""
+    with app.app_context():
+        first = get_user_directory()
+        assert {entry.username for entry in first} == {"testuser", "admin"}
+
+        statements = _capture_user_selects(app)
+        assert get_user_directory() is first
+        assert statements == []
+
+        db.session.add(User(username="newcomer", password="x", last_name="新規", first_name="花子"))
+        db.session.commit()
+
+        entries = {entry.username: entry for entry in get_user_directory()}
+        assert entries["newcomer"].display_name == "新規 花子"
+        assert entries["testuser"].display_name == "testuser"
+
+
+def test_admin_user_directory_endpoint(admin_client):
+    """管理者向けユーザー一覧APIが id / username / display_name を返すか"""
+    response = admin_client.get("/admin/api/users")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert {"id", "username", "display_name"} <= set(data[0].keys())
+    assert "password" not in data[0]
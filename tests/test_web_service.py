@@ -0,0 +1,75 @@
+import httpx
+from unittest.mock import patch
+from services.web_service import (
+    detect_encoding,
+    extract_text,
+    get_company_info_batch,
+    normalize_domain,
+)
+
+
+def test_normalize_domain():
+    """ドメインが小文字化・www. 除去・パス無視で揃えられるか"""
+    assert normalize_domain("https://WWW.Example.co.jp/about") == "example.co.jp"
+    assert normalize_domain("www.example.co.jp") == "example.co.jp"
+    assert normalize_domain("http://example.co.jp:8080") == "example.co.jp"
+    assert normalize_domain("") is None
+
+
+@patch("services.web_service.fetch_company_info")
+def test_get_company_info_batch_fetches_each_domain_once(mock_info):
+    """同じ会社のURLはドメインごとに1回だけ取得されるか"""
+    async def fake_fetch(url, client=None):
+        return f"info:{normalize_domain(url)}"
+    mock_info.side_effect = fake_fetch
+    urls = [
+        "https://www.example.co.jp/",
+        "http://example.co.jp/company",
+        "www.example.co.jp",
+        "https://other.com",
+    ]
+
+    results = get_company_info_batch(urls)
+
+    assert mock_info.call_count == 2
+    assert results["http://example.co.jp/company"] == "info:example.co.jp"
+    assert results["www.example.co.jp"] == "info:example.co.jp"
+    assert results["https://other.com"] == "info:other.com"
+
+
+def test_detect_encoding_prefers_header_then_meta():
+    """文字コードはヘッダ → meta タグの順に採用されるか"""
+    body = '<meta charset="Shift_JIS"><p>会社概要</p>'.encode("shift_jis")
+    assert detect_encoding(body, "text/html; charset=EUC-JP") == "euc_jp"
+    assert detect_encoding(body, "text/html") == "shift_jis"
+    assert detect_encoding("<p>会社概要</p>".encode("utf-8")) == "utf-8"
+
+
+def test_extract_text_skips_layout_and_stops_at_limit():
+    """script やナビゲーションを除き、上限文字数で打ち切られるか"""
+    html = "<nav>メニュー</nav><script>var x;</script>" + "<p>事業内容の説明です。</p>" * 500
+    text = extract_text(html, max_chars=100)
+    assert len(text) == 100
+    assert "メニュー" not in text and "var x" not in text
+    assert text.startswith("事業内容の説明です。")
+
+
+def test_get_company_info_batch_stops_reading_at_byte_limit(app):
+    """レスポンスは上限バイト数で読み込みを打ち切り、Shift_JIS のページも読めるか"""
+    served = {"chunks": 0}
+
+    async def stream():
+        head = '<html><head><meta charset="Shift_JIS"></head><body><p>弊社は名刺管理を提供しています。</p>'
+        yield head.encode("shift_jis")
+        for _ in range(1000):
+            served["chunks"] += 1
+            yield b"<p>" + b"x" * 1000 + b"</p>"
+
+    def handler(request):
+        return httpx.Response(200, headers={"Content-Type": "text/html"}, content=stream())
+
+    with patch("services.web_service.Config.WEB_FETCH_MAX_BYTES", 5000):
+        results = get_company_info_batch(["https://example.co.jp"], transport=httpx.MockTransport(handler))
+
+    assert results["https://example.co.jp"].startswith("弊社は名刺管理を提供しています。")
+    assert served["chunks"] < 10
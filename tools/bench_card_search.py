@@ -0,0 +1,115 @@
+"""
+名刺検索ベンチマーク: FTS5 (trigram) と LIKE '%...%' の比較
+
+一時ファイルの SQLite に指定件数の名刺を投入し、同じ検索語で
+FTS5 の MATCH 検索と全列 LIKE 検索の所要時間を比較する。
+
+使い方:
+    python tools/bench_card_search.py --rows 1000000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.search_service import FTS_DDL, SEARCH_COLUMNS
+
+LAST_NAMES = ["佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤"]
+FIRST_NAMES = ["太郎", "花子", "一郎", "美咲", "健太", "陽菜", "翔", "さくら", "大輔", "結衣"]
+COMPANY_WORDS = ["サンプル", "テクノ", "ネクスト", "グローバル", "未来", "創造", "日本", "東京", "フロンティア", "システム"]
+COMPANY_SUFFIX = ["商事", "工業", "物産", "ソリューションズ", "ホールディングス", "製作所"]
+DEPARTMENTS = ["営業部", "開発部", "総務部", "経営企画室", "マーケティング部"]
+TITLES = ["部長", "課長", "主任", "代表取締役", "担当"]
+
+# 選択性の高い語（メールの一部・会社名の組み合わせ）と広くヒットする語を混ぜる
+QUERIES = ["tanaka12345", "corp4321.example", "未来創造製作所", "サンプルテクノ", "ホールディングス"]
+
+
+def generate_rows(n, seed=42):
+    rnd = random.Random(seed)
+    for i in range(1, n + 1):
+        company = f"株式会社{rnd.choice(COMPANY_WORDS)}{rnd.choice(COMPANY_WORDS)}{rnd.choice(COMPANY_SUFFIX)}"
+        romaji = rnd.choice(["sato", "suzuki", "takahashi", "tanaka", "ito", "watanabe"])
+        yield (
+            i, 1, company, rnd.choice(DEPARTMENTS), rnd.choice(TITLES),
+            rnd.choice(LAST_NAMES), rnd.choice(FIRST_NAMES),
+            f"{romaji}{i}@corp{i % 5000}.example.com", f"https://corp{i % 5000}.example.com",
+        )
+
+
+def build_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(
+        "CREATE TABLE card (id INTEGER PRIMARY KEY, user_id INTEGER, "
+        + ", ".join(f"{c} TEXT" for c in SEARCH_COLUMNS) + ")"
+    )
+    for ddl in FTS_DDL:
+        conn.execute(ddl)
+    placeholders = ", ".join("?" for _ in range(len(SEARCH_COLUMNS) + 2))
+    started = time.perf_counter()
+    batch = []
+    for row in generate_rows(rows):
+        batch.append(row)
+        if len(batch) >= 10000:
+            conn.executemany(f"INSERT INTO card VALUES ({placeholders})", batch)
+            batch.clear()
+    if batch:
+        conn.executemany(f"INSERT INTO card VALUES ({placeholders})", batch)
+    conn.commit()
+    print(f"Inserted {rows} rows (with FTS sync) in {time.perf_counter() - started:.1f}s")
+    return conn
+
+
+def time_query(conn, sql, params, repeat):
+    best = None
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = len(conn.execute(sql, params).fetchall())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FTS5 vs LIKE card search benchmark")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="wesales-search-"), "search.db")
+    conn = build_database(path, args.rows)
+
+    like_where = " OR ".join(f"{c} LIKE ?" for c in SEARCH_COLUMNS)
+    # 検索APIと同様に「総件数」と「1ページ目」を取得する
+    like_sqls = [
+        f"SELECT count(*) FROM card WHERE ({like_where})",
+        f"SELECT id FROM card WHERE ({like_where}) ORDER BY id DESC LIMIT {args.limit}",
+    ]
+    fts_sqls = [
+        "SELECT count(*) FROM card_fts WHERE card_fts MATCH ?",
+        "SELECT card.id FROM card_fts JOIN card ON card.id = card_fts.rowid "
+        f"WHERE card_fts MATCH ? ORDER BY card_fts.rank LIMIT {args.limit}",
+    ]
+
+    print(f"{'query':20s} {'hits':>8s} {'LIKE ms':>10s} {'FTS5 ms':>10s} {'speedup':>8s}")
+    for q in QUERIES:
+        like_params = [f"%{q}%"] * len(SEARCH_COLUMNS)
+        like_time = sum(time_query(conn, sql, like_params, args.repeat)[0] for sql in like_sqls)
+        fts_time = sum(time_query(conn, sql, ['"' + q + '"'], args.repeat)[0] for sql in fts_sqls)
+        hits = conn.execute(fts_sqls[0], ['"' + q + '"']).fetchone()[0]
+        print(f"{q:20s} {hits:8d} {like_time * 1000:10.2f} {fts_time * 1000:10.2f} {like_time / fts_time:7.1f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+名刺画像の前処理ベンチマーク: 従来の縮小処理と正規化（draft 読み込み・切り抜き・グレースケール）の比較
+
+フォルダ内の画像（未指定時は 12 メガピクセルの合成写真）を処理し、方式ごとの所要時間と
+最大メモリ使用量（別プロセスで実行した VmHWM）を表示する。
+"pool" はプロセスプールに複数スレッドから同時に投入したときのスループット。
+
+使い方:
+    python tools/bench_image_preprocess.py --folder ~/card-photos --workers 4 --concurrency 8
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+
+from services.image_preprocess import ImagePreprocessor, normalize_card_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def legacy_resize(image_data, max_size=1200):
+    """変更前の ai_service の処理（全画素を読み込んで LANCZOS で縮小）"""
+    img = Image.open(io.BytesIO(image_data))
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        img.convert("RGB").save(output, format="JPEG", quality=85)
+        return output.getvalue()
+    return image_data
+
+
+def make_samples(folder, count):
+    """机の上の名刺を撮影した写真に近い 4032x3024 の JPEG を作る（EXIF で 90 度回転）"""
+    for i in range(count):
+        photo = Image.merge("RGB", [Image.effect_noise((4032, 3024), 30 + 5 * c).point(lambda v: v // 3) for c in range(3)])
+        card = Image.merge("RGB", [Image.effect_noise((2600, 1600), 20).point(lambda v: 180 + v // 4)] * 3)
+        photo.paste(card, (700 + i * 10, 700))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        photo.save(os.path.join(folder, f"sample{i}.jpg"), format="JPEG", quality=90, exif=exif)
+
+
+def load_images(folder):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(folder, name), "rb") as f:
+                images.append(f.read())
+    return images
+
+
+def peak_rss_kb():
+    """このプロセスの最大常駐メモリ（KB、Linux のみ。exec 前の親プロセス分は含まない）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def run_mode(mode, folder, workers, concurrency, max_size, result_queue):
+    images = load_images(folder)
+    started = time.perf_counter()
+    output_bytes = 0
+    if mode == "legacy":
+        for data in images:
+            output_bytes += len(legacy_resize(data, max_size))
+    elif mode == "normalize":
+        for data in images:
+            output_bytes += len(normalize_card_image(data, max_size=max_size))
+    else:
+        preprocessor = ImagePreprocessor(workers=workers, max_pending=concurrency, max_size=max_size)
+        # プロセスの起動時間は含めない
+        preprocessor.normalize(images[0])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            output_bytes = sum(len(r) for r in pool.map(preprocessor.normalize, images))
+        preprocessor.shutdown()
+    elapsed = time.perf_counter() - started
+    # プロセスプールのワーカー分は含まない
+    result_queue.put((mode, len(images), elapsed, output_bytes, peak_rss_kb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark card image preprocessing")
+    parser.add_argument("--folder", help="画像のフォルダ（未指定時は合成写真を作る）")
+    parser.add_argument("--samples", type=int, default=8, help="合成写真の枚数")
+    parser.add_argument("--workers", type=int, default=2, help="プロセスプールのワーカー数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時に投入するリクエスト数")
+    parser.add_argument("--max-size", type=int, default=1200)
+    args = parser.parse_args()
+
+    folder = args.folder
+    if not folder:
+        folder = tempfile.mkdtemp(prefix="wesales-images-")
+        make_samples(folder, args.samples)
+        print(f"Generated {args.samples} sample photos in {folder}")
+
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    print(f"{'mode':10s} {'images':>7s} {'total s':>8s} {'ms/image':>9s} {'images/s':>9s} {'out KB':>8s} {'peak RSS MB':>12s}")
+    for mode in ("legacy", "normalize", "pool"):
+        # 最大メモリを方式ごとに測るため、別プロセスで実行する
+        process = context.Process(
+            target=run_mode, args=(mode, folder, args.workers, args.concurrency, args.max_size, result_queue)
+        )
+        process.start()
+        while True:
+            try:
+                name, count, elapsed, output_bytes, max_rss = result_queue.get(timeout=1)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    sys.exit(f"{mode} failed (exit code {process.exitcode})")
+        process.join()
+        print(f"{name:10s} {count:7d} {elapsed:8.2f} {elapsed / count * 1000:9.1f} {count / elapsed:9.2f} "
+              f"{output_bytes / count / 1024:8.1f} {max_rss / 1024:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+SQLite 同時実行ベンチマーク
+
+N 個の書き込みスレッドと M 個の読み込みスレッドを一定時間走らせ、
+既定設定（PRAGMA なし）とチューニング設定（WAL / busy_timeout 等）の
+スループットと "database is locked" エラー数を比較する。
+
+使い方:
+    python tools/bench_sqlite_concurrency.py --writers 4 --readers 8 --duration 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from config import Config
+from extensions import db
+from models import User, Card
+
+
+def make_config(db_path, tuned):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + db_path
+        SQLITE_TUNING_ENABLED = tuned
+        if not tuned:
+            # sqlite3 の既定値（5秒待ち）に戻す
+            SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 5.0}}
+    return BenchConfig
+
+
+def run_profile(name, tuned, writers, readers, duration):
+    tmp_dir = tempfile.mkdtemp(prefix="wesales-bench-")
+    db_path = os.path.join(tmp_dir, "bench.db")
+    app = create_app(make_config(db_path, tuned))
+
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", password="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    counters = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def bump(key):
+        with lock:
+            counters[key] += 1
+
+    def writer(n):
+        with app.app_context():
+            i = 0
+            while time.perf_counter() < stop_at:
+                try:
+                    db.session.add(Card(user_id=user_id, company_name=f"会社{n}-{i}", email=f"w{n}-{i}@example.com"))
+                    db.session.commit()
+                    bump("writes")
+                except OperationalError:
+                    db.session.rollback()
+                    bump("locked")
+                i += 1
+
+    def reader(n):
+        with app.app_context():
+            while time.perf_counter() < stop_at:
+                try:
+                    Card.query.filter_by(user_id=user_id).order_by(Card.created_at.desc()).limit(50).all()
+                    db.session.rollback()
+                    bump("reads")
+                except OperationalError:
+                    db.session.rollback()
+                    bump("locked")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        db.engine.dispose()
+
+    print(
+        f"{name:8s} writes/s={counters['writes'] / elapsed:9.1f} "
+        f"reads/s={counters['reads'] / elapsed:9.1f} locked={counters['locked']}"
+    )
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite concurrency benchmark")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"writers={args.writers} readers={args.readers} duration={args.duration}s")
+    run_profile("default", False, args.writers, args.readers, args.duration)
+    run_profile("tuned", True, args.writers, args.readers, args.duration)
+
+
+if __name__ == "__main__":
+    main()
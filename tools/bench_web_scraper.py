@@ -0,0 +1,124 @@
+"""
+会社Webサイト取得ベンチマーク: 旧実装（requests + apparent_encoding + html.parser）と
+ストリーミング取得（httpx 非同期 + バイト上限 + 高速パーサ）の比較
+
+保存済みの HTML ファイル（--corpus で指定したディレクトリ内の *.html）を
+ローカルの HTTP サーバーから配信し、同じページ群を両方の実装で取得して所要時間を比べる。
+コーパスを指定しない場合は大きめの合成ページを一時ディレクトリに生成する。
+
+使い方:
+    python tools/bench_web_scraper.py --corpus path/to/saved_pages --repeat 3
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from bs4 import BeautifulSoup
+
+from services.web_service import HTML_PARSER, fetch_company_info, get_company_info_batch, make_client
+
+
+def legacy_get_company_info(url):
+    """従来の実装（全文ダウンロード → 全文で文字コード推定 → html.parser）"""
+    try:
+        res = requests.get(url, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
+        res.encoding = res.apparent_encoding
+        soup = BeautifulSoup(res.text, "html.parser")
+        for s in soup(["script", "style", "header", "footer", "nav", "noscript"]):
+            s.decompose()
+        text_content = " ".join(soup.get_text(separator=" ", strip=True).split())
+        return text_content[:1200] if text_content else "Webサイトに内容がありません"
+    except Exception:
+        return "Webサイトにアクセス不可"
+
+
+def generate_corpus(directory, pages, size_kb):
+    paragraph = "<p>当社は法人向けに名刺管理と営業支援のサービスを提供しています。</p>"
+    filler = "<div class='item'><a href='#'>製品情報</a><span>お知らせ</span></div>"
+    for i in range(pages):
+        body = paragraph * 20 + filler * (size_kb * 1024 // len(filler.encode("utf-8")))
+        html = (
+            "<html><head><meta charset='utf-8'><title>Company</title>"
+            "<script>" + "var a=1;" * 2000 + "</script></head>"
+            f"<body><nav>メニュー</nav>{body}</body></html>"
+        )
+        with open(os.path.join(directory, f"page{i}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory):
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Company website scraper benchmark")
+    parser.add_argument("--corpus", help="保存済み HTML のディレクトリ（省略時は合成ページ）")
+    parser.add_argument("--pages", type=int, default=20, help="合成ページ数")
+    parser.add_argument("--size-kb", type=int, default=2000, help="合成ページ1件のサイズ (KB)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    directory = args.corpus
+    if not directory:
+        directory = tempfile.mkdtemp(prefix="wesales-scrape-")
+        generate_corpus(directory, args.pages, args.size_kb)
+    files = sorted(f for f in os.listdir(directory) if f.endswith((".html", ".htm")))
+    if not files:
+        raise SystemExit(f"No HTML files in {directory}")
+
+    server = serve(directory)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/{name}" for name in files]
+    print(f"Corpus: {len(files)} pages from {directory} (parser: {HTML_PARSER})")
+
+    def run_legacy():
+        for url in urls:
+            legacy_get_company_info(url)
+
+    def run_streaming():
+        # 全ページが同一ホストのため、ドメイン単位の重複排除を避けて1件ずつ取得する
+        for url in urls:
+            get_company_info_batch([url])
+
+    def run_streaming_batch():
+        async def fetch_all():
+            async with make_client() as client:
+                return await asyncio.gather(*(fetch_company_info(u, client) for u in urls))
+        asyncio.run(fetch_all())
+
+    results = {}
+    for name, fn in [("legacy", run_legacy), ("streaming", run_streaming), ("streaming (concurrent)", run_streaming_batch)]:
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+        print(f"{name:24s} {best * 1000:10.1f} ms  ({best * 1000 / len(urls):.1f} ms/page)")
+
+    print(f"speedup (sequential): {results['legacy'] / results['streaming']:.1f}x")
+    print(f"speedup (concurrent): {results['legacy'] / results['streaming (concurrent)']:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
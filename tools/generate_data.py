@@ -0,0 +1,75 @@
+"""
+合成データの一括投入（負荷試験・性能確認用の大きなデータベースを作る）
+
+日本語の氏名・会社名の名刺と送信履歴を持つユーザー（テナント）を、既存データの後ろに追加する。
+投入先は DATABASE_URL（未指定時は users.db）、または --database で指定する。
+生成したユーザーは全員同じパスワードでログインできる（tools/locustfile.py で使用）。
+
+使い方:
+    python tools/generate_data.py --users 1000 --cards 1000000 --history 1000000
+    python tools/generate_data.py --scale 100k --database sqlite:////tmp/wesales-100k.db
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask_bcrypt import generate_password_hash
+
+from app import create_app
+from config import Config
+from extensions import db
+from synthetic_data import SCALES, populate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-insert synthetic tenants, cards and history")
+    parser.add_argument("--scale", choices=sorted(SCALES), help="件数の既定値（--users 等で個別に上書きできる）")
+    parser.add_argument("--users", type=int, help="追加するユーザー数")
+    parser.add_argument("--cards", type=int, help="追加する名刺の総数（ユーザーに均等に割り当てる）")
+    parser.add_argument("--history", type=int, help="追加する送信履歴の総数（直近6か月に分散）")
+    parser.add_argument("--companies", type=int, default=5000, help="名刺の会社の種類数")
+    parser.add_argument("--password", default="loadtest", help="生成したユーザーのパスワード")
+    parser.add_argument("--database", help="投入先の SQLAlchemy URL（既定は設定の DATABASE_URL）")
+    parser.add_argument("--batch-size", type=int, default=10000, help="1回の INSERT・コミットの件数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    counts = dict(SCALES[args.scale or "1k"])
+    for name in ("users", "cards", "history"):
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+    if counts["users"] < 1:
+        parser.error("--users must be at least 1")
+
+    class GenerateConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database or Config.SQLALCHEMY_DATABASE_URI
+
+    app = create_app(GenerateConfig)
+    started = time.perf_counter()
+
+    def progress(name, count):
+        print(f"  {name:16s} {count:>10,d} rows  ({time.perf_counter() - started:.1f}s)")
+
+    with app.app_context():
+        db.create_all()
+        # 全ユーザーで同じハッシュを使う（bcrypt は1件ごとに計算すると遅い）
+        password = generate_password_hash(args.password).decode("utf-8")
+        print(f"Inserting {counts['users']:,d} users, {counts['cards']:,d} cards, {counts['history']:,d} history "
+              f"into {db.engine.url.render_as_string(hide_password=True)}")
+        user_ids = populate(
+            counts["users"], counts["cards"], counts["history"], password,
+            companies=args.companies, seed=args.seed, batch_size=args.batch_size, progress=progress,
+        )
+
+    print(f"Done in {time.perf_counter() - started:.1f}s. "
+          f"Users user{user_ids[0]}..user{user_ids[-1]} (password: {args.password})")
+    print(f"Load test: WESALES_USERS={user_ids[0]}-{user_ids[-1]} WESALES_PASSWORD={args.password} "
+          f"locust -f tools/locustfile.py --host http://localhost:5001")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+代替プロバイダ（FAKE_PROVIDERS）を使ったエンドツーエンド負荷試験
+
+一時ファイルの SQLite と代替プロバイダを使ってアプリを起動し、複数の仮想ユーザーが
+実際の Flask ルート（/upload、/api/bulk_send_emails、/api/cards/search）を並列に呼び出す。
+エンドポイントごとのスループットとレイテンシのパーセンタイルを表示する。
+
+レイテンシやエラー率は FAKE_* 環境変数またはオプションで指定する。
+
+使い方:
+    python tools/load_test.py --users 8 --duration 30 --bulk-size 10 \
+        --ai-latency-ms 800 --error-rate 0.02 --rate-limit-rate 0.05 --max-rps 20
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def configure_environment(args, db_path):
+    # Config は import 時に環境変数を読むため、アプリの import より前に設定する
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    os.environ["FAKE_PROVIDERS"] = "true"
+    os.environ["FAKE_LATENCY_MS"] = str(args.ai_latency_ms)
+    os.environ["FAKE_VISION_LATENCY_MS"] = str(args.vision_latency_ms)
+    os.environ["FAKE_MAIL_LATENCY_MS"] = str(args.mail_latency_ms)
+    os.environ["FAKE_LATENCY_SIGMA"] = str(args.sigma)
+    os.environ["FAKE_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_RATE_LIMIT_RATE"] = str(args.rate_limit_rate)
+    os.environ["FAKE_MAX_RPS"] = str(args.max_rps)
+    os.environ["FAKE_SEED"] = str(args.seed)
+    os.environ["BULK_SEND_INTERVAL"] = str(args.send_interval)
+    os.environ.setdefault("AI_RETRY_MAX_WAIT", "1")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def make_card_image():
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new("RGB", (900, 540), (250, 250, 250)).save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test against fake providers")
+    parser.add_argument("--users", type=int, default=8, help="並列の仮想ユーザー数")
+    parser.add_argument("--duration", type=float, default=30, help="試験時間（秒）")
+    parser.add_argument("--bulk-size", type=int, default=10, help="一括送信1回あたりの名刺数")
+    parser.add_argument("--mix", default="upload:3,bulk_send:1,search:6", help="操作の比率")
+    parser.add_argument("--ai-latency-ms", type=float, default=800)
+    parser.add_argument("--vision-latency-ms", type=float, default=1500)
+    parser.add_argument("--mail-latency-ms", type=float, default=200)
+    parser.add_argument("--sigma", type=float, default=0.3, help="レイテンシの対数正規分布のばらつき")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--max-rps", type=float, default=0, help="プロバイダごとの秒間上限（0 で無制限）")
+    parser.add_argument("--send-interval", type=float, default=0, help="BULK_SEND_INTERVAL（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="wesales-load-"), "load.db")
+    configure_environment(args, db_path)
+
+    from flask_bcrypt import generate_password_hash
+    from app import create_app
+    from config import Config
+    from extensions import db
+    from models import Card, User
+
+    class LoadTestConfig(Config):
+        WTF_CSRF_ENABLED = False
+        UPLOAD_FOLDER = os.path.join(os.path.dirname(db_path), "uploads")
+
+    app = create_app(LoadTestConfig)
+    with app.app_context():
+        db.create_all()
+        password = generate_password_hash("loadtest").decode("utf-8")
+        for i in range(args.users):
+            db.session.add(User(username=f"load{i}", password=password, monthly_limit=10 ** 9))
+        db.session.commit()
+
+    operations = []
+    for item in args.mix.split(","):
+        name, weight = item.split(":")
+        operations += [name] * int(weight)
+    image = make_card_image()
+    results = {}
+    results_lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def record(name, elapsed, ok, items=1):
+        with results_lock:
+            entry = results.setdefault(name, {"latencies": [], "errors": 0, "items": 0})
+            entry["latencies"].append(elapsed)
+            entry["items"] += items if ok else 0
+            if not ok:
+                entry["errors"] += 1
+
+    def virtual_user(index):
+        rnd = random.Random(args.seed + index)
+        client = app.test_client()
+        client.post("/login", data={"username": f"load{index}", "password": "loadtest"})
+        with app.app_context():
+            user_id = User.query.filter_by(username=f"load{index}").first().id
+
+        while time.perf_counter() < stop_at:
+            operation = rnd.choice(operations)
+            started = time.perf_counter()
+            if operation == "upload":
+                response = client.post(
+                    "/upload", data={"image": (io.BytesIO(image), "card.jpg")}, content_type="multipart/form-data"
+                )
+                record("upload", time.perf_counter() - started, response.status_code == 200)
+            elif operation == "bulk_send":
+                with app.app_context():
+                    ids = [
+                        row.id for row in db.session.query(Card.id)
+                        .filter(Card.user_id == user_id, Card.email != "")
+                        .order_by(Card.id.desc()).limit(args.bulk_size)
+                    ]
+                if not ids:
+                    continue
+                response = client.post("/api/bulk_send_emails", json={"ids": ids})
+                sent = response.get_json().get("success_count", 0) if response.status_code == 200 else 0
+                record("bulk_send", time.perf_counter() - started, response.status_code == 200, items=sent)
+            else:
+                response = client.get("/api/cards/search", query_string={"q": rnd.choice(["ロードテスト", "負荷", "開発部"])})
+                record("search", time.perf_counter() - started, response.status_code == 200)
+
+    print(f"Running {args.users} virtual users for {args.duration:.0f}s (AI median {args.ai_latency_ms:.0f}ms, "
+          f"errors {args.error_rate:.0%}, 429 {args.rate_limit_rate:.0%}, max rps {args.max_rps or 'unlimited'})")
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"{'operation':12s} {'count':>7s} {'errors':>7s} {'req/s':>8s} {'items/s':>8s} "
+          f"{'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for name, entry in sorted(results.items()):
+        lat = entry["latencies"]
+        print(f"{name:12s} {len(lat):7d} {entry['errors']:7d} {len(lat) / elapsed:8.2f} {entry['items'] / elapsed:8.2f} "
+              f"{percentile(lat, 50) * 1000:9.1f} {percentile(lat, 95) * 1000:9.1f} "
+              f"{percentile(lat, 99) * 1000:9.1f} {max(lat) * 1000:9.1f}")
+
+    from services.ai_service import get_ai_router
+    print("AI provider health:", get_ai_router().snapshot())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Locust の負荷シナリオ（多数のユーザーでログインし、一覧・検索・下書き生成・送信を行う）
+
+tools/generate_data.py で作ったユーザーを使う。外部サービスに送らないよう、
+サーバーは FAKE_PROVIDERS=true（必要に応じて BULK_SEND_INTERVAL=0）で起動しておく。
+
+使い方:
+    pip install locust
+    FAKE_PROVIDERS=true BULK_SEND_INTERVAL=0 python app.py
+    WESALES_USERS=1-1000 WESALES_PASSWORD=loadtest \
+        locust -f tools/locustfile.py --host http://localhost:5001 --users 200 --spawn-rate 20
+"""
+import json
+import os
+import random
+import re
+
+from locust import HttpUser, between, task
+
+CSRF_TOKEN = re.compile(r'name="csrf[-_]token" (?:value|content)="([^"]+)"')
+SEARCH_WORDS = ["株式会社", "営業部", "部長", "佐藤", "テクノ", "example.com", "ホールディングス", "田中 課長"]
+
+
+def _user_ids():
+    first, _, last = os.environ.get("WESALES_USERS", "1-10").partition("-")
+    return int(first), int(last or first)
+
+
+class SalesUser(HttpUser):
+    """名刺一覧・検索を中心に、ときどき下書き生成と送信を行う営業担当者"""
+
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        self.username = f"user{random.randint(*_user_ids())}"
+        self.csrf_token = self._csrf_token("/login")
+        self.client.post(
+            "/login",
+            data={"username": self.username, "password": os.environ.get("WESALES_PASSWORD", "loadtest"),
+                  "csrf_token": self.csrf_token},
+            allow_redirects=False,
+            name="/login",
+        )
+        # ログイン後はセッションが変わるため、API 用のトークンを取り直す
+        self.csrf_token = self._csrf_token("/")
+        self.card_ids = self._card_ids()
+
+    def _csrf_token(self, path):
+        match = CSRF_TOKEN.search(self.client.get(path, name=path).text)
+        return match.group(1) if match else ""
+
+    def _card_ids(self):
+        response = self.client.get("/api/cards/search", params={"per_page": 100}, name="/api/cards/search [all]")
+        if response.status_code != 200:
+            return []
+        return [item["id"] for item in response.json()["items"] if item["email"]]
+
+    def _post_json(self, path, payload, name=None):
+        return self.client.post(path, json=payload, headers={"X-CSRFToken": self.csrf_token}, name=name or path)
+
+    @task(4)
+    def card_list(self):
+        self.client.get("/cards")
+
+    @task(6)
+    def search(self):
+        self.client.get("/api/cards/search", params={"q": random.choice(SEARCH_WORDS)}, name="/api/cards/search")
+
+    @task(1)
+    def history(self):
+        self.client.get("/history")
+
+    @task(2)
+    def generate_and_send(self):
+        if not self.card_ids:
+            return
+        card_id = random.choice(self.card_ids)
+        response = self.client.get(
+            f"/api/generate_initial_email/{card_id}", name="/api/generate_initial_email/[id]"
+        )
+        if response.status_code != 200:
+            return
+        draft = response.json()
+        # AI の応答（JSON 文字列）がそのまま返る
+        if isinstance(draft, str):
+            try:
+                draft = json.loads(draft)
+            except ValueError:
+                return
+        self._post_json("/send", {
+            "to": f"loadtest-{card_id}@example.com",
+            "subject": draft.get("subject", ""),
+            "body": draft.get("body", ""),
+        })
+
+    @task(1)
+    def bulk_send(self):
+        if self.card_ids:
+            self._post_json("/api/bulk_send_emails", {"ids": random.sample(self.card_ids, min(3, len(self.card_ids)))})
@@ -0,0 +1,34 @@
+"""
+既存の名刺から重複検出用のキー (contact_key) を作り直す
+
+重複検出エンジン導入前に登録された名刺にはキーが無いため、導入時に一度実行する。
+以降は名刺の追加・更新時に自動で作成される。
+
+使い方:
+    python tools/rebuild_contact_keys.py [--user-id 3]
+"""
+import argparse
+import os
+import sys
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from services.dedup_service import rebuild_contact_keys
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild duplicate-detection keys for cards")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    with app.app_context():
+        total = rebuild_contact_keys(user_id=args.user_id)
+    print(f"Rebuilt keys for {total} cards.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+負荷試験・ベンチマーク用の合成データ（ユーザー・名刺・送信履歴・会社プロフィール）
+
+乱数の種を固定すれば同じデータを再現できる。行は辞書のジェネレーターで作り、
+一定件数ごとに一括 INSERT するため、100万件規模でもメモリに載せずに投入できる。
+ORM を経由しないため、名刺の重複検出キー (contact_key) はここで合わせて作成する。
+送信数カウンタ (send_counter) は作らず、参照時に History から集計される。
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Add the parent directory to sys.path to allow importing from the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func
+
+from database import reset_sequences
+from extensions import db
+from models import Card, CompanyProfile, ContactKey, History, User
+from services.dedup_service import compute_keys
+
+# 規模ごとの件数（名刺・履歴は全ユーザーの合計）
+SCALES = {
+    "1k": {"users": 10, "cards": 1_000, "history": 1_000},
+    "100k": {"users": 100, "cards": 100_000, "history": 100_000},
+    "1m": {"users": 1_000, "cards": 1_000_000, "history": 1_000_000},
+}
+
+LAST_NAMES = [
+    ("佐藤", "sato"), ("鈴木", "suzuki"), ("高橋", "takahashi"), ("田中", "tanaka"), ("伊藤", "ito"),
+    ("渡辺", "watanabe"), ("山本", "yamamoto"), ("中村", "nakamura"), ("小林", "kobayashi"), ("加藤", "kato"),
+    ("吉田", "yoshida"), ("山田", "yamada"), ("佐々木", "sasaki"), ("山口", "yamaguchi"), ("松本", "matsumoto"),
+    ("井上", "inoue"), ("木村", "kimura"), ("林", "hayashi"), ("斎藤", "saito"), ("清水", "shimizu"),
+]
+FIRST_NAMES = [
+    ("太郎", "taro"), ("花子", "hanako"), ("一郎", "ichiro"), ("美咲", "misaki"), ("健太", "kenta"),
+    ("陽菜", "hina"), ("翔", "sho"), ("さくら", "sakura"), ("大輔", "daisuke"), ("結衣", "yui"),
+    ("拓也", "takuya"), ("愛", "ai"), ("直樹", "naoki"), ("彩", "aya"), ("誠", "makoto"),
+]
+COMPANY_WORDS = [
+    "サンプル", "テクノ", "ネクスト", "グローバル", "未来", "創造", "日本", "東京", "フロンティア", "システム",
+    "アーク", "さくら", "ひかり", "みらい", "大和", "北斗", "光洋", "富士", "中央", "総合",
+]
+COMPANY_SUFFIX = ["商事", "工業", "物産", "ソリューションズ", "ホールディングス", "製作所", "システムズ", "電機"]
+LEGAL_FORMS = ["株式会社{}", "{}株式会社", "有限会社{}", "合同会社{}"]
+DEPARTMENTS = ["営業部", "開発部", "総務部", "経営企画室", "マーケティング部", "人事部", "情報システム部", "購買部"]
+TITLES = ["部長", "課長", "主任", "代表取締役", "担当", "係長", "取締役", "マネージャー"]
+SUBJECTS = ["先日の展示会のお礼", "ご挨拶と弊社サービスのご紹介", "打ち合わせのお礼", "資料送付のご案内"]
+
+
+def _person(rnd):
+    last, last_romaji = rnd.choice(LAST_NAMES)
+    first, first_romaji = rnd.choice(FIRST_NAMES)
+    return last, first, f"{first_romaji}.{last_romaji}"
+
+
+def _phone(rnd):
+    if rnd.random() < 0.5:
+        return f"0{rnd.choice([3, 6, 45, 52, 92])}-{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}"
+    return f"0{rnd.choice([70, 80, 90])}-{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}"
+
+
+def generate_companies(count, seed=42):
+    """(会社名, ドメイン) の一覧。名刺・履歴はこの中から会社を選ぶ"""
+    rnd = random.Random(seed)
+    companies = []
+    for i in range(count):
+        name = f"{rnd.choice(COMPANY_WORDS)}{rnd.choice(COMPANY_WORDS)}{rnd.choice(COMPANY_SUFFIX)}"
+        companies.append((rnd.choice(LEGAL_FORMS).format(name), f"corp{i}.example.com"))
+    return companies
+
+
+def generate_users(count, password_hash, start_id=1, seed=42, prefix="user"):
+    rnd = random.Random(seed)
+    for user_id in range(start_id, start_id + count):
+        last, first, local = _person(rnd)
+        yield {
+            "id": user_id,
+            "username": f"{prefix}{user_id}",
+            "password": password_hash,
+            "is_admin": False,
+            "company_name": f"株式会社{rnd.choice(COMPANY_WORDS)}{rnd.choice(COMPANY_SUFFIX)}",
+            "job_title": rnd.choice(TITLES),
+            "last_name": last,
+            "first_name": first,
+            "phone_number": _phone(rnd),
+            "email_address": f"{local}{user_id}@sender.example.com",
+            "email_provider": "resend",
+            "monthly_limit": 10 ** 9,
+        }
+
+
+def generate_cards(count, user_ids, companies, start_id=1, seed=42, now=None):
+    """名刺をユーザーに順番に割り当てる（ユーザーごとの件数はほぼ同じ）"""
+    rnd = random.Random(seed)
+    now = now or datetime.now()
+    for i, card_id in enumerate(range(start_id, start_id + count)):
+        company, domain = rnd.choice(companies)
+        last, first, local = _person(rnd)
+        yield {
+            "id": card_id,
+            "user_id": user_ids[i % len(user_ids)],
+            "image_path": "no-image.png",
+            "company_name": company,
+            "department_name": rnd.choice(DEPARTMENTS),
+            "job_title": rnd.choice(TITLES),
+            "last_name": last,
+            "first_name": first,
+            "phone_number": _phone(rnd),
+            # 1割はメールアドレスなし（一括送信で除外される名刺）
+            "email": f"{local}{card_id}@{domain}" if rnd.random() >= 0.1 else "",
+            "url": f"https://www.{domain}/",
+            "created_at": now - timedelta(days=rnd.randint(0, 730), seconds=rnd.randint(0, 86399)),
+        }
+
+
+def generate_history(count, user_ids, companies, seed=42, months=6, now=None):
+    """送信履歴。送信日時は直近 months か月に分散させる"""
+    rnd = random.Random(seed)
+    now = now or datetime.now()
+    for i in range(count):
+        company, domain = rnd.choice(companies)
+        last, first, local = _person(rnd)
+        subject = rnd.choice(SUBJECTS)
+        yield {
+            "user_id": user_ids[i % len(user_ids)],
+            "customer_name": f"{last} {first}",
+            "company_name": company,
+            "email": f"{local}@{domain}",
+            "mail_subject": f"【{company}】{subject}",
+            "mail_body": f"{last}様\n\n{subject}をお送りします。\n今後ともよろしくお願いいたします。",
+            "sent_at": now - timedelta(seconds=rnd.randint(0, months * 30 * 86400)),
+        }
+
+
+def generate_company_profiles(companies, now=None):
+    """取得済みの会社プロフィール（一括送信でWebサイトを取得しに行かないようにする）"""
+    now = now or datetime.now()
+    for company, domain in companies:
+        summary = f"{company}は{domain}で事業を展開しています。"
+        yield {
+            "domain": domain, "url": f"https://www.{domain}/", "status": "ok",
+            "title": company, "description": summary, "og_title": company, "og_description": summary,
+            "og_site_name": company, "summary": summary, "fetched_at": now,
+        }
+
+
+def _contact_keys(cards):
+    for card in cards:
+        for kind, value in compute_keys(SimpleNamespace(**card)):
+            yield {"card_id": card["id"], "user_id": card["user_id"], "kind": kind, "value": value}
+
+
+def bulk_insert(table, rows, batch_size=10000, on_batch=None):
+    """rows を batch_size 件ずつ INSERT してコミットする。投入件数を返す
+
+    on_batch(batch) は INSERT 後・コミット前に呼ばれる（関連テーブルの同時投入用）。
+    """
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            total += _insert_batch(table, batch, on_batch)
+            batch = []
+    if batch:
+        total += _insert_batch(table, batch, on_batch)
+    return total
+
+
+def _insert_batch(table, batch, on_batch):
+    db.session.execute(table.insert(), batch)
+    if on_batch is not None:
+        on_batch(batch)
+    db.session.commit()
+    return len(batch)
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def populate(users, cards, history, password_hash, companies=5000, seed=42, batch_size=10000, progress=None):
+    """合成データを投入する（既存データの後ろに追加する）。投入したユーザー ID の一覧を返す
+
+    アプリケーションコンテキスト内で呼ぶこと。progress(name, count) で進捗を受け取れる。
+    """
+    report = progress or (lambda name, count: None)
+    company_list = generate_companies(companies, seed)
+    now = datetime.now()
+
+    known = {d for (d,) in db.session.query(CompanyProfile.domain)}
+    count = bulk_insert(
+        CompanyProfile.__table__,
+        (p for p in generate_company_profiles(company_list, now) if p["domain"] not in known),
+        batch_size,
+    )
+    report("company_profile", count)
+
+    start = _next_id(User)
+    count = bulk_insert(User.__table__, generate_users(users, password_hash, start, seed), batch_size)
+    report("user", count)
+    user_ids = list(range(start, start + users))
+
+    def insert_keys(batch):
+        keys = list(_contact_keys(batch))
+        if keys:
+            db.session.execute(ContactKey.__table__.insert(), keys)
+
+    count = bulk_insert(
+        Card.__table__, generate_cards(cards, user_ids, company_list, _next_id(Card), seed + 1, now),
+        batch_size, on_batch=insert_keys,
+    )
+    report("card", count)
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        # ID を指定して INSERT したため、以降の通常の INSERT と重ならないようシーケンスを進める
+        for model in (User, Card):
+            reset_sequences(model.__table__, db.session.connection())
+        db.session.commit()
+
+    count = bulk_insert(
+        History.__table__, generate_history(history, user_ids, company_list, seed + 2, now=now), batch_size
+    )
+    report("history", count)
+    return user_ids
@@ -0,0 +1,241 @@
+"""
+処理段階ごとのトレース（span）
+
+TRACING_EXPORTER="file" では span を OpenTelemetry の形式に近い JSON Lines で TRACING_FILE に書き出す
+（書き込みは別スレッド）。"otlp" では opentelemetry-sdk と OTLP エクスポーターを使い、
+ローカルのコレクター等（OTEL_EXPORTER_OTLP_ENDPOINT）へ送る。未インストールの場合は file になる。
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_tracer = None
+
+
+class Span:
+    """JSON Lines で書き出す span（trace_id / span_id / parent_span_id は OpenTelemetry と同じ桁数）"""
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.status = "OK"
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.status = "ERROR"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        end_ns = time.time_ns()
+        self.tracer.export({
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time": self.start_ns,
+            "end_time": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        })
+
+
+class FileTracer:
+    """span を JSON Lines のファイルに書き出す（書き込みは別スレッド）"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def start_span(self, name, attributes):
+        span = Span(self, name, _current_span.get(), attributes)
+        return span, _current_span.set(span)
+
+    def finish(self, span, token):
+        _current_span.reset(token)
+        span.end()
+
+    def export(self, record):
+        self._queue.put(record)
+
+    def flush(self, timeout=5):
+        """書き込み待ちの span を書き出すまで待つ（テスト・終了処理用）"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if isinstance(record, threading.Event):
+                record.set()
+                continue
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            except OSError as e:
+                logger.warning("Failed to write trace span: %s", e)
+
+
+class OpenTelemetryTracer:
+    """OpenTelemetry の API に span を渡す"""
+
+    def __init__(self, tracer):
+        from opentelemetry import context, trace
+
+        self._tracer = tracer
+        self._context = context
+        self._trace = trace
+
+    def start_span(self, name, attributes):
+        span = self._tracer.start_span(name, attributes={k: v for k, v in attributes.items() if v is not None})
+        token = self._context.attach(self._trace.set_span_in_context(span))
+        return _OtelSpan(span, self._trace), token
+
+    def finish(self, span, token):
+        self._context.detach(token)
+        span.span.end()
+
+    def flush(self, timeout=5):
+        provider = self._trace.get_tracer_provider()
+        if hasattr(provider, "force_flush"):
+            provider.force_flush(int(timeout * 1000))
+
+
+class _OtelSpan:
+    def __init__(self, span, trace):
+        self.span = span
+        self._trace = trace
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.span.set_attribute(key, value)
+
+    def record_error(self, error):
+        self.span.record_exception(error)
+        self.span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, str(error)))
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_tracer(service_name):
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("opentelemetry-sdk / exporter is not installed; writing traces to a file instead")
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    return OpenTelemetryTracer(trace.get_tracer(service_name))
+
+
+def configure_tracing(exporter="file", path="logs/traces.jsonl", service_name="wesales"):
+    """トレースを有効にする（最初の呼び出しのみ有効）"""
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    if exporter == "otlp":
+        _tracer = _otlp_tracer(service_name)
+    if _tracer is None:
+        _tracer = FileTracer(path)
+    return _tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+@contextmanager
+def span(name, **attributes):
+    """処理段階を span として記録する（トレース無効時は何もしない）"""
+    tracer = _tracer
+    if tracer is None:
+        yield _NOOP_SPAN
+        return
+    current, token = tracer.start_span(name, attributes)
+    try:
+        yield current
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        tracer.finish(current, token)
+
+
+def init_tracing(app):
+    """TRACING_ENABLED なら、リクエストごとに親 span を作り、各処理段階の span をその下に記録する"""
+    if app.config.get("TRACING_ENABLED", False):
+        configure_tracing(
+            exporter=app.config.get("TRACING_EXPORTER", "file"),
+            path=app.config.get("TRACING_FILE", os.path.join("logs", "traces.jsonl")),
+            service_name=app.config.get("TRACING_SERVICE_NAME", "wesales"),
+        )
+
+    @app.before_request
+    def _start_request_span():
+        tracer = _tracer
+        if tracer is None:
+            return
+        current, token = tracer.start_span(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            {"http.method": request.method, "http.target": request.path, "request_id": g.get("request_id")},
+        )
+        g.trace_span = (tracer, current, token)
+
+    @app.after_request
+    def _tag_request_span(response):
+        if "trace_span" in g:
+            current = g.trace_span[1]
+            current.set_attribute("http.status_code", response.status_code)
+            current.set_attribute("http.route", request.endpoint)
+        return response
+
+    @app.teardown_request
+    def _end_request_span(exc):
+        entry = g.pop("trace_span", None)
+        if entry is None:
+            return
+        tracer, current, token = entry
+        if exc is not None:
+            current.record_error(exc)
+        tracer.finish(current, token)